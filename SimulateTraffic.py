@@ -1,16 +1,29 @@
 import numpy as np
 from matplotlib import pyplot as plt
-from utils.map import ConstructLocationAssets, ConstructPointsMap, ConstructRoads, RoadPoints 
+from utils.map import RoadPoints 
+from utils.bundle import LoadMineData
+from utils.lanes import ConstructLaneGeometry
+from utils.spatial import SpatialIndex
+
+spatial_index = None  # built in __main__, used to snap clicks to the road network
 
 def mouse_event(event):
     print('x: {} and y: {}'.format(event.xdata, event.ydata))           
+    if spatial_index is not None and event.xdata is not None:
+        point_id, distance = spatial_index.NearestPoint(event.xdata, event.ydata)
+        segment = spatial_index.NearestSegment(event.xdata, event.ydata)
+        print(f'nearest point {point_id} at {distance:.1f}m, road {segment["road"]} segment {segment["segment"]} '
+              f'at ({segment["x"]:.1f}, {segment["y"]:.1f}), {segment["along"]:.1f}m along the road')
 
 if __name__ == '__main__':
 
-    roads = ConstructRoads("./data/Roads.csv")
-    road_points = ConstructPointsMap("./data/RoadPoints.csv")
+    mine_data = LoadMineData("./data")
+    roads = mine_data['roads']
+    road_points = mine_data['road_points']
     points_map =  RoadPoints(road_points)
-    assets = ConstructLocationAssets("./data/assets.csv", road_points)
+    assets = mine_data['assets']
+    spatial_index = SpatialIndex(road_points, roads)
+    lanes = ConstructLaneGeometry("./data")  # generated once, then loaded from data/cache
 
     fig = plt.figure()
     cid = fig.canvas.mpl_connect('button_press_event', mouse_event)
@@ -18,7 +31,7 @@ if __name__ == '__main__':
     for r in roads:
         #print(r)         
         last_point = None
-        points = points_map.GetPoints(r.nodes)
+        points = points_map.GetPointViews(r.nodes)
         for i, p in enumerate(points):
             if last_point is not None:
                 x1 = [last_point.x, p.x]
@@ -27,6 +40,11 @@ if __name__ == '__main__':
                 print(f'p0({last_point.x},{last_point.y}) to p1({p.x}, {p.y}))')                
             last_point = p                
 
+    for i in range(len(lanes)):
+        for side, colour in (('left', 'blue'), ('right', 'red')):
+            lane = lanes.Lane(i, side)
+            plt.plot(lane[:, 0], lane[:, 1], color=colour, linewidth=0.8)
+
     for asset in assets:
         plt.text(asset['text_x'], asset['text_y'], asset['name'], fontsize=8, color='blue')        
         
@@ -1,9 +1,17 @@
 import dash
 from dash import dcc, html
 from dash.dependencies import Input, Output
+import numpy as np
 import plotly.graph_objs as go
 import pandas as pd
-from utils.map import ConstructLocationAssets, ConstructPointsMap, ConstructRoads, RoadPoints 
+from utils.map import RoadPoints, Route
+from utils.bundle import LoadMineData
+from utils.lanes import ConstructLaneGeometry
+
+UPDATE_INTERVAL = 0.25  # seconds between frames
+TRUCK_SPEED = 30 / 3.6  # m/s along the animated roads, mean of the fleet
+NUM_TRUCKS = 120
+TRUCK_MODELS = [('Cat 793C', 'red'), ('Cat 785C', 'blue')]
 
 class MinMaxCoordsFinder:
 
@@ -30,59 +38,66 @@ class MinMaxCoordsFinder:
         return self.min_x, self.max_x, self.min_y, self.max_y        
 
 
-roads = ConstructRoads("./data/Roads.csv")
-road_points = ConstructPointsMap("./data/RoadPoints.csv")
+mine_data = LoadMineData("./data")
+roads = mine_data['roads']
+road_points = mine_data['road_points']
 points_map =  RoadPoints(road_points)
-assets = ConstructLocationAssets("./data/assets.csv", road_points)
+assets = mine_data['assets']
+lanes = ConstructLaneGeometry("./data")  # generated once, then loaded from data/cache
 
 scatter_data = []
 road_coords = {}
 for r in roads:
     #print(r)               
-    points = points_map.GetPoints(r.nodes)
+    xs, ys = points_map.GetPoints(r.nodes)
     road_name = r.GetUniqueRoadName()
-    road_coords[road_name] = {'x' : [], 'y': []}
-    for i, p in enumerate(points):         
-        road_coords[road_name]['x'].append(p.x)
-        road_coords[road_name]['y'].append(p.y)                                    
-
-
-app = dash.Dash(__name__)
-app.layout = html.Div([
-    dcc.Graph(id='animated-line-chart'),
-    dcc.Interval(id='interval-update', interval=1000, n_intervals=0)  # Updates every 500ms
-])
-
-@app.callback(
-    Output('animated-line-chart', 'figure'),
-    Input('interval-update', 'n_intervals')
-)
-def update_graph(n):
+    road_coords[road_name] = {'x' : xs.tolist(), 'y': ys.tolist()}
+
+# trucks driving up and down the roads, out on the left lane and back on the right,
+# spread along them at mixed speeds
+def LaneLoop(road_index):
+    """ Route out along a road's left lane and back along its right lane, through lane point indexes """
+    loop = np.concatenate([lanes.Lane(road_index, 'left'), lanes.Lane(road_index, 'right')[::-1]])
+    return Route(range(len(loop)), loop[:, 0], loop[:, 1])
+
+routes = [LaneLoop(i) for i in range(len(roads))]
+routes = [route for route in routes if route.length > 0]
+rng = np.random.default_rng(0)
+truck_routes = np.arange(NUM_TRUCKS) % len(routes)
+truck_start = rng.uniform(0, 1, NUM_TRUCKS) * np.array([routes[i].length for i in truck_routes])
+truck_speed = rng.uniform(0.7, 1.3, NUM_TRUCKS) * TRUCK_SPEED
+truck_names = [f'{TRUCK_MODELS[i % len(TRUCK_MODELS)][0]}-{i + 1}' for i in range(NUM_TRUCKS)]
+truck_colours = [TRUCK_MODELS[i % len(TRUCK_MODELS)][1] for i in range(NUM_TRUCKS)]
+
+
+def TruckPositions(seconds):
+    """ (NUM_TRUCKS, 2) positions after seconds, one PositionAt per route """
+    travelled = truck_start + truck_speed * seconds
+    positions = np.empty((NUM_TRUCKS, 2))
+    for i, route in enumerate(routes):
+        on_route = truck_routes == i
+        positions[on_route] = route.PositionAt(travelled[on_route] % route.length)
+    return positions
+
+
+def BuildMapFigure():
+    """ Roads, assets and axis ranges, built once; ticks only move the trucks trace (the last one) """
     fig = go.Figure()    
-    selected_coords = road_coords[roads[2].GetUniqueRoadName()]    
-    selected_coords_2 = road_coords[roads[7].GetUniqueRoadName()]    
-    
-    if n >= len(selected_coords['x']):
-        n = len(selected_coords['x']) - 1  # Prevent exceeding dataset size
-
-    print(f'Selected Coords = {selected_coords['x']}')        
-    print(f'Length Selected Coords = {len(selected_coords['x'])}, n = {n}')        
-
     minMaxFinder = MinMaxCoordsFinder()
     for r in roads:        
         coords = road_coords[r.GetUniqueRoadName()]
         fig.add_trace(go.Scatter(x=coords["x"], y =coords["y"], mode="lines", name=r.GetUniqueRoadName(), line={'width' : 4}))        
         fig.add_trace(go.Scatter(x=coords["x"], y =coords["y"], mode="markers", name=r.GetUniqueRoadName(), marker=dict(size=4  , color="green")))        
         minMaxFinder.Update(coords)
+    for i, r in enumerate(roads):
+        for side, colour in (('left', 'blue'), ('right', 'red')):
+            lane = lanes.Lane(i, side)
+            fig.add_trace(go.Scatter(x=lane[:, 0], y=lane[:, 1], mode="lines", name=f'{r.GetUniqueRoadName()} {side} lane',
+                                     line={'width': 1, 'color': colour}, showlegend=False))
 
-    # Moving point animation
-    fig.add_trace(go.Scatter(x=[selected_coords["x"][n]], y=[selected_coords["y"][n]], mode="markers",
-                            marker=dict(size=4  , color="red"),
-                            name="Cat 793C-1"))
-
-    fig.add_trace(go.Scatter(x=[selected_coords_2["x"][n]], y=[selected_coords_2["y"][n]], mode="markers",
-                            marker=dict(size=4, color="blue"),
-                            name="Cat 785C-2"))                
+    positions = TruckPositions(0.0)
+    fig.add_trace(go.Scatter(x=positions[:, 0], y=positions[:, 1], mode="markers", name="Trucks",
+                             marker=dict(size=6, color=truck_colours), hovertext=truck_names, hoverinfo="text"))
 
     annotations = []
     for asset in assets:    
@@ -112,9 +127,33 @@ def update_graph(n):
             range=[map_min_x - 300, map_max_x + 300],  # Set a fixed y-axis range.Adjust padding if needed            
         ),
         width=1200,
-        height=600
+        height=600,
+        uirevision="map"  # keep the user's zoom and legend choices across updates
     )
     return fig
 
+
+map_figure = BuildMapFigure()
+trucks_trace = len(map_figure.data) - 1
+
+app = dash.Dash(__name__)
+app.layout = html.Div([
+    dcc.Graph(id='animated-line-chart', figure=map_figure),
+    dcc.Interval(id='interval-update', interval=UPDATE_INTERVAL * 1000, n_intervals=0)
+])
+
+@app.callback(
+    Output('animated-line-chart', 'extendData'),
+    Input('interval-update', 'n_intervals')
+)
+def update_graph(n):
+    """
+    Only the truck positions go to the browser: NUM_TRUCKS new points are
+    appended to the trucks trace and maxPoints keeps just those, so the
+    trace is replaced in place (Plotly.extendTraces) and the map is not redrawn.
+    """
+    positions = np.round(TruckPositions(n * UPDATE_INTERVAL), 1)  # decimetres are plenty on screen
+    return [dict(x=[positions[:, 0].tolist()], y=[positions[:, 1].tolist()]), [trucks_trace], NUM_TRUCKS]
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -1,57 +1,45 @@
 import numpy as np
-from scipy.interpolate import splev, splprep
 import matplotlib.pyplot as plt
-from utils.map import ConstructLocationAssets, ConstructPointsMap, ConstructRoads, RoadPoints 
-
-def compute_offset_spline(points, offset_dist):
-    # Fit a B-spline curve through given points
-    tck, u = splprep(points.T, s=0)
-
-    # Compute derivatives to get tangent vectors
-    dx, dy = splev(u, tck, der=1)
-    
-    # Compute normal vectors (perpendicular to tangent)
-    norms = np.sqrt(dx**2 + dy**2)
-    nx, ny = -dy / norms, dx / norms  # Rotate tangent to get normals
-    
-    # Offset points along normal direction
-    offset_x = points[:,0] + offset_dist * nx
-    offset_y = points[:,1] + offset_dist * ny
-    offset_points = np.array([offset_x, offset_y])
-    
-    return offset_points, tck
+from utils.map import RoadPoints 
+from utils.bundle import LoadMineData
+from utils.spatial import SpatialIndex
+from utils.geometry import ConstructRoadGeometry
 
 # Example control points
 #control_points = np.array([[0, 0], [1, 2], [3, 3], [4, 1], [5, 0]])
-control_points = []
 
-roads = ConstructRoads("./data/Roads.csv")
-road_points = ConstructPointsMap("./data/RoadPoints.csv")
+mine_data = LoadMineData("./data")
+roads = mine_data['roads']
+road_points = mine_data['road_points']
 points_map =  RoadPoints(road_points)
-assets = ConstructLocationAssets("./data/assets.csv", road_points)
+assets = mine_data['assets']
+spatial_index = SpatialIndex(road_points, roads)
+road_geometry = ConstructRoadGeometry("./data")
 
 r = roads[0]
-points = points_map.GetPoints(r.nodes)
-for i, p in enumerate(points):
-    control_points.append([p.x, p.y])
-
-control_points = np.array(control_points)
+control_points = points_map.GetCoordinates(r.nodes)
 
 print(control_points)
 
 def mouse_event(event):
     print('x: {} and y: {}'.format(event.xdata, event.ydata))           
+    if event.xdata is not None:
+        point_id, distance = spatial_index.NearestPoint(event.xdata, event.ydata)
+        print(f'nearest point {point_id} at {distance:.1f}m')
 
 fig = plt.figure()
 cid = fig.canvas.mpl_connect('button_press_event', mouse_event)
 
-# Compute offset spline
+# Compute offset spline from the cached arc-length table of road 0
 offset_distance = 10 #0.5
-offset_spline, _ = compute_offset_spline(control_points, offset_distance)
+distances = np.arange(0, road_geometry.lengths[0], 5.0)
+centre_line = road_geometry.PositionAt(0, distances)
+offset_spline = road_geometry.PositionAt(0, distances, offset=offset_distance)
 
 # Plot original and offset spline
-plt.plot(control_points[:,0], control_points[:,1], 'ro-', label="Original B-Spline")
-plt.plot(offset_spline[0], offset_spline[1], 'bo-', label="Offset B-Spline")
+plt.plot(control_points[:,0], control_points[:,1], 'ro', label="Road Points")
+plt.plot(centre_line[:,0], centre_line[:,1], 'r-', label="Original B-Spline")
+plt.plot(offset_spline[:,0], offset_spline[:,1], 'b-', label="Offset B-Spline")
 # plt.legend()
 # plt.show()
 
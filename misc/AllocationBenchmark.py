@@ -0,0 +1,78 @@
+import time
+import numpy as np
+from scipy.optimize import linprog
+from utils.allocation import FlowAllocation
+
+# Per-event cost of the shovel to dump flow allocation LP: the resident,
+# warm-started HiGHS model against building and solving the problem cold on
+# every dispatch event, as the PuLP experiments did.
+
+NUM_SHOVELS = 30
+NUM_DUMPS = 10
+PAIR_DENSITY = 0.6  # share of shovel-dump pairs with a haul route
+NUM_EVENTS = 500
+NUM_TRUCKS = 100
+
+
+def SyntheticMine(seed=1):
+    rng = np.random.default_rng(seed)
+    pairs = np.argwhere(rng.random((NUM_SHOVELS, NUM_DUMPS)) < PAIR_DENSITY)
+    shovel_rate = rng.uniform(1500, 3000, NUM_SHOVELS)
+    dump_capacity = rng.uniform(4000, 8000, NUM_DUMPS)
+    cycle_time = rng.uniform(0.3, 1.2, len(pairs))  # h
+    target = 0.6 * shovel_rate.sum()
+    return pairs, shovel_rate, dump_capacity, cycle_time, target
+
+
+def Events(mine, seed=2):
+    """ (name, change) dispatch events, change(model) applies it """
+    pairs, shovel_rate, dump_capacity, cycle_time, target = mine
+    rng = np.random.default_rng(seed)
+    events = []
+    for _ in range(NUM_EVENTS):
+        kind = rng.integers(4)
+        if kind == 0:
+            shovel = int(rng.integers(NUM_SHOVELS))
+            rate = 0.0 if rng.random() < 0.3 else shovel_rate[shovel] * rng.uniform(0.8, 1.1)
+            events.append(('shovel rate', lambda model, shovel=shovel, rate=rate: model.SetShovelRate(shovel, rate)))
+        elif kind == 1:
+            trucks = NUM_TRUCKS - int(rng.integers(0, 10))
+            events.append(('trucks', lambda model, trucks=trucks: model.SetTrucks(trucks)))
+        elif kind == 2:
+            changed = rng.choice(len(pairs), 5, replace=False)
+            times = cycle_time[changed] * rng.uniform(0.9, 1.2, len(changed))
+            events.append(('cycle times', lambda model, changed=changed, times=times: model.SetCycleTimes(changed, times)))
+        else:
+            dump = int(rng.integers(NUM_DUMPS))
+            capacity = dump_capacity[dump] * rng.uniform(0.5, 1.0)
+            events.append(('dump capacity', lambda model, dump=dump, capacity=capacity: model.SetDumpCapacity(dump, capacity)))
+    return events
+
+
+if __name__ == '__main__':
+    mine = SyntheticMine()
+    pairs, shovel_rate, dump_capacity, cycle_time, target = mine
+    start = time.perf_counter()
+    model = FlowAllocation(pairs, shovel_rate, dump_capacity, cycle_time, NUM_TRUCKS, target)
+    model.Solve('initial')
+    print(f'{model}: built and solved in {(time.perf_counter() - start) * 1e3:.2f} ms, '
+          f'{model.history[0]["iterations"]} iterations')
+
+    cold_seconds = []
+    worst = 0.0
+    for name, change in Events(mine):
+        change(model)
+        model.Solve(name)
+        start = time.perf_counter()
+        cold = linprog(**model.Linprog())
+        cold_seconds.append(time.perf_counter() - start)
+        worst = max(worst, abs(cold.fun - model.history[-1]['objective']) / max(1.0, abs(cold.fun)))
+
+    warm = model.history[1:]
+    print(f'{len(warm)} events: warm {np.mean([h["seconds"] for h in warm]) * 1e3:.3f} ms and '
+          f'{np.mean([h["iterations"] for h in warm]):.1f} iterations per solve, '
+          f'cold linprog {np.mean(cold_seconds) * 1e3:.3f} ms, worst relative objective difference {worst:.1e}')
+    for name in sorted({h['event'] for h in warm}):
+        solves = [h for h in warm if h['event'] == name]
+        print(f'  {name:14s} {len(solves):4d} events, {np.mean([h["seconds"] for h in solves]) * 1e3:.3f} ms, '
+              f'{np.mean([h["iterations"] for h in solves]):5.1f} iterations')
@@ -1,5 +1,5 @@
 import simpy
-import random
+from utils.streams import RandomStreams, CROSS_TRAFFIC, SPEED
 
 class Car:
     def __init__(self, env, car_id, speed, interval, intersection_dist, braking_dist, road):
@@ -54,14 +54,15 @@ class Car:
         print(f"Time {self.env.now}: Car {self.car_id} proceeds through the intersection!")
 
 class Road:
-    def __init__(self, env, num_cars):
+    def __init__(self, env, num_cars, streams=None):
         self.env = env
+        self.streams = streams or RandomStreams()  # per car / purpose, so runs can share draws
         self.cars = []
         self.create_cars(num_cars)
 
     def create_cars(self, num_cars):
         for i in range(num_cars):
-            speed = random.randint(8, 12)  # Randomized speed
+            speed = self.streams.Random(SPEED, i+1).randint(8, 12)  # Randomized speed
             car = Car(self.env, i+1, speed, interval=1, intersection_dist=50, braking_dist=10, road=self)
             self.cars.append(car)
 
@@ -72,7 +73,7 @@ class Road:
 
     def check_cross_traffic(self):
         # Simulate presence of cross traffic at intersection randomly
-        return random.choice([True, False])
+        return self.streams.Random(CROSS_TRAFFIC).choice([True, False])
 
 # Simulation parameters
 SIM_DURATION = 40  # Max simulation time (seconds)
@@ -1,5 +1,6 @@
 import simpy
-import random
+from utils.streams import RandomStreams, CROSS_TRAFFIC, SPEED
+from utils.occupancy import LaneIndex
 
 class Car:
     def __init__(self, env, car_id, speed, interval, intersection_dist, braking_dist, road, lane=1):
@@ -22,13 +23,15 @@ class Car:
             if ahead_car and (ahead_car.position - self.position < 5):  # Maintain safe distance
                 if self.road.can_overtake(self):  # Check if overtaking is possible
                     print(f"Time {self.env.now}: Car {self.car_id} overtaking {ahead_car.car_id}")
-                    self.lane = 2  # Move to overtaking lane
+                    self.road.change_lane(self, 2)  # Move to overtaking lane
                 else:
                     print(f"Time {self.env.now}: Car {self.car_id} slowing down for {ahead_car.car_id}")
                     self.speed = max(self.speed - 2, 1)  # Reduce speed but don't stop
 
             # Move car based on speed and interval
+            old_position = self.position
             self.position += self.speed * self.interval
+            self.road.move_car(self, old_position)
             print(f"Time {self.env.now}: Car {self.car_id} at {self.position:.2f}m, Speed {self.speed:.2f} m/s, Lane {self.lane}")
 
             # Check if braking needs to start
@@ -46,7 +49,9 @@ class Car:
             self.speed -= 2  # Reduce speed by 2 m/s every interval
             if self.speed < 0:
                 self.speed = 0
+            old_position = self.position
             self.position += self.speed * self.interval
+            self.road.move_car(self, old_position)
             print(f"Time {self.env.now}: Car {self.car_id} braking at {self.position:.2f}m, Speed {self.speed:.2f} m/s")
             yield self.env.timeout(self.interval)  # Wait for next update
         
@@ -57,32 +62,43 @@ class Car:
         while self.road.check_cross_traffic():
             yield self.env.timeout(1)  # Wait if cross traffic is present
         print(f"Time {self.env.now}: Car {self.car_id} proceeds through the intersection!")
-        self.lane = 1  # Reset lane after passing intersection
+        self.road.change_lane(self, 1)  # Reset lane after passing intersection
 
 class Road:
-    def __init__(self, env, num_cars):
+    def __init__(self, env, num_cars, streams=None):
         self.env = env
+        self.streams = streams or RandomStreams()  # per car / purpose, so runs can share draws
         self.cars = []
+        self.lanes = {1: LaneIndex(), 2: LaneIndex()}  # cars per lane, sorted by position
         self.create_cars(num_cars)
 
     def create_cars(self, num_cars):
         for i in range(num_cars):
-            speed = random.randint(8, 12)  # Randomized speed
+            speed = self.streams.Random(SPEED, i+1).randint(8, 12)  # Randomized speed
             car = Car(self.env, i+1, speed, interval=1, intersection_dist=50, braking_dist=10, road=self)
             self.cars.append(car)
+            self.lanes[car.lane].Insert(car)
 
     def get_car_in_front(self, car):
-        # Get the car immediately ahead in the same lane
-        ahead_cars = [c for c in self.cars if c.position > car.position and c.lane == car.lane]
-        return min(ahead_cars, key=lambda c: c.position, default=None)
+        # Get the car immediately ahead in the same lane (binary search in the lane index)
+        return self.lanes[car.lane].LeaderAt(car.position)
 
     def can_overtake(self, car):
-        # Check if the overtaking lane is clear
-        return all(c.position < car.position - 5 or c.position > car.position + 5 for c in self.cars if c.lane == 2)
+        # Check if the overtaking lane is clear within 5m either side
+        return self.lanes[2].IsClear(car.position, 5, 5)
+
+    def move_car(self, car, old_position):
+        self.lanes[car.lane].Move(car, old_position)
+
+    def change_lane(self, car, lane):
+        if lane != car.lane:
+            self.lanes[car.lane].Remove(car)
+            car.lane = lane
+            self.lanes[lane].Insert(car)
 
     def check_cross_traffic(self):
         # Simulate presence of cross traffic at intersection randomly
-        return random.choice([True, False])
+        return self.streams.Random(CROSS_TRAFFIC).choice([True, False])
 
 # Simulation parameters
 SIM_DURATION = 40  # Max simulation time (seconds)
@@ -96,7 +112,6 @@ env.run(until=SIM_DURATION)
 
 # run continously
 import simpy
-import random
 
 def run_simulation():
     env = simpy.Environment()
@@ -135,7 +150,7 @@ env.run()
 #externally stooping car sims
 
 import simpy
-import random
+from utils.streams import RandomStreams, CROSS_TRAFFIC, SPEED
 
 class Car:
     def __init__(self, env, car_id, speed, interval, intersection_dist, braking_dist, road, stop_event, lane=1):
@@ -164,13 +179,15 @@ class Car:
             if ahead_car and (ahead_car.position - self.position < 5):  # Maintain safe distance
                 if self.road.can_overtake(self):  # Check if overtaking is possible
                     print(f"Time {self.env.now}: Car {self.car_id} overtaking {ahead_car.car_id}")
-                    self.lane = 2  # Move to overtaking lane
+                    self.road.change_lane(self, 2)  # Move to overtaking lane
                 else:
                     print(f"Time {self.env.now}: Car {self.car_id} slowing down for {ahead_car.car_id}")
                     self.speed = max(self.speed - 2, 1)  # Reduce speed but don't stop
 
             # Move car based on speed and interval
+            old_position = self.position
             self.position += self.speed * self.interval
+            self.road.move_car(self, old_position)
             print(f"Time {self.env.now}: Car {self.car_id} at {self.position:.2f}m, Speed {self.speed:.2f} m/s, Lane {self.lane}")
 
             # Check if braking needs to start
@@ -193,7 +210,9 @@ class Car:
             self.speed -= 2  # Reduce speed by 2 m/s every interval
             if self.speed < 0:
                 self.speed = 0
+            old_position = self.position
             self.position += self.speed * self.interval
+            self.road.move_car(self, old_position)
             print(f"Time {self.env.now}: Car {self.car_id} braking at {self.position:.2f}m, Speed {self.speed:.2f} m/s")
             yield self.env.timeout(self.interval)  # Wait for next update
         
@@ -204,33 +223,44 @@ class Car:
         while self.road.check_cross_traffic():
             yield self.env.timeout(1)  # Wait if cross traffic is present
         print(f"Time {self.env.now}: Car {self.car_id} proceeds through the intersection!")
-        self.lane = 1  # Reset lane after passing intersection
+        self.road.change_lane(self, 1)  # Reset lane after passing intersection
 
 class Road:
-    def __init__(self, env, num_cars, stop_event):
+    def __init__(self, env, num_cars, stop_event, streams=None):
         self.env = env
+        self.streams = streams or RandomStreams()  # per car / purpose, so runs can share draws
         self.cars = []
+        self.lanes = {1: LaneIndex(), 2: LaneIndex()}  # cars per lane, sorted by position
         self.stop_event = stop_event  # Global stop event
         self.create_cars(num_cars)
 
     def create_cars(self, num_cars):
         for i in range(num_cars):
-            speed = random.randint(8, 12)  # Randomized speed
+            speed = self.streams.Random(SPEED, i+1).randint(8, 12)  # Randomized speed
             car = Car(self.env, i+1, speed, interval=1, intersection_dist=50, braking_dist=10, road=self, stop_event=self.stop_event)
             self.cars.append(car)
+            self.lanes[car.lane].Insert(car)
 
     def get_car_in_front(self, car):
-        # Get the car immediately ahead in the same lane
-        ahead_cars = [c for c in self.cars if c.position > car.position and c.lane == car.lane]
-        return min(ahead_cars, key=lambda c: c.position, default=None)
+        # Get the car immediately ahead in the same lane (binary search in the lane index)
+        return self.lanes[car.lane].LeaderAt(car.position)
 
     def can_overtake(self, car):
-        # Check if the overtaking lane is clear
-        return all(c.position < car.position - 5 or c.position > car.position + 5 for c in self.cars if c.lane == 2)
+        # Check if the overtaking lane is clear within 5m either side
+        return self.lanes[2].IsClear(car.position, 5, 5)
+
+    def move_car(self, car, old_position):
+        self.lanes[car.lane].Move(car, old_position)
+
+    def change_lane(self, car, lane):
+        if lane != car.lane:
+            self.lanes[car.lane].Remove(car)
+            car.lane = lane
+            self.lanes[lane].Insert(car)
 
     def check_cross_traffic(self):
         # Simulate presence of cross traffic at intersection randomly
-        return random.choice([True, False])
+        return self.streams.Random(CROSS_TRAFFIC).choice([True, False])
 
 def external_stop(env, stop_event, stop_time):
     yield env.timeout(stop_time)  # Wait until stop condition is met
@@ -0,0 +1,72 @@
+import time
+import numpy as np
+from utils.routetable import ConstructRouteTable
+from utils.dispatch import AssignmentProblem, Assign, HungarianAssignment, QueueClearTimes, TravelTimes, SOLVERS
+from misc.HaulCycleBenchmark import LOAD_TIME, V_MAX
+
+# Decision latency of the dispatch solvers for a 100 truck fleet on the mine
+# route table: building the cost matrix (travel times and shovel queues) and
+# assigning the trucks due for a decision, from one truck at a dump event to
+# the whole fleet at once. Every solver is scored on the true AssignmentProblem.Cost
+# (arrival order queues), not on the slot costs it may optimise, and its decision
+# latency (cost matrix plus assignment) is set against the 1 ms target.
+
+NUM_TRUCKS = 100
+SHOVEL_NODES = [33, 38, 41, 46]  # data/assets.csv
+DECISION_SIZES = [1, 10, 100]  # trucks assigned per decision
+NUM_DECISIONS = 200
+SPEED_SPREAD = 0.2
+TARGET_LATENCY = 1e-3  # s per decision for a 100 truck fleet
+# the opt-in ImproveAssignment polish, to show what it buys and what it costs
+BENCHMARK_SOLVERS = {**SOLVERS, 'polished': lambda problem: HungarianAssignment(problem, improve=True)}
+
+
+def Fleet(route_table, seed=1):
+    """ Truck nodes, speeds, when each is ready and the shovel it is heading to now """
+    rng = np.random.default_rng(seed)
+    truck_nodes = rng.choice(route_table.node_ids, NUM_TRUCKS)
+    speed = V_MAX * rng.uniform(1 - SPEED_SPREAD, 1.0, NUM_TRUCKS)
+    ready_time = rng.uniform(0, 1200, NUM_TRUCKS)
+    heading = rng.integers(0, len(SHOVEL_NODES), NUM_TRUCKS)
+    return truck_nodes, speed, ready_time, heading
+
+
+def Decision(route_table, fleet, size):
+    """ Problem of the size trucks ready first, with the rest of the fleet queued at the shovels """
+    truck_nodes, speed, ready_time, heading = fleet
+    travel_time = TravelTimes(route_table, truck_nodes, SHOVEL_NODES, speed)
+    order = np.argsort(ready_time)
+    deciding, others = order[:size], order[size:]
+    load_time = np.full(len(SHOVEL_NODES), LOAD_TIME)
+    arrival = ready_time[others] + travel_time[others, heading[others]]
+    shovel_free = QueueClearTimes(arrival, heading[others], load_time)
+    return AssignmentProblem(travel_time[deciding], load_time, ready_time[deciding], shovel_free)
+
+
+def TimeDecisions(route_table, fleet, size, solver):
+    start = time.perf_counter()
+    for _ in range(NUM_DECISIONS):
+        problem = Decision(route_table, fleet, size)
+    built = (time.perf_counter() - start) / NUM_DECISIONS
+    start = time.perf_counter()
+    for _ in range(NUM_DECISIONS):
+        shovel = Assign(problem, solver)
+    solved = (time.perf_counter() - start) / NUM_DECISIONS
+    return built, solved, problem.Cost(shovel)
+
+
+if __name__ == '__main__':
+    route_table = ConstructRouteTable("./data/RouteCoords.cfg", "./data/RouteNodes.cfg")
+    fleet = Fleet(route_table)
+    for size in DECISION_SIZES:
+        for name, solver in BENCHMARK_SOLVERS.items():
+            try:
+                built, solved, cost = TimeDecisions(route_table, fleet, size, solver)
+            except ImportError as error:
+                print(f'{size:4d} trucks {name:10s} skipped: {error}')
+                continue
+            latency = built + solved
+            verdict = 'within' if latency < TARGET_LATENCY else 'over'
+            print(f'{size:4d} trucks {name:10s} cost matrix {built * 1e3:6.3f} ms, assignment {solved * 1e3:7.3f} ms, '
+                  f'decision {latency * 1e3:7.3f} ms ({verdict} the {TARGET_LATENCY * 1e3:g} ms target), '
+                  f'true cost {cost:9.1f} s ({cost / size:7.1f} s per truck)')
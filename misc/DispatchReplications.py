@@ -0,0 +1,111 @@
+import time
+import numpy as np
+import simpy
+from utils.bundle import LoadMineData
+from utils.haulage import HaulTruck
+from utils.replication import ComparePolicies, PairedReport
+from utils.streams import RandomStreams, BREAKDOWN, LOAD_TIME, SPEED
+from misc.HaulCycleBenchmark import HaulCycles, ACCELERATION, DECELERATION, DISPATCH_INTERVAL, V_MAX
+
+# Compares truck allocation policies over seeded stochastic replications of a
+# shift on the mine haul cycles, fanned out over every core. Both policies of a
+# replication see the same truck speeds, stop times and breakdowns (common
+# random numbers), so the paired difference needs far fewer replications.
+
+NUM_TRUCKS = 40
+SHIFT_HOURS = 4
+SPEED_SPREAD = 0.1  # top speeds uniform within 10% below V_MAX
+LOAD_TIME_SPREAD = 0.2  # mean loader / dump times uniform within +-20%
+STOP_TIME_SPREAD = 0.1  # each stop uniform within +-10% of its loader / dump mean
+MEAN_TIME_BETWEEN_FAILURES = 10 * 3600  # s, exponential
+MEAN_TIME_TO_REPAIR = 1800  # s, exponential, taken at the next stop
+
+_road_network = None
+
+
+def RoadNetwork():
+    """ Road network, loaded once per worker process """
+    global _road_network
+    if _road_network is None:
+        _road_network = LoadMineData("./data")['road_network']
+    return _road_network
+
+
+def RoundRobin(routes, num_trucks):
+    """ Trucks spread evenly over the haul cycles """
+    return [i % len(routes) for i in range(num_trucks)]
+
+
+def ByCycleLength(routes, num_trucks):
+    """ Trucks allocated in proportion to the length of each haul cycle """
+    lengths = np.array([sum(seg.length for seg in route) for route in routes])
+    share = lengths / lengths.sum() * num_trucks
+    counts = np.floor(share).astype(int)
+    counts[np.argsort(counts - share)[:num_trucks - counts.sum()]] += 1  # largest remainders
+    return np.repeat(np.arange(len(routes)), counts).tolist()
+
+
+POLICIES = {'round robin': RoundRobin, 'by cycle length': ByCycleLength}
+
+
+class TruckDelays:
+    """
+    Stop times of one truck: the loader / dump mean of the stop (stop_means,
+    by segment name) within +-STOP_TIME_SPREAD, plus a repair at the first
+    stop after a breakdown. Drawn from the truck's own streams, so they do not
+    depend on the policy.
+    """
+
+    def __init__(self, streams, name, stop_means):
+        self.stop_means = stop_means
+        self.load_time = streams.Generator(LOAD_TIME, name)
+        self.breakdown = streams.Generator(BREAKDOWN, name)
+        self.next_failure = self.breakdown.exponential(MEAN_TIME_BETWEEN_FAILURES)
+        self.breakdowns = 0
+
+    def __call__(self, truck, seg):
+        dwell = self.stop_means.get(seg.name, seg.dwell) * self.load_time.uniform(1 - STOP_TIME_SPREAD, 1 + STOP_TIME_SPREAD)
+        if truck.env.now >= self.next_failure:
+            dwell += self.breakdown.exponential(MEAN_TIME_TO_REPAIR)
+            self.next_failure = truck.env.now + dwell + self.breakdown.exponential(MEAN_TIME_BETWEEN_FAILURES)
+            self.breakdowns += 1
+        return dwell
+
+
+def HaulShift(policy, seed):
+    """ One shift with random loader / dump times, breakdowns and truck top speeds, returns its KPIs """
+    streams = RandomStreams(seed)
+    routes = HaulCycles(RoadNetwork())
+    stop_means = {seg.name: seg.dwell * streams.Generator(LOAD_TIME, f'loader {seg.name}').uniform(1 - LOAD_TIME_SPREAD, 1 + LOAD_TIME_SPREAD)
+                  for route in routes for seg in route if seg.stop_at_end}
+    allocation = POLICIES[policy](routes, NUM_TRUCKS)
+    env = simpy.Environment()
+    started = {}
+    trucks = []
+    for i, r in enumerate(allocation):
+        start_time = started.get(r, 0) * DISPATCH_INTERVAL
+        started[r] = started.get(r, 0) + 1
+        v_max = V_MAX * streams.Generator(SPEED, i).uniform(1 - SPEED_SPREAD, 1.0)
+        trucks.append(HaulTruck(env, i, routes[r], v_max, ACCELERATION, DECELERATION, start_time=start_time,
+                                dwell=TruckDelays(streams, i, stop_means)))
+    env.run(until=SHIFT_HOURS * 3600)
+    loads = np.bincount(allocation, [truck.cycles for truck in trucks], minlength=len(routes))
+    return {'loads': float(loads.sum()),
+            'loads per truck hour': float(loads.sum() / (NUM_TRUCKS * SHIFT_HOURS)),
+            'worst cycle loads': float(loads[np.bincount(allocation, minlength=len(routes)) > 0].min())}
+
+
+def Report(index, kpis, summary):
+    name = 'loads [B - A]'
+    print(f'  replication {index:3d}: {kpis[name]:+5.0f} loads, running mean {summary.mean.get(name, np.nan):+7.1f} '
+          f'+- {summary.HalfWidth(name) if summary.count else np.inf:.1f} over {summary.count}')
+
+
+if __name__ == '__main__':
+    RoadNetwork()  # build the cache before the workers start
+    policy_a, policy_b = POLICIES
+    print(f'{policy_b} - {policy_a}')
+    start = time.perf_counter()
+    summary, results = ComparePolicies(HaulShift, policy_a, policy_b, report=Report, seed=2024,
+                                       absolute_precision={'loads': 5.0, 'loads per truck hour': 0.03, 'worst cycle loads': 2.0})
+    print(f'{PairedReport(summary, policy_a, policy_b)}\n  {len(results)} replications in {time.perf_counter() - start:.1f} s')
@@ -0,0 +1,198 @@
+import time
+import numpy as np
+import simpy
+from utils.bundle import LoadMineData
+from utils.fleet import FleetKinematics
+from utils.haulage import HaulTruck, RouteSegments, Segment
+
+# Compares the next-event HaulTruck against polling every second (the
+# misc/CarsSimMultipleLanes.py Car.drive pattern) for a fleet on a haul cycle,
+# and the fixed-step FleetKinematics against both: speed, agreement of its
+# trajectories with HaulTruck's, and throughput for thousands of trucks.
+
+NUM_TRUCKS = 80
+SHIFT_HOURS = 12
+POLLING_HOURS = 1  # the polling model is slow, it is timed over a shorter run
+DISPATCH_INTERVAL = 45  # seconds between trucks leaving the loader
+# (load, dump) ids; no cycle drives through another's loader or dump, see HaulCycles
+HAUL_CYCLES = [(282, 333), (91, 27), (290, 216), (232, 94), (46, 12), (84, 68), (306, 49), (53, 336)]
+LOAD_TIME, DUMP_TIME = 150, 60
+V_MAX, ACCELERATION, DECELERATION = 40 / 3.6, 0.5, 1.0  # Cat 793 like, m/s and m/s^2
+FLEET_STEPS = [0.1, 0.5]  # seconds, FleetKinematics step lengths compared
+FLEET_HOURS = 1
+# agreement with HaulTruck asserted over FLEET_HOURS: the fleet's distance driven, and the median truck's worst
+# difference as a fraction of its distance driven. A truck's own worst difference is not bounded this way: two
+# trucks reaching a merge within a step of each other may enter in the other order, which shifts both by a gap
+FLEET_TOLERANCE, TRUCK_TOLERANCE = 0.005, 0.01
+DENSE_RINGS, DENSE_TRUCKS_PER_RING, DENSE_RING_LENGTH = 100, 40, 10000.0  # 4000 trucks on two-lane rings
+
+
+class CountingEnvironment(simpy.Environment):
+    def __init__(self):
+        super().__init__()
+        self.steps = 0
+
+    def step(self):
+        self.steps += 1
+        super().step()
+
+
+class PollingTruck:
+    """ Fixed-interval reference: wakes every interval, moves, checks the truck ahead """
+
+    def __init__(self, env, route, queues, interval=1.0, start_time=0.0, min_gap=30.0):
+        self.env = env
+        self.route = route
+        self.queues = queues  # segment name -> trucks on it, scanned like Road.get_car_in_front
+        self.interval = interval
+        self.min_gap = min_gap
+        self.index = 0
+        self.position = 0.0
+        self.speed = 0.0
+        env.process(self.drive(start_time))
+
+    def drive(self, start_time):
+        yield self.env.timeout(start_time)
+        self.queues.setdefault(self.route[0].name, []).append(self)
+        while True:
+            seg = self.route[self.index]
+            ahead = [t for t in self.queues[seg.name] if t.position > self.position]
+            braking_dist = self.speed * self.speed / (2 * DECELERATION)
+            stop_at = seg.length if not ahead else min(seg.length, min(t.position for t in ahead) - self.min_gap)
+            if stop_at - self.position <= braking_dist + self.speed * self.interval:
+                self.speed = max(self.speed - DECELERATION * self.interval, 0.0)
+            else:
+                self.speed = min(self.speed + ACCELERATION * self.interval, V_MAX)
+            self.position = min(self.position + self.speed * self.interval, stop_at if ahead else seg.length)
+            if self.position >= seg.length:
+                if seg.dwell:
+                    yield self.env.timeout(seg.dwell)
+                self.queues[seg.name].remove(self)
+                self.index = (self.index + 1) % len(self.route)
+                self.position = 0.0
+                self.queues.setdefault(self.route[self.index].name, []).append(self)
+            yield self.env.timeout(self.interval)
+
+
+def HaulCycles(road_network, haul_cycles=None):
+    """
+    One looping route per (load, dump) pair, sharing the segments they have
+    in common. The dwell is a property of the shared segment, so a route
+    through another cycle's loader or dump would queue and dwell there too;
+    with single-file roads that backs the queue up into the routes feeding
+    the loader until the fleet gridlocks. ValueError for such cycles.
+    """
+    segments = {}
+    routes = []
+    leg_ends = []
+    for load_id, dump_id in haul_cycles or HAUL_CYCLES:
+        loaded = RouteSegments(road_network, road_network.FindMinimumValueRoute(load_id, dump_id), segments, V_MAX)
+        empty = RouteSegments(road_network, road_network.FindMinimumValueRoute(dump_id, load_id), segments, V_MAX)
+        for seg, dwell in ((loaded[-1], DUMP_TIME), (empty[-1], LOAD_TIME)):
+            seg.dwell = dwell
+            seg.stop_at_end = True
+        routes.append(loaded + empty)
+        leg_ends.append({len(loaded) - 1, len(loaded) + len(empty) - 1})
+    for (load_id, dump_id), route, ends in zip(haul_cycles or HAUL_CYCLES, routes, leg_ends):
+        for k, seg in enumerate(route):
+            if seg.stop_at_end and k not in ends:
+                raise ValueError(f'Haul cycle {load_id}-{dump_id} drives through the stop at the end of segment {seg.name}')
+    return routes
+
+
+def Run(name, road_network, make_truck, hours):
+    env = CountingEnvironment()
+    routes = HaulCycles(road_network)
+    # trucks leave each loader DISPATCH_INTERVAL apart
+    trucks = [make_truck(env, routes[i % len(routes)], i, (i // len(routes)) * DISPATCH_INTERVAL) for i in range(NUM_TRUCKS)]
+    start = time.perf_counter()
+    env.run(until=hours * 3600)
+    elapsed = time.perf_counter() - start
+    print(f'{name:12s} {hours:4g} h simulated in {elapsed:7.2f} s: {hours / elapsed:8.1f} sim h / wall s, {env.steps} SimPy events')
+    return trucks
+
+
+def RecordedDistance(truck, times):
+    """ Distance driven by a HaulTruck(record=True) at each of times, from its phases """
+    starts = np.concatenate([[0.0], np.cumsum([seg.length for seg in truck.route])])
+    t0, index, s0, v0, a = (np.array(column) for column in zip(*truck.phases))
+    index = index.astype(np.int64)
+    cycles = np.concatenate([[0], np.cumsum(np.diff(index) < 0)])
+    row = np.maximum(np.searchsorted(t0, times, side='right') - 1, 0)
+    dt = np.clip(times - t0[row], 0.0, np.append(np.diff(t0), np.inf)[row])
+    dt = np.where(a[row] < 0, np.minimum(dt, v0[row] / np.maximum(-a[row], 1e-12)), dt)
+    distance = cycles[row] * starts[-1] + starts[index[row]] + s0[row] + v0[row] * dt + 0.5 * a[row] * dt * dt
+    return np.where(times >= t0[0], distance, 0.0)
+
+
+def CompareFleet(road_network, num_trucks, dt, hours):
+    """
+    Runs HaulTruck and FleetKinematics on the same fleet, returns the per truck
+    worst distance difference and the distances driven by each at the end
+    """
+    env = simpy.Environment()
+    routes = HaulCycles(road_network)
+    fleet_routes = [routes[i % len(routes)] for i in range(num_trucks)]
+    start_times = [(i // len(routes)) * DISPATCH_INTERVAL for i in range(num_trucks)]
+    trucks = [HaulTruck(env, i, route, V_MAX, ACCELERATION, DECELERATION, start_time=start_time, record=True)
+              for i, (route, start_time) in enumerate(zip(fleet_routes, start_times))]
+    env.run(until=hours * 3600)
+
+    fleet = FleetKinematics(fleet_routes, V_MAX, ACCELERATION, DECELERATION, start_times=start_times)
+    times = np.arange(1, int(hours * 3600 / dt) + 1) * dt
+    distance = np.empty((len(times), num_trucks))
+    for row in range(len(times)):
+        fleet.Step(dt)
+        distance[row] = fleet.odometer
+    reference = np.column_stack([RecordedDistance(truck, times) for truck in trucks])
+    return np.abs(distance - reference).max(axis=0), distance[-1], reference[-1]
+
+
+def DenseRings(rings=DENSE_RINGS, trucks_per_ring=DENSE_TRUCKS_PER_RING, length=DENSE_RING_LENGTH):
+    """ Closed loops of a two-lane and three one-lane segments with evenly spread trucks of mixed top speed """
+    routes = []
+    for _ in range(rings):
+        ring = [Segment(length / 4, lanes=2 if k == 0 else 1) for k in range(4)]
+        routes += [ring] * trucks_per_ring
+    rng = np.random.default_rng(0)
+    v_max = rng.uniform(0.75, 1.0, len(routes)) * V_MAX
+    # trucks enter one ring DISPATCH_INTERVAL apart, the rings in parallel
+    start_times = np.tile(np.arange(trucks_per_ring) * DISPATCH_INTERVAL, rings)
+    return routes, v_max, start_times
+
+
+def RunFleet(name, fleet, dt, hours):
+    start = time.perf_counter()
+    steps = fleet.Run(hours * 3600, dt)
+    elapsed = time.perf_counter() - start
+    print(f'{name:12s} {hours:4g} h simulated in {elapsed:7.2f} s: {hours / elapsed:8.2f} sim h / wall s, '
+          f'{steps} steps of {dt:g} s for {len(fleet)} trucks ({elapsed / steps * 1e3:.2f} ms per step)')
+
+
+if __name__ == '__main__':
+    road_network = LoadMineData("./data")['road_network']
+    trucks = Run('next-event', road_network,
+                 lambda env, route, i, start_time: HaulTruck(env, i, route, V_MAX, ACCELERATION, DECELERATION, start_time=start_time),
+                 SHIFT_HOURS)
+    print(f'  {sum(t.cycles for t in trucks)} haul cycles completed, {sum(t.events for t in trucks)} truck wake-ups')
+    queues = {}
+    Run('polling 1 s', road_network,
+        lambda env, route, i, start_time: PollingTruck(env, route, queues, start_time=start_time),
+        POLLING_HOURS)
+    routes = HaulCycles(road_network)
+    for dt in FLEET_STEPS:
+        fleet = FleetKinematics([routes[i % len(routes)] for i in range(NUM_TRUCKS)], V_MAX, ACCELERATION, DECELERATION,
+                                start_times=[(i // len(routes)) * DISPATCH_INTERVAL for i in range(NUM_TRUCKS)])
+        RunFleet(f'fixed {dt:g} s', fleet, dt, FLEET_HOURS)
+        # one truck per haul cycle only meets others at merges, the full fleet queues
+        for num_trucks in (len(HAUL_CYCLES), NUM_TRUCKS):
+            error, driven, reference = CompareFleet(road_network, num_trucks, dt, FLEET_HOURS)
+            fleet_error = abs(driven.sum() - reference.sum()) / reference.sum()
+            print(f'  {num_trucks:3d} trucks, distance driven vs next-event: fleet within {fleet_error:.2%}, '
+                  f'median truck within {np.median(error):.1f} m, worst {error.max():.1f} m')
+            assert fleet_error <= FLEET_TOLERANCE, f'fleet distance off by {fleet_error:.2%}'
+            assert np.median(error) <= TRUCK_TOLERANCE * np.median(reference), f'median truck off by {np.median(error):.1f} m'
+    routes, v_max, start_times = DenseRings()
+    fleet = FleetKinematics(routes, v_max, ACCELERATION, DECELERATION, start_times=start_times)
+    RunFleet('dense 0.5 s', fleet, 0.5, 1)
+    print(f'  {fleet}, {fleet.odometer.sum() / 1000:.0f} km driven')
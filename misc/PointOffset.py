@@ -35,11 +35,7 @@ assets = ConstructLocationAssets("./data/assets.csv", road_points)
 
 offset_point_list = []
 for r in roads:
-    points=[]
-    map_points = points_map.GetPoints(r.nodes)    
-    for i, p in enumerate(map_points):
-        points.append([p.x, p.y])
-    offset_point_list.append(np.array(points))        
+    offset_point_list.append(points_map.GetCoordinates(r.nodes))
 
 #points = np.array(points)
 
@@ -1,9 +1,12 @@
+import math
 import numpy as np
 import matplotlib.pyplot as plt
-from utils.map import ConstructLocationAssets, ConstructPointsMap, ConstructRoads, RoadPoints, euclidean_distance 
+from utils.map import ConstructLocationAssets, ConstructPointsMap, ConstructRoads, RoadPoints 
+from utils.merge import MergeRoadPoints
 
 # Define adjustable merging threshold
 MERGE_DISTANCE_THRESHOLD = 10  # You can change this value
+MERGE_CLOSE_POINTS = True  # sanitise all roads with utils.merge.MergeRoadPoints before offsetting
 
 def merge_close_points_0(points, threshold=MERGE_DISTANCE_THRESHOLD):
     """Merges points that are closer than the given threshold."""
@@ -15,7 +18,7 @@ def merge_close_points_0(points, threshold=MERGE_DISTANCE_THRESHOLD):
 
         points_to_keep = []
         for pt in points:
-            if euclidean_distance(base_point, pt) < threshold:
+            if math.dist(base_point, pt) < threshold:
                 close_points.append(pt)
             else:
                 points_to_keep.append(pt)
@@ -42,7 +45,7 @@ def merge_close_points(orig_points, threshold=MERGE_DISTANCE_THRESHOLD):
     close_points = [base_point]
     while points:        
         next_point = points.pop(0)        
-        if euclidean_distance(base_point, next_point) < threshold:                        
+        if math.dist(base_point, next_point) < threshold:                        
             close_points.append(next_point)
         else:
             if len(close_points) > 1:  # at least 2 close enough points
@@ -93,16 +96,16 @@ road_points_sanitized = ConstructPointsMap("./data/RouteCoords.cfg")
 
 offset_point_list = []
 for r in roads:
-    points=[]
-    map_points = points_map.GetPoints(r.nodes)    
-    for i, p in enumerate(map_points):
-        points.append([p.x, p.y])
+    points = points_map.GetCoordinates(r.nodes)
 
     # Merge close points before storing
     #merged_points = merge_close_points(points)
 
 
-    offset_point_list.append(np.array(points))        
+    offset_point_list.append(points)
+
+if MERGE_CLOSE_POINTS:
+    offset_point_list = [p for p in MergeRoadPoints(offset_point_list, MERGE_DISTANCE_THRESHOLD) if len(p) > 1]
 
 offset_distance = 10
 
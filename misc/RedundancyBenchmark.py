@@ -0,0 +1,59 @@
+import time
+import numpy as np
+from scipy.optimize import linprog
+from utils.allocation import FlowAllocation
+from utils.diagnostics import ConstraintSystem, FindRedundantConstraints, TOLERANCE
+
+# Redundant constraint detection on a large flow allocation model: the single
+# pass of utils.diagnostics against the notebook's drop-a-row-and-re-solve loop
+# (models/DispatchingSnippets.ipynb CheckForRedundantContraints).
+
+NUM_SHOVELS = 150
+NUM_DUMPS = 40
+PAIR_DENSITY = 0.3
+LOOSE_DUMPS = 0.5  # share of dumps whose capacity exceeds every shovel that can reach them
+
+
+def SyntheticModel(seed=1):
+    rng = np.random.default_rng(seed)
+    pairs = np.argwhere(rng.random((NUM_SHOVELS, NUM_DUMPS)) < PAIR_DENSITY)
+    shovel_rate = rng.uniform(1500, 3000, NUM_SHOVELS)
+    dump_capacity = rng.uniform(4000, 12000, NUM_DUMPS)
+    reach = np.bincount(pairs[:, 1], shovel_rate[pairs[:, 0]], minlength=NUM_DUMPS)
+    loose = rng.random(NUM_DUMPS) < LOOSE_DUMPS
+    dump_capacity[loose] = reach[loose] * 1.1
+    cycle_time = rng.uniform(0.3, 1.2, len(pairs))
+    return FlowAllocation(pairs, shovel_rate, dump_capacity, cycle_time, 400, 0.6 * shovel_rate.sum())
+
+
+def DropAndResolve(allocation):
+    """ The notebook's check, on linprog with a tolerance instead of == """
+    arguments = allocation.Linprog()
+    full = linprog(**arguments).fun
+    system = ConstraintSystem.FromAllocation(allocation)
+    finite_upper = np.flatnonzero(np.isfinite(system.row_upper))
+    finite_lower = np.flatnonzero(np.isfinite(system.row_lower))
+    rows = np.concatenate([finite_upper, finite_lower])  # rows of A_ub in Linprog order
+    redundant = []
+    for row in range(len(system.names)):
+        keep = rows != row
+        result = linprog(arguments['c'], A_ub=arguments['A_ub'][keep], b_ub=arguments['b_ub'][keep], bounds=(0, None), method='highs')
+        if result.status == 0 and abs(result.fun - full) <= TOLERANCE * max(1.0, abs(full)):
+            redundant.append(system.names[row])
+    return redundant
+
+
+if __name__ == '__main__':
+    allocation = SyntheticModel()
+    system = ConstraintSystem.FromAllocation(allocation)
+    print(system)
+    for workers in (1, None):
+        start = time.perf_counter()
+        redundant = FindRedundantConstraints(system, workers=workers)
+        kinds = {kind: sum(1 for k in redundant.values() if k == kind) for kind in ('bounds', 'lp')}
+        print(f'single pass, {workers or "all"} workers: {len(redundant)} redundant ({kinds["bounds"]} by bounds, '
+              f'{kinds["lp"]} by LP) in {time.perf_counter() - start:.3f} s')
+    start = time.perf_counter()
+    unchanged = DropAndResolve(allocation)
+    print(f'drop and re-solve: {len(unchanged)} rows leave the objective unchanged in {time.perf_counter() - start:.3f} s, '
+          f'{len(set(unchanged) - set(redundant))} of them not implied by the others')
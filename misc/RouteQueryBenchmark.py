@@ -0,0 +1,109 @@
+import random
+import time
+import numpy as np
+from utils.map import ConstructRoadNetwork, ConstructRoadPointLUT, RoadNetwork, RoadPoint, RouteCache
+from utils.contraction import ContractionHierarchy
+
+# Compares per-query latency of RoadNetwork.FindMinimumValueRoute (Dijkstra)
+# against a contraction hierarchy on the mine map and on synthetic survey-sized grids,
+# then the route cache on a simulation-like workload that repeats a few pairs,
+# and the batch queries (RoutesFrom, DistanceMatrix) against one query per pair.
+
+NUM_QUERIES = 500
+NUM_REPEATED_PAIRS = 40  # distinct (start, target) pairs of the cached workload
+NUM_CACHED_QUERIES = 5000
+CACHE_SIZES = [0, 32, 4096]
+NUM_BATCH_SOURCES, NUM_BATCH_TARGETS = 10, 20  # e.g. trucks to loaders and dumps
+GRID_SIZES = [30, 100]  # grid side length, 100 -> 10,000 nodes
+GRID_SPACING = 25.0     # metres between grid nodes
+
+
+def SyntheticPitNetwork(size, spacing=GRID_SPACING, seed=1):
+    """ Dual carriageway grid with jittered node positions and a few missing segments """
+    rng = random.Random(seed)
+    road_point_lut = {}
+    for r in range(size):
+        for c in range(size):
+            node_id = r * size + c + 1
+            x = c * spacing + rng.uniform(-0.3, 0.3) * spacing
+            y = r * spacing + rng.uniform(-0.3, 0.3) * spacing
+            road_point_lut[node_id] = RoadPoint(node_id, x, y, 'P', 'Synthetic')
+
+    road_net = RoadNetwork()
+    road_net.SetNodeCoordinates(road_point_lut)
+    for r in range(size):
+        for c in range(size):
+            a = r * size + c + 1
+            for b in (a + 1 if c + 1 < size else None, a + size if r + 1 < size else None):
+                if b is None or rng.random() < 0.1:
+                    continue
+                pa, pb = road_point_lut[a], road_point_lut[b]
+                distance = float(np.hypot(pa.x - pb.x, pa.y - pb.y))
+                road_net.AddSegment(a, b, distance)
+                road_net.AddSegment(b, a, distance)
+    road_net.Compile()
+    return road_net
+
+
+def RouteCost(road_net, path):
+    if path is None:
+        return None
+    costs = {(int(s), int(e)): c for s, e, c in zip(*road_net.Compile().Edges())}
+    return sum(costs[(a, b)] for a, b in zip(path, path[1:]))
+
+
+def TimeQueries(router, queries):
+    start = time.perf_counter()
+    paths = [router.FindMinimumValueRoute(s, t) for s, t in queries]
+    return (time.perf_counter() - start) / len(queries), paths
+
+
+def Benchmark(name, road_net, seed=2):
+    rng = random.Random(seed)
+    node_ids = road_net.Compile().node_ids.tolist()
+    queries = [(rng.choice(node_ids), rng.choice(node_ids)) for _ in range(NUM_QUERIES)]
+
+    start = time.perf_counter()
+    hierarchy = ContractionHierarchy.Build(road_net)
+    build_time = time.perf_counter() - start
+
+    road_net.SetRouteCacheSize(0)  # random pairs, timed uncached
+    dijkstra_latency, dijkstra_paths = TimeQueries(road_net, queries)
+    ch_latency, ch_paths = TimeQueries(hierarchy, queries)
+    mismatches = sum(1 for a, b in zip(dijkstra_paths, ch_paths)
+                     if (a is None) != (b is None) or (a is not None and abs(RouteCost(road_net, a) - RouteCost(road_net, b)) > 1e-6))
+
+    print(f'{name}: {len(node_ids)} nodes, {hierarchy}, built in {build_time:.2f} s')
+    print(f'  dijkstra     {dijkstra_latency * 1e6:10.1f} us/query')
+    print(f'  contraction  {ch_latency * 1e6:10.1f} us/query  ({dijkstra_latency / ch_latency:.1f}x), cost mismatches = {mismatches}')
+
+    pairs = [(rng.choice(node_ids), rng.choice(node_ids)) for _ in range(NUM_REPEATED_PAIRS)]
+    repeated = [rng.choice(pairs) for _ in range(NUM_CACHED_QUERIES)]
+    for size in CACHE_SIZES:
+        road_net.route_cache = RouteCache(size)
+        latency, cached_paths = TimeQueries(road_net, repeated)
+        print(f'  cache {size:5d}   {latency * 1e6:10.1f} us/query, {road_net.route_cache}')
+
+    road_net.SetRouteCacheSize(0)
+    sources = [rng.choice(node_ids) for _ in range(NUM_BATCH_SOURCES)]
+    targets = [rng.choice(node_ids) for _ in range(NUM_BATCH_TARGETS)]
+    start = time.perf_counter()
+    pair_routes = [[road_net.FindMinimumValueRoute(s, t) for t in targets] for s in sources]
+    pair_time = time.perf_counter() - start
+    start = time.perf_counter()
+    batch_routes = [road_net.RoutesFrom(s, targets) for s in sources]
+    batch_time = time.perf_counter() - start
+    start = time.perf_counter()
+    distances, _ = road_net.DistanceMatrix(sources, targets)
+    matrix_time = time.perf_counter() - start
+    mismatches = sum(1 for row, batch in zip(pair_routes, batch_routes) for a, t in zip(row, targets)
+                     if (a is None) != (batch[t] is None) or (a is not None and abs(RouteCost(road_net, a) - RouteCost(road_net, batch[t])) > 1e-6))
+    print(f'  {NUM_BATCH_SOURCES}x{NUM_BATCH_TARGETS} routes: per pair {pair_time * 1e3:.1f} ms, RoutesFrom {batch_time * 1e3:.1f} ms '
+          f'({pair_time / batch_time:.1f}x), DistanceMatrix {matrix_time * 1e3:.1f} ms, cost mismatches = {mismatches}')
+
+
+if __name__ == '__main__':
+    road_points_lut = ConstructRoadPointLUT("./data/RouteCoords.cfg")
+    Benchmark('Mine map', ConstructRoadNetwork("./data/RouteNodes.cfg", road_points_lut))
+    for size in GRID_SIZES:
+        Benchmark(f'Grid {size}x{size}', SyntheticPitNetwork(size))
@@ -0,0 +1,133 @@
+import time
+import numpy as np
+from scipy import sparse
+import highspy
+
+PAYLOAD = 220.0  # t per truck load, Cat 793 like
+SHORTFALL_COST = 1e3  # objective cost of a t/h below the production target, well above any haul cost
+INFINITY = highspy.kHighsInf
+
+
+class FlowAllocation:
+    """
+    Shovel to dump flow rates (t/h), the transportation model of
+    models/DispatchingSnippets.ipynb as the upper stage of dispatch:
+
+        min  sum cost[p] * x[p] + SHORTFALL_COST * shortfall
+        s.t. sum of x leaving shovel i    <= shovel_rate[i]
+             sum of x reaching dump j     <= dump_capacity[j]
+             sum x + shortfall            >= target
+             sum x[p] * cycle_time[p] / payload <= trucks   (trucks in use)
+
+    over the (shovel, dump) pairs with a haul route, cost[p] being the
+    cycle time per t. The matrix is built once as a sparse array and stays in
+    a HiGHS instance; events change row bounds (rates, capacities, target,
+    trucks) and costs, then Solve continues from the previous basis. Changed
+    cycle times also rewrite the fleet row, which HiGHS does in place.
+
+    history - per Solve: {'event', 'seconds', 'iterations', 'objective', 'status'}
+    """
+
+    def __init__(self, pairs, shovel_rate, dump_capacity, cycle_time, trucks, target, payload=PAYLOAD):
+        self.pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+        self.num_shovels = len(shovel_rate)
+        self.num_dumps = len(dump_capacity)
+        self.payload = payload
+        num_pairs = len(self.pairs)
+        self.shortfall = num_pairs  # column of the shortfall
+        self.target_row = self.num_shovels + self.num_dumps
+        self.fleet_row = self.target_row + 1
+        self.cycle_time = np.asarray(cycle_time, dtype=np.float64).copy()
+
+        pair_columns = np.arange(num_pairs)
+        rows = np.concatenate([self.pairs[:, 0], self.num_shovels + self.pairs[:, 1],
+                               np.full(num_pairs + 1, self.target_row), np.full(num_pairs, self.fleet_row)])
+        columns = np.concatenate([pair_columns, pair_columns, np.arange(num_pairs + 1), pair_columns])
+        values = np.concatenate([np.ones(3 * num_pairs + 1), self.cycle_time / payload])
+        self.matrix = sparse.csc_matrix((values, (rows, columns)), shape=(self.fleet_row + 1, num_pairs + 1))
+        self.cost = np.append(self.cycle_time / payload, SHORTFALL_COST)
+        self.row_lower = np.full(self.fleet_row + 1, -INFINITY)
+        self.row_upper = np.concatenate([shovel_rate, dump_capacity, [INFINITY, trucks]]).astype(np.float64)
+        self.row_lower[self.target_row] = target
+
+        lp = highspy.HighsLp()
+        lp.num_col_ = num_pairs + 1
+        lp.num_row_ = self.fleet_row + 1
+        lp.a_matrix_.num_col_ = lp.num_col_
+        lp.a_matrix_.num_row_ = lp.num_row_
+        lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+        lp.a_matrix_.start_ = self.matrix.indptr
+        lp.a_matrix_.index_ = self.matrix.indices
+        lp.a_matrix_.value_ = self.matrix.data
+        lp.col_cost_ = self.cost
+        lp.col_lower_ = np.zeros(num_pairs + 1)
+        lp.col_upper_ = np.full(num_pairs + 1, INFINITY)
+        lp.row_lower_ = self.row_lower
+        lp.row_upper_ = self.row_upper
+        self.highs = highspy.Highs()
+        self.highs.setOptionValue('output_flag', False)
+        self.highs.passModel(lp)
+        self.history = []
+        self.flows = None
+        self.shortfall_rate = None
+
+    def __str__(self):
+        return f'Flow allocation over {len(self.pairs)} shovel-dump pairs, {len(self.history)} solves'
+
+    def _SetRowUpper(self, row, value):
+        self.row_upper[row] = value
+        self.highs.changeRowBounds(row, self.row_lower[row], value)
+
+    def SetShovelRate(self, shovel, rate):
+        """ Digging rate of a shovel (t/h), 0 while it is down """
+        self._SetRowUpper(shovel, rate)
+
+    def SetDumpCapacity(self, dump, capacity):
+        self._SetRowUpper(self.num_shovels + dump, capacity)
+
+    def SetTrucks(self, trucks):
+        """ Trucks available for hauling """
+        self._SetRowUpper(self.fleet_row, trucks)
+
+    def SetTarget(self, target):
+        """ Production target (t/h) """
+        self.row_lower[self.target_row] = target
+        self.highs.changeRowBounds(self.target_row, target, self.row_upper[self.target_row])
+
+    def SetCycleTimes(self, pairs, cycle_time):
+        """ Cycle times (h) of the pairs at the given indexes: their costs and fleet row coefficients """
+        pairs = np.atleast_1d(np.asarray(pairs, dtype=np.int32))
+        self.cycle_time[pairs] = cycle_time
+        self.cost[pairs] = self.cycle_time[pairs] / self.payload
+        self.highs.changeColsCost(len(pairs), pairs, self.cost[pairs])
+        for p in pairs.tolist():
+            self.highs.changeCoeff(self.fleet_row, p, self.cycle_time[p] / self.payload)
+        self.matrix[self.fleet_row, pairs] = self.cycle_time[pairs] / self.payload
+
+    def Solve(self, event=None):
+        """ Re-solves from the previous basis, returns the flow of every pair (t/h) """
+        start = time.perf_counter()
+        self.highs.run()
+        seconds = time.perf_counter() - start
+        status = self.highs.getModelStatus()
+        info = self.highs.getInfo()
+        self.history.append({'event': event, 'seconds': seconds, 'iterations': info.simplex_iteration_count,
+                             'objective': info.objective_function_value, 'status': self.highs.modelStatusToString(status)})
+        if status != highspy.HighsModelStatus.kOptimal:
+            raise RuntimeError(f'Flow allocation {self.highs.modelStatusToString(status)} at {event}')
+        solution = np.asarray(self.highs.getSolution().col_value)
+        self.flows = solution[:self.shortfall]
+        self.shortfall_rate = float(solution[self.shortfall])  # t/h below the target
+        return self.flows
+
+    def TrucksPerPair(self):
+        """ Trucks the last solution puts on each pair """
+        return self.flows * self.cycle_time / self.payload
+
+    def Linprog(self):
+        """ The current model as scipy.optimize.linprog arguments, for a cold solve """
+        upper = np.isfinite(self.row_upper) & (self.row_upper < INFINITY)
+        lower = self.row_lower > -INFINITY
+        a_ub = sparse.vstack([self.matrix[upper], -self.matrix[lower]]).tocsc()
+        b_ub = np.concatenate([self.row_upper[upper], -self.row_lower[lower]])
+        return {'c': self.cost.copy(), 'A_ub': a_ub, 'b_ub': b_ub, 'bounds': (0, None), 'method': 'highs'}
@@ -0,0 +1,235 @@
+import hashlib
+import json
+import os
+import sys
+import numpy as np
+from utils.points import PointTable
+from utils.map import (Road, BuildRoadNetwork, ConstructPointsMap,
+                       ConstructRoadPointLUT, ConstructRoads, ParseAdjacency, DEFAULT_SPEED_LIMIT)
+
+BUNDLE_MAGIC = b'MHSBNDL\0'
+BUNDLE_VERSION = 2
+BUNDLE_ALIGNMENT = 64
+
+# text sources compiled into the bundle, relative to the data directory
+SOURCE_FILES = {
+    'road_points': 'RoadPoints.csv',
+    'roads': 'Roads.csv',
+    'assets': 'assets.csv',
+    'route_points': 'RouteCoords.cfg',
+    'route_nodes': 'RouteNodes.cfg',
+}
+
+
+def DefaultBundleFilename(data_dir):
+    return os.path.join(data_dir, 'cache', 'network.bundle')
+
+
+def SourceHash(data_dir):
+    """ Content hash of every source file (missing files hash as absent) """
+    digest = hashlib.sha256(f'network-bundle-v{BUNDLE_VERSION}'.encode())
+    for key, name in sorted(SOURCE_FILES.items()):
+        digest.update(key.encode() + b'\0')
+        path = os.path.join(data_dir, name)
+        if os.path.isfile(path):
+            with open(path, "rb") as file:
+                digest.update(file.read())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class NetworkBundle:
+    """
+    Points, roads, adjacency and assets of a data directory in one binary file.
+
+    Layout: magic, uint64 header length, JSON header, then every array at a
+    64 byte aligned offset recorded in the header so it can be memory-mapped.
+    Strings (names, annotations) live in the header.
+    """
+
+    def __init__(self, arrays, meta, source_hash):
+        self.arrays = arrays
+        self.meta = meta
+        self.source_hash = source_hash
+
+    def __str__(self):
+        return f'Network bundle v{BUNDLE_VERSION} with {len(self.arrays)} arrays (source {self.source_hash[:12]})'
+
+    @classmethod
+    def FromTextFiles(cls, data_dir):
+        arrays = {}
+        meta = {}
+        for kind in ('road_points', 'route_points'):
+            path = os.path.join(data_dir, SOURCE_FILES[kind])
+            if not os.path.isfile(path):
+                continue
+            points = ConstructRoadPointLUT(path) if kind == 'route_points' else ConstructPointsMap(path)
+            arrays[f'{kind}/ids'] = points.ids
+            arrays[f'{kind}/x'] = points.xs
+            arrays[f'{kind}/y'] = points.ys
+            arrays[f'{kind}/type_codes'] = points.type_codes
+            arrays[f'{kind}/annotation_codes'] = points.annotation_codes
+            meta[f'{kind}/point_types'] = points.point_types
+            meta[f'{kind}/annotations'] = points.annotations
+
+        path = os.path.join(data_dir, SOURCE_FILES['roads'])
+        if os.path.isfile(path):
+            roads = ConstructRoads(path)
+            arrays['roads/offsets'] = np.cumsum([0] + [len(r.nodes) for r in roads]).astype(np.int64)
+            arrays['roads/nodes'] = np.array([n for r in roads for n in r.nodes], dtype=np.int64)
+            meta['roads/names'] = [[r.start, r.end] for r in roads]
+
+        path = os.path.join(data_dir, SOURCE_FILES['assets'])
+        if os.path.isfile(path):
+            rows = ParseAssetRows(path)
+            arrays['assets/point_ids'] = np.array([r[0] for r in rows], dtype=np.int64)
+            arrays['assets/offsets'] = np.array([[r[1], r[2]] for r in rows], dtype=np.float64).reshape(-1, 2)
+
+        path = os.path.join(data_dir, SOURCE_FILES['route_nodes'])
+        if os.path.isfile(path):
+            arrays['route_nodes/start_ids'], arrays['route_nodes/next_ids'] = ParseAdjacency(path)
+        return cls(arrays, meta, SourceHash(data_dir))
+
+    def Write(self, filename):
+        """ Writes the bundle atomically (temporary file then rename) """
+        layout = {}
+        offset = 0
+        for name, array in self.arrays.items():
+            layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+            offset += -(-array.nbytes // BUNDLE_ALIGNMENT) * BUNDLE_ALIGNMENT
+        header = json.dumps({'version': BUNDLE_VERSION, 'source_hash': self.source_hash,
+                             'arrays': layout, 'meta': self.meta}).encode()
+        data_start = -(-(len(BUNDLE_MAGIC) + 8 + len(header)) // BUNDLE_ALIGNMENT) * BUNDLE_ALIGNMENT
+
+        os.makedirs(os.path.dirname(os.path.abspath(filename)), exist_ok=True)
+        tmp_filename = f'{filename}.tmp{os.getpid()}'
+        with open(tmp_filename, "wb") as file:
+            file.write(BUNDLE_MAGIC)
+            file.write(np.uint64(len(header)).tobytes())
+            file.write(header)
+            for name, array in self.arrays.items():
+                file.seek(data_start + layout[name]['offset'])
+                file.write(np.ascontiguousarray(array).tobytes())
+            file.truncate(data_start + offset)
+        os.replace(tmp_filename, filename)
+
+    @classmethod
+    def Read(cls, filename, mmap=True):
+        """ Opens a bundle, memory-mapping its arrays. ValueError if it is not a current bundle """
+        with open(filename, "rb") as file:
+            if file.read(len(BUNDLE_MAGIC)) != BUNDLE_MAGIC:
+                raise ValueError(f'{filename} is not a network bundle')
+            length_bytes = file.read(8)
+            if len(length_bytes) != 8:
+                raise ValueError(f'{filename} is truncated inside the bundle header')
+            header_len = int(np.frombuffer(length_bytes, dtype=np.uint64)[0])
+            header_bytes = file.read(header_len)
+            if len(header_bytes) != header_len:
+                raise ValueError(f'{filename} is truncated inside the bundle header')
+            header = json.loads(header_bytes)
+        if header['version'] != BUNDLE_VERSION:
+            raise ValueError(f'{filename} is bundle version {header["version"]}, expected {BUNDLE_VERSION}')
+        data_start = -(-(len(BUNDLE_MAGIC) + 8 + header_len) // BUNDLE_ALIGNMENT) * BUNDLE_ALIGNMENT
+
+        arrays = {}
+        for name, spec in header['arrays'].items():
+            shape = tuple(spec['shape'])
+            if not mmap or int(np.prod(shape)) == 0:
+                with open(filename, "rb") as file:
+                    file.seek(data_start + spec['offset'])
+                    count = int(np.prod(shape))
+                    arrays[name] = np.fromfile(file, dtype=spec['dtype'], count=count).reshape(shape)
+            else:
+                arrays[name] = np.memmap(filename, dtype=spec['dtype'], mode='r', offset=data_start + spec['offset'], shape=shape)
+        return cls(arrays, header['meta'], header['source_hash'])
+
+    def PointsMap(self, kind='road_points'):
+        """ PointTable over the memory-mapped arrays, like ConstructPointsMap / ConstructRoadPointLUT """
+        return PointTable(self.arrays[f'{kind}/ids'], self.arrays[f'{kind}/x'], self.arrays[f'{kind}/y'],
+                          self.arrays[f'{kind}/type_codes'], self.meta[f'{kind}/point_types'],
+                          self.arrays[f'{kind}/annotation_codes'], self.meta[f'{kind}/annotations'])
+
+    def Roads(self):
+        offsets = self.arrays['roads/offsets']
+        nodes = np.asarray(self.arrays['roads/nodes']).tolist()
+        return [Road(start, end, nodes[offsets[i]:offsets[i + 1]]) for i, (start, end) in enumerate(self.meta['roads/names'])]
+
+    def Assets(self, road_points):
+        """ Same records as ConstructLocationAssets """
+        assets = []
+        for point_id, (offset_x, offset_y) in zip(self.arrays['assets/point_ids'].tolist(), self.arrays['assets/offsets'].tolist()):
+            road_point = road_points[point_id]
+            assets.append({'name': road_point.annotation, 'text_x': road_point.x + offset_x, 'text_y': road_point.y + offset_y,
+                           'x': road_point.x, 'y': road_point.y, 'point_id': point_id})
+        return assets
+
+    def RoadNetwork(self, route_points, speed_limit=DEFAULT_SPEED_LIMIT):
+        return BuildRoadNetwork(self.arrays['route_nodes/start_ids'], self.arrays['route_nodes/next_ids'], route_points, speed_limit)
+
+
+def ParseAssetRows(filename):
+    """ (point_id, offset_x, offset_y) rows of an assets.csv file """
+    rows = []
+    with open(filename, "r") as file:
+        for line in file:
+            if len(line) > 1:
+                fields = line.split(",")
+                id_str = fields[0].strip(' ')
+                if id_str.startswith('#') or id_str == '\n':
+                    continue
+                rows.append((int(id_str), float(fields[1].strip(' ')), float(fields[2].strip(' '))))
+    return rows
+
+
+def CompileDataBundle(data_dir, bundle_filename=None):
+    """ Compiles the text data directory into a bundle and returns its filename """
+    bundle_filename = bundle_filename or DefaultBundleFilename(data_dir)
+    NetworkBundle.FromTextFiles(data_dir).Write(bundle_filename)
+    return bundle_filename
+
+
+def OpenDataBundle(data_dir, bundle_filename=None, rebuild=True):
+    """
+    Returns the memory-mapped bundle when its source hash matches the text
+    files. Otherwise the text is parsed and, if rebuild is set, the bundle
+    is rewritten for the next start.
+    """
+    bundle_filename = bundle_filename or DefaultBundleFilename(data_dir)
+    source_hash = SourceHash(data_dir)
+    if os.path.isfile(bundle_filename):
+        try:
+            bundle = NetworkBundle.Read(bundle_filename)
+            if bundle.source_hash == source_hash:
+                return bundle
+        except (ValueError, KeyError, OSError):
+            pass  # stale or damaged bundle, fall back to the text files
+    bundle = NetworkBundle.FromTextFiles(data_dir)
+    if rebuild:
+        bundle.Write(bundle_filename)
+    return bundle
+
+
+def LoadMineData(data_dir='./data', bundle_filename=None, rebuild=True):
+    """
+    Everything the entry points need, from the bundle when it is current:
+    {'roads', 'road_points', 'assets', 'route_points', 'road_network'}
+    """
+    bundle = OpenDataBundle(data_dir, bundle_filename, rebuild)
+    data = {}
+    if 'road_points/ids' in bundle.arrays:
+        data['road_points'] = bundle.PointsMap('road_points')
+    if 'roads/offsets' in bundle.arrays:
+        data['roads'] = bundle.Roads()
+    if 'assets/point_ids' in bundle.arrays and 'road_points' in data:
+        data['assets'] = bundle.Assets(data['road_points'])
+    if 'route_points/ids' in bundle.arrays:
+        data['route_points'] = bundle.PointsMap('route_points')
+        if 'route_nodes/start_ids' in bundle.arrays:
+            data['road_network'] = bundle.RoadNetwork(data['route_points'])
+    return data
+
+
+if __name__ == '__main__':
+    # python -m utils.bundle [data_dir] - compile ahead of batch runs
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else './data'
+    print(f'Compiled {CompileDataBundle(data_dir)}')
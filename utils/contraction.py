@@ -0,0 +1,237 @@
+import heapq
+import numpy as np
+from utils.graph import CompactGraph
+
+WITNESS_SETTLE_LIMIT = 200  # nodes a witness search may settle before giving up (adds a shortcut)
+
+
+class ContractionHierarchy:
+    """
+    Contraction-hierarchy index over a directed road network.
+
+    Nodes are contracted one at a time in order of importance; whenever the
+    only shortest route between two remaining neighbours passes through the
+    contracted node a shortcut segment remembering that middle node is added.
+    Queries then run a bidirectional Dijkstra that only climbs to more
+    important nodes, which settles a tiny fraction of a large pit network.
+    """
+
+    def __init__(self, node_ids, rank, edge_src, edge_dst, edge_cost, edge_mid):
+        """
+        node_ids - sorted node ids, dense index -> id
+        rank - contraction order of each dense index
+        edge_src, edge_dst, edge_cost, edge_mid - every original and shortcut segment
+            in dense indices; edge_mid is the contracted middle node or -1
+        """
+        self.node_ids = np.asarray(node_ids, dtype=np.int64)
+        self.rank = np.asarray(rank, dtype=np.int64)
+        self.edge_src = np.asarray(edge_src, dtype=np.int32)
+        self.edge_dst = np.asarray(edge_dst, dtype=np.int32)
+        self.edge_cost = np.asarray(edge_cost, dtype=np.float64)
+        self.edge_mid = np.asarray(edge_mid, dtype=np.int32)
+        self.index_of = {int(node_id): i for i, node_id in enumerate(self.node_ids)}
+        self.mid_of = {(s, d): m for s, d, m in zip(self.edge_src.tolist(), self.edge_dst.tolist(), self.edge_mid.tolist()) if m >= 0}
+        self.nodes_expanded = 0
+
+        # forward search climbs src -> dst segments, backward search climbs dst -> src segments
+        dense = np.arange(len(self.node_ids))
+        upward = self.rank[self.edge_src] < self.rank[self.edge_dst]
+        self.up = CompactGraph.FromEdges(self.edge_src[upward], self.edge_dst[upward], self.edge_cost[upward], node_ids=dense)
+        self.down = CompactGraph.FromEdges(self.edge_dst[~upward], self.edge_src[~upward], self.edge_cost[~upward], node_ids=dense)
+
+    def __str__(self):
+        shortcuts = int(np.count_nonzero(self.edge_mid >= 0))
+        return f'Contraction hierarchy over {len(self.node_ids)} nodes with {shortcuts} shortcuts'
+
+    @classmethod
+    def Build(cls, road_network):
+        """ Contracts every node of a RoadNetwork (or CompactGraph) """
+        compact = road_network.Compile() if hasattr(road_network, 'Compile') else road_network
+        n = len(compact)
+        out_edges = [dict() for _ in range(n)]  # out_edges[u][v] = (cost, mid)
+        in_edges = [dict() for _ in range(n)]   # in_edges[v][u] = (cost, mid)
+        for u in range(n):
+            targets, weights = compact.Neighbours(u)
+            for v, w in zip(targets.tolist(), weights.tolist()):
+                if v != u and w < float('inf') and (v not in out_edges[u] or w < out_edges[u][v][0]):
+                    out_edges[u][v] = (w, -1)
+                    in_edges[v][u] = (w, -1)
+
+        contracted = np.zeros(n, dtype=bool)
+        contracted_neighbours = np.zeros(n, dtype=np.int64)
+        rank = np.zeros(n, dtype=np.int64)
+
+        queue = [(cls._Priority(v, out_edges, in_edges, contracted, contracted_neighbours), v) for v in range(n)]
+        heapq.heapify(queue)
+        order = 0
+        while queue:
+            _, v = heapq.heappop(queue)
+            # lazy update: re-evaluate and put back if it is no longer the least important node
+            priority = cls._Priority(v, out_edges, in_edges, contracted, contracted_neighbours)
+            if queue and priority > queue[0][0]:
+                heapq.heappush(queue, (priority, v))
+                continue
+
+            for u, x, cost in cls._Shortcuts(v, out_edges, in_edges, contracted):
+                if x not in out_edges[u] or cost < out_edges[u][x][0]:
+                    out_edges[u][x] = (cost, v)
+                    in_edges[x][u] = (cost, v)
+            contracted[v] = True
+            rank[v] = order
+            order += 1
+            for u in set(in_edges[v]) | set(out_edges[v]):
+                contracted_neighbours[u] += 1
+
+        edge_src, edge_dst, edge_cost, edge_mid = [], [], [], []
+        for u in range(n):
+            for v, (cost, mid) in out_edges[u].items():
+                edge_src.append(u)
+                edge_dst.append(v)
+                edge_cost.append(cost)
+                edge_mid.append(mid)
+        return cls(compact.node_ids, rank, edge_src, edge_dst, edge_cost, edge_mid)
+
+    @staticmethod
+    def _Shortcuts(v, out_edges, in_edges, contracted):
+        """ Shortcuts (u, x, cost) needed to contract v given the remaining nodes """
+        shortcuts = []
+        outgoing = [(x, c) for x, (c, _) in out_edges[v].items() if not contracted[x]]
+        if not outgoing:
+            return shortcuts
+        for u, (cost_in, _) in in_edges[v].items():
+            if contracted[u]:
+                continue
+            candidates = {x: cost_in + c for x, c in outgoing if x != u}
+            if not candidates:
+                continue
+            witness = ContractionHierarchy._WitnessSearch(u, v, max(candidates.values()), set(candidates), out_edges, contracted)
+            for x, cost in candidates.items():
+                if witness.get(x, float('inf')) > cost:
+                    shortcuts.append((u, x, cost))
+        return shortcuts
+
+    @staticmethod
+    def _WitnessSearch(source, skip, max_cost, targets, out_edges, contracted):
+        """ Bounded Dijkstra from source over uncontracted nodes avoiding skip """
+        dist = {source: 0.0}
+        pq = [(0.0, source)]
+        settled = set()
+        remaining = len(targets)
+        while pq and len(settled) < WITNESS_SETTLE_LIMIT and remaining:
+            cost, u = heapq.heappop(pq)
+            if u in settled:
+                continue
+            settled.add(u)
+            if u in targets:
+                remaining -= 1
+            if cost > max_cost:
+                break
+            for v, (w, _) in out_edges[u].items():
+                if v == skip or contracted[v]:
+                    continue
+                total_cost = cost + w
+                if total_cost < dist.get(v, float('inf')):
+                    dist[v] = total_cost
+                    heapq.heappush(pq, (total_cost, v))
+        return dist
+
+    @staticmethod
+    def _Priority(v, out_edges, in_edges, contracted, contracted_neighbours):
+        """ Edge difference plus contracted neighbours, smaller is contracted first """
+        shortcuts = len(ContractionHierarchy._Shortcuts(v, out_edges, in_edges, contracted))
+        degree = sum(1 for u in in_edges[v] if not contracted[u]) + sum(1 for x in out_edges[v] if not contracted[x])
+        return shortcuts - degree + int(contracted_neighbours[v])
+
+    def Save(self, filename):
+        np.savez(filename, node_ids=self.node_ids, rank=self.rank, edge_src=self.edge_src,
+                 edge_dst=self.edge_dst, edge_cost=self.edge_cost, edge_mid=self.edge_mid)
+
+    @classmethod
+    def Load(cls, filename):
+        with np.load(filename) as data:
+            return cls(data['node_ids'], data['rank'], data['edge_src'], data['edge_dst'], data['edge_cost'], data['edge_mid'])
+
+    def Query(self, source, target):
+        """ Returns (cost, meeting node) between dense indices, (inf, -1) if unreachable """
+        sides = [(self.up, self.up.NewSearch()), (self.down, self.down.NewSearch())]
+        queues = [[(0.0, source)], [(0.0, target)]]
+        for (graph, gen), root in zip(sides, (source, target)):
+            graph.dist[root] = 0.0
+            graph.pred[root] = -1
+            graph.reached[root] = gen
+
+        best, meet = float('inf'), -1
+        expanded = 0
+        while queues[0] or queues[1]:
+            # a side is finished once its smallest key cannot improve the best route
+            side = 0 if queues[0] and (not queues[1] or queues[0][0][0] <= queues[1][0][0]) else 1
+            graph, gen = sides[side]
+            other, other_gen = sides[1 - side]
+            cost, u = heapq.heappop(queues[side])
+            if cost >= best:
+                queues[side].clear()
+                continue
+            if graph.settled[u] == gen:
+                continue
+            graph.settled[u] = gen
+            expanded += 1
+            if other.reached[u] == other_gen and cost + other.dist[u] < best:
+                best, meet = cost + other.dist[u], u
+
+            # stall-on-demand: u is not on a shortest route if a more important
+            # node already reached by this side leads to it more cheaply
+            lo, hi = other.offsets[u], other.offsets[u + 1]
+            if any(graph.reached[v] == gen and graph.dist[v] + w < cost
+                   for v, w in zip(other.targets[lo:hi].tolist(), other.weights[lo:hi].tolist())):
+                continue
+
+            lo, hi = graph.offsets[u], graph.offsets[u + 1]
+            for v, w in zip(graph.targets[lo:hi].tolist(), graph.weights[lo:hi].tolist()):
+                total_cost = cost + w
+                if graph.reached[v] != gen or total_cost < graph.dist[v]:
+                    graph.dist[v] = total_cost
+                    graph.pred[v] = u
+                    graph.reached[v] = gen
+                    heapq.heappush(queues[side], (total_cost, v))
+        self.nodes_expanded = expanded
+        return best, meet
+
+    def Unpack(self, u, v):
+        """ Expands the segment u -> v into the original dense nodes after u """
+        stack = [(u, v)]
+        path = []
+        while stack:
+            a, b = stack.pop()
+            mid = self.mid_of.get((a, b), -1)
+            if mid < 0:
+                path.append(b)
+            else:
+                stack.append((mid, b))
+                stack.append((a, mid))
+        return path
+
+    def FindMinimumValueRoute(self, start_id, target_id):
+        """ Same contract as RoadNetwork.FindMinimumValueRoute, returns original node ids """
+        source = self.index_of.get(start_id)
+        target = self.index_of.get(target_id)
+        if source is None or target is None or source == target:
+            return None
+        best, meet = self.Query(source, target)
+        if meet < 0:
+            return None
+
+        hierarchy_path = [meet]
+        node = meet
+        while node != source:
+            node = int(self.up.pred[node])
+            hierarchy_path.append(node)
+        hierarchy_path.reverse()
+        node = meet
+        while node != target:
+            node = int(self.down.pred[node])
+            hierarchy_path.append(node)
+
+        path = [source]
+        for a, b in zip(hierarchy_path, hierarchy_path[1:]):
+            path.extend(self.Unpack(a, b))
+        return self.node_ids[path].tolist()
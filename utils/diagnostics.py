@@ -0,0 +1,245 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy import sparse
+import highspy
+
+TOLERANCE = 1e-7  # relative slack within which an implied bound still counts as satisfying a constraint
+
+_worker_model = None  # per process HiGHS instance of ImpliedActivity
+
+
+class ConstraintSystem:
+    """
+    row_lower <= matrix @ x <= row_upper, col_lower <= x <= col_upper, with
+    +-inf for missing bounds; the part of a model redundancy depends on.
+    """
+
+    def __init__(self, matrix, row_lower, row_upper, col_lower, col_upper, names=None):
+        self.matrix = sparse.csr_matrix(matrix, dtype=np.float64)
+        self.row_lower = np.asarray(row_lower, dtype=np.float64)
+        self.row_upper = np.asarray(row_upper, dtype=np.float64)
+        self.col_lower = np.asarray(col_lower, dtype=np.float64)
+        self.col_upper = np.asarray(col_upper, dtype=np.float64)
+        self.names = list(names) if names is not None else [f'row_{i}' for i in range(self.matrix.shape[0])]
+
+    def __str__(self):
+        return f'Constraint system of {self.matrix.shape[0]} rows, {self.matrix.shape[1]} columns, {self.matrix.nnz} non-zeros'
+
+    @classmethod
+    def FromAllocation(cls, allocation):
+        """ Rows of a utils.allocation.FlowAllocation """
+        num_cols = allocation.matrix.shape[1]
+        names = ([f'ShovelLimit_{i}' for i in range(allocation.num_shovels)] +
+                 [f'DumpCapacity_{j}' for j in range(allocation.num_dumps)] + ['Target', 'Fleet'])
+        return cls(allocation.matrix, allocation.row_lower, allocation.row_upper, np.zeros(num_cols), np.full(num_cols, np.inf), names)
+
+    @classmethod
+    def FromPulp(cls, model):
+        """ Constraints of a pulp.LpProblem, by name """
+        variables = model.variables()
+        column = {var.name: j for j, var in enumerate(variables)}
+        rows, columns, values, lower, upper = [], [], [], [], []
+        for i, constraint in enumerate(model.constraints.values()):
+            for var, coefficient in constraint.items():
+                rows.append(i)
+                columns.append(column[var.name])
+                values.append(coefficient)
+            rhs = -constraint.constant
+            lower.append(rhs if constraint.sense >= 0 else -np.inf)  # sense: -1 <=, 0 ==, 1 >=
+            upper.append(rhs if constraint.sense <= 0 else np.inf)
+        matrix = sparse.csr_matrix((values, (rows, columns)), shape=(len(lower), len(variables)))
+        col_lower = [-np.inf if var.lowBound is None else var.lowBound for var in variables]
+        col_upper = [np.inf if var.upBound is None else var.upBound for var in variables]
+        return cls(matrix, lower, upper, col_lower, col_upper, model.constraints.keys())
+
+
+def _TermBounds(matrix, col_lower, col_upper):
+    """ Least and greatest value of every non-zero a_ij * x_j, in matrix.data order """
+    columns = matrix.indices
+    low = np.where(matrix.data > 0, matrix.data * col_lower[columns], matrix.data * col_upper[columns])
+    high = np.where(matrix.data > 0, matrix.data * col_upper[columns], matrix.data * col_lower[columns])
+    return low, high
+
+
+def _RowSums(matrix, terms):
+    """ Per row sum of the finite terms and count of the infinite ones """
+    finite = np.isfinite(terms)
+    rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    sums = np.bincount(rows, np.where(finite, terms, 0.0), minlength=matrix.shape[0])
+    infinite = np.bincount(rows, ~finite, minlength=matrix.shape[0])
+    return sums, infinite, rows
+
+
+def _BestTwo(columns, values, sources, num_cols, sign):
+    """
+    Per column the tightest and second tightest of the candidate bounds
+    (sign=1 for upper bounds, -1 for lower), with the source row of the tightest
+    """
+    best = np.full(num_cols, sign * np.inf)
+    second = np.full(num_cols, sign * np.inf)
+    best_source = np.full(num_cols, -1)
+    order = np.lexsort((sign * values, columns))
+    columns, values, sources = columns[order], values[order], sources[order]
+    first = np.ones(len(columns), dtype=bool)
+    first[1:] = columns[1:] != columns[:-1]
+    best[columns[first]] = values[first]
+    best_source[columns[first]] = sources[first]
+    following = np.flatnonzero(first) + 1
+    following = following[following < len(columns)]
+    following = following[columns[following] == columns[following - 1]]
+    second[columns[following]] = values[following]
+    return best, second, best_source
+
+
+def ImpliedColumnBounds(system):
+    """
+    One round of bound tightening: every column's bounds as implied by each
+    row on its own together with the column bounds. Returns, for the lower and
+    the upper side, the tightest bound, the second tightest and the row that
+    gave the tightest (-1 for the column's own bound), so that a row can be
+    judged on bounds that did not come from itself.
+    """
+    matrix = system.matrix
+    num_cols = matrix.shape[1]
+    low, high = _TermBounds(matrix, system.col_lower, system.col_upper)
+    low_sum, low_inf, rows = _RowSums(matrix, low)
+    high_sum, high_inf, _ = _RowSums(matrix, high)
+    a = matrix.data
+    with np.errstate(invalid='ignore'):
+        # activity of the rest of the row, finite only when no other term is infinite
+        rest_low = np.where(low_inf[rows] - ~np.isfinite(low) == 0, low_sum[rows] - np.where(np.isfinite(low), low, 0.0), -np.inf)
+        rest_high = np.where(high_inf[rows] - ~np.isfinite(high) == 0, high_sum[rows] - np.where(np.isfinite(high), high, 0.0), np.inf)
+        from_upper = (system.row_upper[rows] - rest_low) / a  # a x_j <= upper - rest
+        from_lower = (system.row_lower[rows] - rest_high) / a  # a x_j >= lower - rest
+    from_upper[np.isnan(from_upper)] = np.where(a > 0, np.inf, -np.inf)[np.isnan(from_upper)]
+    from_lower[np.isnan(from_lower)] = np.where(a > 0, -np.inf, np.inf)[np.isnan(from_lower)]
+    upper_values = np.where(a > 0, from_upper, from_lower)
+    lower_values = np.where(a > 0, from_lower, from_upper)
+
+    columns = np.concatenate([matrix.indices, np.arange(num_cols)])
+    sources = np.concatenate([rows, np.full(num_cols, -1)])
+    upper = _BestTwo(columns, np.concatenate([upper_values, system.col_upper]), sources, num_cols, 1)
+    lower = _BestTwo(columns, np.concatenate([lower_values, system.col_lower]), sources, num_cols, -1)
+    return lower, upper
+
+
+def BoundRedundantRows(system, tolerance=TOLERANCE):
+    """
+    Sides of every row implied by the others through ImpliedColumnBounds, no
+    solves: (lower_redundant, upper_redundant) boolean arrays. A side without
+    a bound counts as redundant.
+    """
+    matrix = system.matrix
+    (lower_best, lower_second, lower_source), (upper_best, upper_second, upper_source) = ImpliedColumnBounds(system)
+    rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    columns = matrix.indices
+    # bounds of the row's columns, not counting what the row itself implied
+    col_lower = np.where(lower_source[columns] == rows, lower_second[columns], lower_best[columns])
+    col_upper = np.where(upper_source[columns] == rows, upper_second[columns], upper_best[columns])
+    a = matrix.data
+    with np.errstate(invalid='ignore'):
+        low = np.where(a > 0, a * col_lower, a * col_upper)
+        high = np.where(a > 0, a * col_upper, a * col_lower)
+    min_activity = np.bincount(rows, low, minlength=matrix.shape[0])
+    max_activity = np.bincount(rows, high, minlength=matrix.shape[0])
+    return (_Satisfies(min_activity, system.row_lower, 1, tolerance),
+            _Satisfies(max_activity, system.row_upper, -1, tolerance))
+
+
+def _Satisfies(activity, bound, sign, tolerance):
+    """ sign * (activity - bound) >= -tolerance, relative to the bound; true for infinite bounds """
+    with np.errstate(invalid='ignore'):
+        ok = sign * (activity - bound) >= -tolerance * np.maximum(1.0, np.abs(bound))
+    return ok | ~np.isfinite(bound) & (sign * bound < 0)
+
+
+def _StartWorker(system):
+    """ One HiGHS model per process, rows relaxed and objectives swapped per check """
+    global _worker_model
+    matrix = system.matrix.tocsc()
+    lp = highspy.HighsLp()
+    lp.num_col_, lp.num_row_ = matrix.shape[1], matrix.shape[0]
+    lp.a_matrix_.num_col_, lp.a_matrix_.num_row_ = lp.num_col_, lp.num_row_
+    lp.a_matrix_.format_ = highspy.MatrixFormat.kColwise
+    lp.a_matrix_.start_ = matrix.indptr
+    lp.a_matrix_.index_ = matrix.indices
+    lp.a_matrix_.value_ = matrix.data
+    lp.col_cost_ = np.zeros(lp.num_col_)
+    lp.col_lower_ = system.col_lower
+    lp.col_upper_ = system.col_upper
+    lp.row_lower_ = system.row_lower
+    lp.row_upper_ = system.row_upper
+    model = highspy.Highs()
+    model.setOptionValue('output_flag', False)
+    model.passModel(lp)
+    _worker_model = (model, system)
+
+
+def ImpliedActivity(check):
+    """
+    Least (side -1) or greatest (side 1) value of a row's activity subject to
+    every other row, for check = (row, side) on the worker's model: +-inf when
+    unbounded, nan when the others are infeasible
+    """
+    row, side = check
+    model, system = _worker_model
+    num_cols = system.matrix.shape[1]
+    start, end = system.matrix.indptr[row], system.matrix.indptr[row + 1]
+    cost = np.zeros(num_cols)
+    cost[system.matrix.indices[start:end]] = system.matrix.data[start:end]
+    model.changeColsCost(num_cols, np.arange(num_cols, dtype=np.int32), cost)
+    model.changeObjectiveSense(highspy.ObjSense.kMaximize if side > 0 else highspy.ObjSense.kMinimize)
+    model.changeRowBounds(row, -np.inf, np.inf)
+    model.run()
+    status = model.getModelStatus()
+    activity = np.nan
+    if status == highspy.HighsModelStatus.kOptimal:
+        activity = model.getInfo().objective_function_value
+    elif status in (highspy.HighsModelStatus.kUnbounded, highspy.HighsModelStatus.kUnboundedOrInfeasible):
+        activity = side * np.inf
+    model.changeRowBounds(row, system.row_lower[row], system.row_upper[row])
+    return activity
+
+
+def FindRedundantConstraints(system, workers=None, tolerance=TOLERANCE):
+    """
+    Names of the rows implied by all the others: no point satisfying the rest
+    can violate them, so dropping one leaves the feasible set (and so every
+    objective) unchanged. Bound tightening settles most rows without a solve;
+    the sides left get one implied activity LP each, fanned out over a
+    process pool (workers, default one per core). Returns {name: 'bounds' or 'lp'}.
+
+    Each row is judged with all the others in place: of two copies of a
+    constraint both are reported, and only one of them can go.
+    """
+    _StartWorker(system)
+    model = _worker_model[0]
+    model.run()
+    if model.getModelStatus() in (highspy.HighsModelStatus.kInfeasible, highspy.HighsModelStatus.kUnboundedOrInfeasible):
+        # every row of an empty feasible set is implied by the others
+        raise ValueError(f'{system} is infeasible')
+    lower_ok, upper_ok = BoundRedundantRows(system, tolerance)
+    redundant = {system.names[i]: 'bounds' for i in np.flatnonzero(lower_ok & upper_ok)}
+    pending = np.flatnonzero(~(lower_ok & upper_ok))
+    checks = [(row, -1) for row in pending if not lower_ok[row]] + [(row, 1) for row in pending if not upper_ok[row]]
+    if not checks:
+        return redundant
+
+    workers = min(workers or os.cpu_count() or 1, len(checks))
+    if workers == 1:
+        activities = [ImpliedActivity(check) for check in checks]
+    else:
+        with ProcessPoolExecutor(workers, initializer=_StartWorker, initargs=(system,)) as pool:
+            activities = list(pool.map(ImpliedActivity, checks, chunksize=max(1, len(checks) // (4 * workers))))
+    lower_ok, upper_ok = lower_ok.copy(), upper_ok.copy()
+    for (row, side), activity in zip(checks, activities):
+        if np.isnan(activity):
+            continue
+        if side < 0:
+            lower_ok[row] = _Satisfies(activity, system.row_lower[row], 1, tolerance)
+        else:
+            upper_ok[row] = _Satisfies(activity, system.row_upper[row], -1, tolerance)
+    for row in pending[lower_ok[pending] & upper_ok[pending]]:
+        redundant[system.names[row]] = 'lp'
+    return redundant
@@ -0,0 +1,240 @@
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+SHOVEL_IDLE_WEIGHT = 1.0  # cost of a second of shovel idle time relative to a second of truck time
+UNREACHABLE = 1e9  # finite stand-in for inf travel times, linear_sum_assignment rejects inf
+UNASSIGNED = -1
+SLOT_RANK_PENALTY = 1e-3  # s per slot rank, so a shovel's earlier slot wins a tie and slots fill in order
+IMPROVE_PASSES = 2  # sweeps over the trucks by ImproveAssignment, each re-costs every truck x shovel move
+
+
+class AssignmentProblem:
+    """
+    Truck to shovel assignment at one dispatch decision, all times in seconds
+    from now.
+
+    travel_time - (trucks, shovels) travel time of every truck to every shovel
+                  (inf when there is no route), e.g. TravelTimes
+    load_time - (shovels,) loading time of one truck at each shovel
+    ready_time - (trucks,) when each truck can set off (still dumping, ...)
+    shovel_free - (shovels,) when each shovel is through its current queue
+    demand - (shovels,) most trucks each shovel takes, default any number
+
+    Shovel j serves its k-th new truck from slot start shovel_free[j] +
+    k * load_time[j] on, so a truck assigned there costs its travel time, the
+    time it queues for the slot and, weighted, the time the shovel waits for it.
+    """
+
+    def __init__(self, travel_time, load_time, ready_time=0.0, shovel_free=0.0, demand=None,
+                 shovel_idle_weight=SHOVEL_IDLE_WEIGHT):
+        self.travel_time = np.asarray(travel_time, dtype=np.float64)
+        num_trucks, num_shovels = self.travel_time.shape
+        self.load_time = np.broadcast_to(np.asarray(load_time, dtype=np.float64), (num_shovels,))
+        self.ready_time = np.broadcast_to(np.asarray(ready_time, dtype=np.float64), (num_trucks,))
+        self.shovel_free = np.broadcast_to(np.asarray(shovel_free, dtype=np.float64), (num_shovels,))
+        if demand is None:
+            demand = num_trucks
+        self.demand = np.minimum(np.broadcast_to(np.asarray(demand, dtype=np.int64), (num_shovels,)), num_trucks)
+        self.shovel_idle_weight = shovel_idle_weight
+        self.arrival = np.minimum(self.ready_time[:, None] + self.travel_time, UNREACHABLE)
+
+    def __str__(self):
+        return f'Assignment of {len(self.ready_time)} trucks to {len(self.load_time)} shovels'
+
+    def SlotCosts(self, slots=None):
+        """
+        (trucks, slots) cost matrix over the first slots[j] (default all
+        demand) slots of every shovel j, and the shovel of each slot
+        """
+        slots = self.demand if slots is None else np.minimum(slots, self.demand)
+        rank = np.arange(slots.max(initial=0))
+        start = self.shovel_free[:, None] + rank * self.load_time[:, None]  # (shovels, ranks)
+        arrival = self.arrival[:, :, None]
+        late = arrival - start  # > 0 the shovel waits, < 0 the truck queues
+        cost = arrival - self.ready_time[:, None, None] + np.maximum(-late, 0.0) + self.shovel_idle_weight * np.maximum(late, 0.0)
+        # a later slot is never cheaper than an earlier one of the same shovel: a truck late for
+        # slot k only looks less late against slot k + 1, whose start assumes slot k was loaded
+        np.maximum.accumulate(cost, axis=2, out=cost)
+        cost += SLOT_RANK_PENALTY * rank
+        used = rank < slots[:, None]
+        return cost[:, used], np.nonzero(used)[0]
+
+    def Cost(self, shovel):
+        """
+        Cost of an assignment (shovel of every truck, UNASSIGNED for none)
+        when every shovel serves its trucks in the order they arrive
+        """
+        return sum(self.ShovelCost(j, np.flatnonzero(shovel == j)) for j in range(len(self.load_time)))
+
+    def ShovelCost(self, j, trucks):
+        """ Travel, queueing and weighted idle time of shovel j serving trucks in arrival order """
+        total = 0.0
+        free = self.shovel_free[j]
+        for arrival in np.sort(self.arrival[trucks, j]):
+            start = max(free, arrival)
+            total += start - arrival + self.shovel_idle_weight * (start - free)
+            free = start + self.load_time[j]
+        return total + (self.arrival[trucks, j] - self.ready_time[trucks]).sum()  # travel
+
+
+def TravelTimes(route_table, truck_nodes, shovel_nodes, speed):
+    """
+    (trucks, shovels) travel times from a RouteTable: route length from each
+    truck's node to each shovel's node over the truck's speed (scalar or per truck)
+    """
+    rows = np.array([route_table.index_of[int(node)] for node in truck_nodes])
+    columns = np.array([route_table.index_of[int(node)] for node in shovel_nodes])
+    return np.asarray(route_table.dist)[np.ix_(rows, columns)] / np.reshape(speed, (-1, 1))
+
+
+def QueueClearTimes(arrival, shovel, load_time, shovel_free=0.0):
+    """
+    When each shovel is through the trucks already heading to it, serving them
+    in arrival order: for arrivals a_1 <= .. <= a_K at a shovel that is free
+    from f, max(f + K * load, max_k a_k + (K - k + 1) * load). Gives the
+    shovel_free queue estimate of an AssignmentProblem for the trucks not in it.
+
+    arrival, shovel - per truck already assigned
+    load_time, shovel_free - per shovel
+    """
+    load_time = np.asarray(load_time, dtype=np.float64)
+    arrival = np.asarray(arrival, dtype=np.float64)
+    shovel = np.asarray(shovel, dtype=np.int64)
+    counts = np.bincount(shovel, minlength=len(load_time))
+    clear = np.broadcast_to(np.asarray(shovel_free, dtype=np.float64), load_time.shape) + counts * load_time
+    order = np.lexsort((-arrival, shovel))
+    rank_from_end = np.arange(len(order)) - np.repeat(np.cumsum(counts) - counts, counts) + 1
+    np.maximum.at(clear, shovel[order], arrival[order] + rank_from_end * load_time[shovel[order]])
+    return clear
+
+
+def HungarianAssignment(problem, improve=False):
+    """
+    Assignment over the demand slots (scipy linear_sum_assignment). The slot
+    costs assume every shovel keeps to its nominal slot starts, so a late
+    truck's knock-on delay to the slots after it is missed: a heuristic, not
+    an optimum of Cost. improve (off by default, it costs ~0.1 s for a
+    100 truck decision) polishes this solution and GreedyAssignment on the
+    true Cost with ImproveAssignment and keeps the cheaper one.
+
+    Slot costs never fall with the slot rank, so an optimum uses a prefix of
+    every shovel's slots. The solve starts from an even share of slots per
+    shovel and doubles a shovel's share while the solution fills all of it;
+    once every share has a free slot no further slot can lower the cost.
+    """
+    num_trucks, num_shovels = problem.arrival.shape
+    slots = np.minimum(-(-num_trucks // max(num_shovels, 1)) + 1, problem.demand)
+    while True:
+        cost, slot_shovel = problem.SlotCosts(slots)
+        trucks, columns = linear_sum_assignment(cost)
+        full = (np.bincount(slot_shovel[columns], minlength=num_shovels) >= slots) & (slots < problem.demand)
+        if not full.any():
+            break
+        slots = np.where(full, np.minimum(2 * slots, problem.demand), slots)
+    shovel = np.full(num_trucks, UNASSIGNED)
+    reachable = problem.arrival[trucks, slot_shovel[columns]] < UNREACHABLE
+    shovel[trucks[reachable]] = slot_shovel[columns[reachable]]
+    if not improve:
+        return shovel
+    return min((ImproveAssignment(problem, start) for start in (shovel, GreedyAssignment(problem))), key=problem.Cost)
+
+
+def ImproveAssignment(problem, shovel, passes=IMPROVE_PASSES):
+    """
+    Moves single trucks to another shovel (with demand left and a route)
+    while that lowers Cost, for at most passes sweeps over the trucks,
+    re-costing only the two shovels a move touches
+    """
+    shovel = shovel.copy()
+    num_shovels = len(problem.load_time)
+    counts = np.bincount(shovel[shovel >= 0], minlength=num_shovels)
+    costs = np.array([problem.ShovelCost(j, np.flatnonzero(shovel == j)) for j in range(num_shovels)])
+    for _ in range(passes):
+        improved = False
+        for i in np.flatnonzero(shovel >= 0).tolist():
+            old = shovel[i]
+            for j in range(num_shovels):
+                if j == old or counts[j] >= problem.demand[j] or problem.arrival[i, j] >= UNREACHABLE:
+                    continue
+                shovel[i] = j
+                old_cost = problem.ShovelCost(old, np.flatnonzero(shovel == old))
+                new_cost = problem.ShovelCost(j, np.flatnonzero(shovel == j))
+                if old_cost + new_cost < costs[old] + costs[j] - 1e-9:
+                    costs[old], costs[j] = old_cost, new_cost
+                    counts[old] -= 1
+                    counts[j] += 1
+                    old = j
+                    improved = True
+                else:
+                    shovel[i] = old
+        if not improved:
+            break
+    return shovel
+
+
+def GreedyAssignment(problem):
+    """
+    Trucks in the order they are ready, each sent to the shovel cheapest for
+    it given the trucks already sent (the usual minimise truck waiting rule).
+    Each step looks at a handful of shovels, so it runs on Python floats:
+    NumPy calls on arrays that small cost more than the arithmetic.
+    """
+    free = problem.shovel_free.tolist()
+    left = problem.demand.tolist()
+    load_time = problem.load_time.tolist()
+    idle_weight = problem.shovel_idle_weight
+    arrivals = problem.arrival.tolist()
+    shovel = np.full(len(problem.ready_time), UNASSIGNED)
+    for i in np.argsort(problem.ready_time, kind='stable').tolist():
+        best, best_cost, best_start = UNASSIGNED, np.inf, 0.0
+        for j, arrival in enumerate(arrivals[i]):
+            if left[j] <= 0 or arrival >= UNREACHABLE:
+                continue
+            start = max(free[j], arrival)
+            cost = start + idle_weight * (start - free[j])  # travel + queue, less the truck's ready time
+            if cost < best_cost:
+                best, best_cost, best_start = j, cost, start
+        if best == UNASSIGNED:
+            continue
+        shovel[i] = best
+        free[best] = best_start + load_time[best]
+        left[best] -= 1
+    return shovel
+
+
+def MilpAssignment(problem, solver=None):
+    """
+    The binary truck x slot model of models/DispatchingSnippets.ipynb solved
+    with PuLP (CBC by default), as a reference for the other solvers; needs pulp
+    """
+    from pulp import LpMinimize, LpProblem, LpVariable, PULP_CBC_CMD, lpSum
+
+    cost, slot_shovel = problem.SlotCosts()
+    num_trucks, num_slots = cost.shape
+    model = LpProblem('truck_to_shovel_slots', LpMinimize)
+    x = [[LpVariable(f'X_{i}_{k}', cat='Binary') for k in range(num_slots)] for i in range(num_trucks)]
+    model += lpSum(cost[i, k] * x[i][k] for i in range(num_trucks) for k in range(num_slots))
+    for i in range(num_trucks):
+        model += lpSum(x[i]) <= 1, f'Truck_{i}'
+    for k in range(num_slots):
+        model += lpSum(x[i][k] for i in range(num_trucks)) <= 1, f'Slot_{k}'
+    model += lpSum(x[i][k] for i in range(num_trucks) for k in range(num_slots)) == min(num_trucks, num_slots), 'Assigned'
+    model.solve(solver or PULP_CBC_CMD(msg=False))
+
+    shovel = np.full(num_trucks, UNASSIGNED)
+    for i in range(num_trucks):
+        for k in range(num_slots):
+            if x[i][k].varValue is not None and x[i][k].varValue > 0.5 and problem.arrival[i, slot_shovel[k]] < UNREACHABLE:
+                shovel[i] = slot_shovel[k]
+    return shovel
+
+
+SOLVERS = {'hungarian': HungarianAssignment, 'greedy': GreedyAssignment, 'milp': MilpAssignment}
+
+
+def Assign(problem, solver='hungarian'):
+    """
+    Shovel of every truck (UNASSIGNED for none) by solver, a SOLVERS name or
+    any callable(problem) -> shovel array
+    """
+    return (SOLVERS[solver] if isinstance(solver, str) else solver)(problem)
@@ -0,0 +1,119 @@
+import heapq
+import numpy as np
+from utils.graph import INF
+
+
+class ShortestPathTree:
+    """
+    Complete shortest-path tree from one source over a CompactGraph that is
+    repaired in place when a segment cost changes, instead of being rebuilt.
+
+    A cheaper segment u -> v only improves v and what v leads to, so a
+    Dijkstra seeded at v repairs the tree. A dearer (or closed) tree segment
+    only affects the subtree hanging below v: those nodes are reset, seeded
+    from their cheapest in-segment from outside the subtree and re-settled by
+    a Dijkstra restricted to the subtree (Ramalingam-Reps style).
+    """
+
+    def __init__(self, compact, source):
+        self.compact = compact
+        self.source = source
+        gen = compact.Dijkstra(source)
+        reached = compact.reached == gen
+        self.dist = np.where(reached, compact.dist, INF)
+        self.pred = np.where(reached, compact.pred, -1).astype(np.int32)
+
+    def Cost(self, target):
+        return float(self.dist[target])
+
+    def Path(self, target):
+        """ Dense indices from the source to target, None when unreachable or target is the source """
+        if target == self.source or self.dist[target] == INF:
+            return None
+        path = [target]
+        node = target
+        while node != self.source:
+            node = int(self.pred[node])
+            path.append(node)
+        path.reverse()
+        return path
+
+    def UpdateSegment(self, start, end, old_cost, new_cost, reverse):
+        """
+        Repairs the tree after the cheapest start -> end segment went from
+        old_cost to new_cost (the graph weights must already hold new_cost).
+        reverse - reversed CompactGraph with the same weights, for in-segments
+        Returns the dense indices whose route from the source changed.
+        """
+        if new_cost < old_cost:
+            return self._Decrease(start, end, new_cost)
+        if new_cost > old_cost and self.pred[end] == start:
+            return self._Increase(end, reverse)
+        return np.empty(0, dtype=np.int64)
+
+    def _Decrease(self, start, end, cost):
+        dist, pred = self.dist, self.pred
+        if dist[start] + cost >= dist[end]:
+            return np.empty(0, dtype=np.int64)
+        dist[end] = dist[start] + cost
+        pred[end] = start
+        changed = [end]
+        pq = [(dist[end], end)]
+        while pq:
+            d, u = heapq.heappop(pq)
+            if d > dist[u]:
+                continue
+            targets, weights = self.compact.Neighbours(u)
+            for v, w in zip(targets.tolist(), weights.tolist()):
+                total_cost = d + w
+                if total_cost < dist[v]:
+                    dist[v] = total_cost
+                    pred[v] = u
+                    changed.append(v)
+                    heapq.heappush(pq, (total_cost, v))
+        return np.unique(changed)
+
+    def _Subtree(self, root):
+        """ Boolean mask of root and every node routed through it """
+        order = np.argsort(self.pred, kind='stable')
+        first = np.searchsorted(self.pred[order], np.arange(len(self.pred)), side='left')
+        last = np.searchsorted(self.pred[order], np.arange(len(self.pred)), side='right')
+        mask = np.zeros(len(self.pred), dtype=bool)
+        stack = [root]
+        while stack:
+            u = stack.pop()
+            mask[u] = True
+            stack.extend(order[first[u]:last[u]].tolist())
+        return mask
+
+    def _Increase(self, root, reverse):
+        dist, pred = self.dist, self.pred
+        affected = self._Subtree(root)
+        nodes = np.flatnonzero(affected)
+        old_dist, old_pred = dist[nodes].copy(), pred[nodes].copy()
+        dist[nodes] = INF
+        pred[nodes] = -1
+
+        pq = []
+        for v in nodes.tolist():
+            sources, weights = reverse.Neighbours(v)
+            for u, w in zip(sources.tolist(), weights.tolist()):
+                if not affected[u] and dist[u] + w < dist[v]:
+                    dist[v] = dist[u] + w
+                    pred[v] = u
+            if dist[v] < INF:
+                pq.append((dist[v], v))
+        heapq.heapify(pq)
+
+        # nodes outside the subtree keep their (still optimal) routes
+        while pq:
+            d, u = heapq.heappop(pq)
+            if d > dist[u]:
+                continue
+            targets, weights = self.compact.Neighbours(u)
+            for v, w in zip(targets.tolist(), weights.tolist()):
+                if affected[v] and d + w < dist[v]:
+                    dist[v] = d + w
+                    pred[v] = u
+                    heapq.heappush(pq, (d + w, v))
+        return nodes[(dist[nodes] != old_dist) | (pred[nodes] != old_pred)]
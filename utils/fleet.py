@@ -0,0 +1,375 @@
+import numpy as np
+from utils.haulage import DEFAULT_MIN_GAP, SPEED_EPSILON, GAP_EPSILON
+
+DRIVING, HOLDING, PARKED, FINISHED = 0, 1, 2, 3
+LOOKAHEAD_SEGMENTS = 8  # empty segments looked through for a leader
+OVERTAKE_HEADWAY = 3.0  # seconds behind a slower leader before looking for a lane change
+
+
+class FleetKinematics:
+    """
+    Fixed-step alternative to the HaulTruck processes for dense traffic:
+    position, speed, lane, segment and state of the whole fleet live in
+    NumPy arrays and every Step applies acceleration, braking for segment
+    ends and stopped trucks, car following and lane changes in batch.
+
+    The driving rules are HaulTruck's (braking curve to the exit speed,
+    catch up and match the leader's speed at min_gap, give way to a truck
+    that merged too close, stop behind a truck at a shared stop), with phase
+    changes inside a step solved exactly, so a truck's trajectory matches
+    HaulTruck's to within one step of travel. Trucks reaching a merge in the
+    same step enter in the order they passed the end of their segments, ties
+    in index order as HaulTruck ties in creation order; the order of two
+    trucks arriving within a step of each other can still differ from
+    HaulTruck's. Dwell segments are supported, right_of_way resources are not.
+
+    routes - per vehicle list of haulage.Segment, shared by identity
+    v_max, acceleration, deceleration, min_gap, start_times, lane - scalars or per vehicle arrays
+    """
+
+    def __init__(self, routes, v_max, acceleration, deceleration, min_gap=DEFAULT_MIN_GAP,
+                 start_times=0.0, cycle=True, lane=0):
+        n = len(routes)
+        segments = list({id(seg): seg for route in routes for seg in route}.values())
+        seg_index = {id(seg): i for i, seg in enumerate(segments)}
+        self.segments = segments
+        self.seg_length = np.array([seg.length for seg in segments], dtype=np.float64)
+        self.seg_limit = np.array([seg.speed_limit for seg in segments], dtype=np.float64)
+        self.seg_stop = np.array([seg.stop_at_end for seg in segments], dtype=bool)
+        self.seg_dwell = np.array([seg.dwell for seg in segments], dtype=np.float64)
+        self.seg_lanes = np.array([len(seg.lanes) for seg in segments], dtype=np.int64)
+        self.max_lanes = int(self.seg_lanes.max()) if len(segments) else 1
+
+        # distinct routes as a padded table of segment indices
+        route_keys = {}
+        self.route = np.empty(n, dtype=np.int64)
+        for i, route in enumerate(routes):
+            self.route[i] = route_keys.setdefault(tuple(seg_index[id(seg)] for seg in route), len(route_keys))
+        self.route_length = np.array([len(key) for key in route_keys], dtype=np.int64)
+        self.route_segments = np.full((len(route_keys), int(self.route_length.max()) if n else 1), -1, dtype=np.int64)
+        for key, r in route_keys.items():
+            self.route_segments[r, :len(key)] = key
+        self.cycle = cycle
+        # the LOOKAHEAD_SEGMENTS segments after each route position (-1 past the end of the route)
+        # and the distance from the start of the position's segment to theirs
+        ahead = np.arange(self.route_segments.shape[1])[:, None] + np.arange(1, LOOKAHEAD_SEGMENTS + 1)
+        length = self.route_length[:, None, None]
+        ahead = ahead % length if cycle else np.where(ahead < length, ahead, -1)
+        self.route_ahead = np.where(ahead >= 0, np.take_along_axis(self.route_segments[:, :, None], np.maximum(ahead, 0), axis=1), -1)
+        ahead_length = np.where(self.route_ahead >= 0, self.seg_length[self.route_ahead], 0.0)
+        self.route_ahead_offset = self.seg_length[self.route_segments][:, :, None] + \
+            np.concatenate([np.zeros(ahead_length.shape[:2] + (1,)), np.cumsum(ahead_length[:, :, :-1], axis=2)], axis=2)
+        self.key_scale = self.seg_length.max() + 1.0 if len(segments) else 1.0  # (segment lane, position) sort keys
+
+        self.v_max = np.broadcast_to(np.asarray(v_max, dtype=np.float64), n).copy()
+        self.acceleration = np.broadcast_to(np.asarray(acceleration, dtype=np.float64), n).copy()
+        self.deceleration = np.broadcast_to(np.asarray(deceleration, dtype=np.float64), n).copy()
+        self.min_gap = np.broadcast_to(np.asarray(min_gap, dtype=np.float64), n).copy()
+        self.start_times = np.broadcast_to(np.asarray(start_times, dtype=np.float64), n).copy()
+
+        self.time = 0.0
+        self.route_pos = np.zeros(n, dtype=np.int64)  # index into the vehicle's route
+        self.segment = self.route_segments[self.route, 0].copy()
+        self.lane = np.minimum(np.broadcast_to(np.asarray(lane, dtype=np.int64), n), self.seg_lanes[self.segment] - 1)
+        self.position = np.zeros(n)  # distance along the current segment
+        self.speed = np.zeros(n)
+        self.state = np.full(n, PARKED, dtype=np.int8)
+        self.release = np.zeros(n)  # end of the dwell while HOLDING
+        self.odometer = np.zeros(n)  # distance driven
+        self.cycles = np.zeros(n, dtype=np.int64)
+        self.leader = np.full(n, -1, dtype=np.int64)
+        self.leader_offset = np.zeros(n)
+        self.yield_at = np.full(n, np.nan)  # stop point while giving way to a merged truck
+
+    def __str__(self):
+        counts = np.bincount(self.state, minlength=4)
+        return f'Fleet of {len(self.state)} at t={self.time:.1f}s: {counts[DRIVING]} driving, {counts[HOLDING]} holding, {counts[FINISHED]} finished'
+
+    def __len__(self):
+        return len(self.state)
+
+    def _NextRoutePos(self, vehicles, route_pos):
+        """ Route index after route_pos, -1 past the end of a non-cycling route """
+        nxt = route_pos + 1
+        wrap = nxt >= self.route_length[self.route[vehicles]]
+        return np.where(wrap, 0 if self.cycle else -1, nxt)
+
+    def _NextSegment(self, vehicles, route_pos):
+        return self.route_ahead[self.route[vehicles], route_pos, 0]
+
+    def _FindLeaders(self):
+        """
+        Leader of every active vehicle: the next one in its segment lane,
+        else the tail of the first occupied segment ahead on its route within
+        the stopping distance. Returns the active vehicles sorted by segment
+        lane and position and their sort keys, for gap checks.
+        """
+        self.leader.fill(-1)
+        self.leader_offset.fill(0.0)
+        active = np.flatnonzero(self.state <= HOLDING)
+        key = self.segment[active] * self.max_lanes + self.lane[active]
+        value = key * self.key_scale + self.position[active]
+        order_local = np.argsort(value, kind='stable')
+        order, key, value = active[order_local], key[order_local], value[order_local]
+        if len(order) == 0:
+            return order, value
+
+        same = key[:-1] == key[1:]
+        self.leader[order[:-1][same]] = order[1:][same]
+        tails = np.full(len(self.segments) * self.max_lanes, -1, dtype=np.int64)
+        starts = np.concatenate([[True], ~same])
+        tails[key[starts]] = order[starts]
+
+        # the front vehicle of each segment lane looks through the segments ahead at once
+        pending = order[np.concatenate([~same, [True]])]
+        route, route_pos = self.route[pending], self.route_pos[pending]
+        ahead = self.route_ahead[route, route_pos]
+        offset = self.route_ahead_offset[route, route_pos]
+        horizon = self.seg_length[self.segment[pending]] + self.v_max[pending] ** 2 / (2 * self.deceleration[pending]) + \
+            self.min_gap[pending]
+        lane = np.minimum(self.lane[pending][:, None], self.seg_lanes[ahead] - 1)
+        tail = np.where((ahead >= 0) & (offset < horizon[:, None]), tails[ahead * self.max_lanes + lane], -1)
+        first = np.argmax(tail >= 0, axis=1)
+        rows = np.arange(len(pending))
+        tail, offset = tail[rows, first], offset[rows, first]
+        found = (tail >= 0) & (tail != pending)
+        self.leader[pending[found]] = tail[found]
+        self.leader_offset[pending[found]] = offset[found]
+        return order, value
+
+    def _ChangeLanes(self, order, sorted_values):
+        """
+        Vehicles stuck behind a slower leader move one lane out when the
+        target lane is clear from min_gap behind to their overtaking distance
+        ahead; vehicles in an outer lane move back in when they can. At most
+        one vehicle enters a given segment lane per step.
+        """
+        driving = np.flatnonzero((self.state == DRIVING) & (self.seg_lanes[self.segment] > 1))
+        if len(driving) == 0:
+            return
+        seg, lane, s, v = self.segment[driving], self.lane[driving], self.position[driving], self.speed[driving]
+        leader = self.leader[driving]
+        has = (leader >= 0) & (self.leader_offset[driving] == 0)
+        l = np.maximum(leader, 0)
+        v_lim = np.minimum(self.v_max[driving], self.seg_limit[seg])
+        blocked = has & (self.speed[l] < v_lim - SPEED_EPSILON) & \
+            (self.position[l] - s < self.min_gap[driving] + OVERTAKE_HEADWAY * np.maximum(v, SPEED_EPSILON))
+        out = blocked & (lane + 1 < self.seg_lanes[seg])
+        back = ~blocked & (lane > 0)
+        target = np.where(out, lane + 1, lane - 1)
+        movers = np.flatnonzero(out | back)
+        if len(movers) == 0:
+            return
+
+        # clear if nothing in the target lane from min_gap behind to the overtaking
+        # distance ahead (sorted (segment lane, position) search)
+        target_key = seg[movers] * self.max_lanes + target[movers]
+        gap = self.min_gap[driving[movers]]
+        lo = np.searchsorted(sorted_values, target_key * self.key_scale + s[movers] - gap, side='left')
+        ahead = gap + OVERTAKE_HEADWAY * v[movers]
+        hi = np.searchsorted(sorted_values, target_key * self.key_scale + s[movers] + ahead, side='right')
+        clear = movers[hi == lo]
+        _, first = np.unique(target_key[hi == lo], return_index=True)
+        self.lane[driving[clear[first]]] = target[clear[first]]
+
+    def Step(self, dt):
+        """ Advances the whole fleet by dt seconds """
+        # starts and dwell ends are rounded to the nearest step
+        due = self.time + 0.5 * dt
+        self.time += dt
+        self.state[(self.state == PARKED) & (self.start_times <= due)] = DRIVING
+        holding = np.flatnonzero(self.state == HOLDING)
+        self._Advance(holding[self.release[holding] <= due])
+
+        order, sorted_values = self._FindLeaders()
+        if self.max_lanes > 1:
+            self._ChangeLanes(order, sorted_values)
+
+        d = np.flatnonzero(self.state == DRIVING)
+        if len(d) == 0:
+            return
+        seg, s, v = self.segment[d], self.position[d], self.speed[d]
+        dec, gap = self.deceleration[d], self.min_gap[d]
+        v_lim = np.minimum(self.v_max[d], self.seg_limit[seg])
+        nxt = self._NextSegment(d, self.route_pos[d])
+        v_exit = np.where(self.seg_stop[seg] | (nxt < 0), 0.0,
+                          np.minimum(v_lim, np.minimum(self.v_max[d], self.seg_limit[np.maximum(nxt, 0)])))
+        stop_s = self.seg_length[seg].copy()
+
+        leader = self.leader[d]
+        has = leader >= 0
+        l = np.maximum(leader, 0)
+        s_l = self.position[l] + self.leader_offset[d]
+        v_l = self.speed[l]
+        stopped = has & (v_l <= SPEED_EPSILON)
+        # already queued at min_gap: start with the leader, held back by the catch up below
+        queued = stopped & (s_l - gap - s <= GAP_EPSILON) & (v <= SPEED_EPSILON)
+        follow = has & (~stopped | queued)
+        behind = stopped & ~queued & (s_l - gap < stop_s)
+        stop_s = np.where(behind, np.maximum(s_l - gap, s), stop_s)
+        v_exit = np.where(behind, 0.0, v_exit)
+        same_end = follow & (v_exit == 0) & (self.leader_offset[d] == 0)
+        stop_s = np.where(same_end, np.maximum(stop_s - gap, s), stop_s)
+
+        # speed up / slow down towards v_lim, exact to the moment v_lim is reached
+        a = np.where(v < v_lim - SPEED_EPSILON, self.acceleration[d], np.where(v > v_lim + SPEED_EPSILON, -dec, 0.0))
+        t_a = np.divide(v_lim - v, a, out=np.full(len(d), dt), where=a != 0).clip(0.0, dt)
+        v_new = v + a * t_a
+        s_new = s + v * t_a + 0.5 * a * t_a * t_a + v_new * (dt - t_a)
+
+        # braking curve reached within this step: keep going until it is, then brake to v_exit at stop_s
+        dist = stop_s - s
+        need = np.where(v > v_exit, (v * v - v_exit * v_exit) / (2 * dec), 0.0)
+        brake = (v > v_exit + SPEED_EPSILON) & (dist - v * dt <= need)
+        t_c = np.clip((dist - need) / np.maximum(v, SPEED_EPSILON), 0.0, dt)
+        remain = np.maximum(dist - v * t_c, GAP_EPSILON)
+        a_brake = np.where(t_c > 0, dec, (v * v - v_exit * v_exit) / (2 * remain))
+        t_b = dt - t_c
+        v_brake = v - a_brake * t_b
+        at_stop = brake & (v_brake <= v_exit + SPEED_EPSILON)
+        arrival = np.full(len(self.state), self.time)  # when a stop is reached, for the dwell
+        arrival[d[at_stop]] -= dt - (t_c + (v - v_exit) / np.maximum(a_brake, SPEED_EPSILON))[at_stop]
+        v_new = np.where(brake, np.maximum(v_brake, v_exit), v_new)
+        s_new = np.where(brake, s + v * t_c + 0.5 * (v + v_new) * t_b, s_new)
+        # reaches stop_s within the step (at v_exit), or would pass a stop point
+        at_stop |= (s_new >= stop_s - GAP_EPSILON) & (v_exit == 0)
+        s_new = np.where(at_stop, stop_s, s_new)
+        v_new = np.where(at_stop, v_exit, v_new)
+        stopping = (dist <= GAP_EPSILON) & (v <= v_exit + SPEED_EPSILON) & (stop_s < self.seg_length[seg])
+        s_new = np.where(stopping, s, s_new)
+        v_new = np.where(stopping, 0.0, v_new)
+
+        # a truck merged in closer than min_gap: brake and give way until the gap has opened, harder
+        # than deceleration only to stop short of where the leader is when the give way starts, or
+        # of the segment end if the leader is past it (as HaulTruck does; the stop point holds)
+        close = has & (s_l - gap - s < -GAP_EPSILON)
+        merged = close & ~stopped
+        room = np.minimum(s_l, self.seg_length[seg]) - s
+        yield_at = self.yield_at[d]
+        yield_at = np.where(np.isnan(yield_at), s + np.minimum(v * v / (2 * dec), np.maximum(room, 0.0)), yield_at)
+        self.yield_at[d] = np.where(close, yield_at, np.nan)
+        a_yield = v * v / (2 * np.maximum(yield_at - s, GAP_EPSILON))
+        t_y = np.divide(v, a_yield, out=np.zeros(len(d)), where=a_yield > 0).clip(max=dt)
+        s_new = np.where(merged, s + v * t_y - 0.5 * a_yield * t_y * t_y, s_new)
+        v_new = np.where(merged, v - a_yield * t_y, v_new)
+        follow &= ~merged
+
+        # catch up and match the leader's speed: a follower ends at the lesser of
+        # its own move and its leader's final position less the gap, resolved for
+        # whole platoons at once along the leader links
+        local = np.full(len(self.state), -1, dtype=np.int64)
+        local[d] = np.arange(len(d))
+        cost = gap - self.leader_offset[d]
+        # leaders never move back, so a follower short of where its leader starts is not held back
+        link = np.where(follow & (s_new > self.position[l] - cost + GAP_EPSILON), local[l], -1)
+        fixed = follow & (link < 0)  # leader holding or out of reach: its position is known
+        s_new = np.where(fixed, np.minimum(s_new, self.position[l] - cost), s_new)
+        give_way = np.zeros(len(d), dtype=bool)
+        while True:
+            limit = ChainMinimum(s_new, link, cost)
+            merged = ~give_way & (limit < s - GAP_EPSILON)  # merged in front: wait for the gap to open
+            if not merged.any():
+                break
+            give_way |= merged
+            s_new[merged], v_new[merged], link[merged] = s[merged], 0.0, -1
+        held = limit < s_new - GAP_EPSILON
+        s_new = np.maximum(limit, s)
+        v_new = np.where(held & fixed, np.minimum(v_new, self.speed[l]), v_new)
+        v_new = ChainMinimum(v_new, np.where(held, link, -1))
+        self.odometer[d] += s_new - s
+        self.position[d], self.speed[d] = s_new, v_new
+
+        # segment ends: hold at stops, otherwise carry over into the next segment(s)
+        for _ in range(int(self.route_length.max()) + 1):
+            d = np.flatnonzero(self.state == DRIVING)
+            # a truck giving way at the end stays there until its gap opens
+            end = (self.position[d] >= self.seg_length[self.segment[d]] - GAP_EPSILON) & np.isnan(self.yield_at[d])
+            d = d[end]
+            if len(d) == 0:
+                break
+            stops = self.seg_stop[self.segment[d]] | (self._NextRoutePos(d, self.route_pos[d]) < 0)
+            arrived = d[stops]
+            self.position[arrived] = self.seg_length[self.segment[arrived]]
+            self.speed[arrived] = 0.0
+            self.state[arrived] = HOLDING
+            self.release[arrived] = arrival[arrived] + self.seg_dwell[self.segment[arrived]]
+            through = self._MergeOrder(d[~stops])
+            self.position[through] -= self.seg_length[self.segment[through]]
+            self._Advance(through, keep_position=True)
+
+    def _MergeOrder(self, through):
+        """
+        Of the vehicles passing a segment end in this step, the first to pass
+        (then the lowest index) enters each next segment lane; the others give
+        way at the end of theirs, as a HaulTruck reaching the end just after
+        another truck entered would. Returns the vehicles that pass.
+        """
+        if len(through) < 2:
+            return through
+        overshoot = self.position[through] - self.seg_length[self.segment[through]]
+        # seconds since passing the end, to the microsecond so that trucks in step tie
+        passed = np.round(overshoot / np.maximum(self.speed[through], SPEED_EPSILON), 6)
+        nxt = self._NextSegment(through, self.route_pos[through])
+        target = nxt * self.max_lanes + np.minimum(self.lane[through], self.seg_lanes[nxt] - 1)
+        order = np.lexsort((through, -passed, target))
+        first = np.concatenate([[True], target[order][1:] != target[order][:-1]])
+        wait = through[order[~first]]
+        self.odometer[wait] -= overshoot[order[~first]]
+        self.position[wait] = self.yield_at[wait] = self.seg_length[self.segment[wait]]
+        self.speed[wait] = 0.0
+        return np.sort(through[order[first]])
+
+    def _Advance(self, vehicles, keep_position=False):
+        """ Moves vehicles to the next segment of their route (or finishes them) """
+        if len(vehicles) == 0:
+            return
+        nxt = self._NextRoutePos(vehicles, self.route_pos[vehicles])
+        done = nxt < 0
+        self.state[vehicles[done]] = FINISHED
+        vehicles, nxt = vehicles[~done], nxt[~done]
+        self.cycles[vehicles] += nxt < self.route_pos[vehicles]
+        self.route_pos[vehicles] = nxt
+        self.segment[vehicles] = self.route_segments[self.route[vehicles], nxt]
+        self.lane[vehicles] = np.minimum(self.lane[vehicles], self.seg_lanes[self.segment[vehicles]] - 1)
+        self.yield_at[vehicles] = np.nan
+        if not keep_position:
+            self.position[vehicles] = 0.0
+            self.speed[vehicles] = 0.0
+        self.state[vehicles] = DRIVING
+
+    def Run(self, until, dt):
+        """ Steps to time until; returns the number of steps """
+        steps = int(np.ceil((until - self.time) / dt - 1e-9))
+        for _ in range(steps):
+            self.Step(dt)
+        return steps
+
+    def Coordinates(self):
+        """ (n, 2) positions from the segment polylines (NaN without one or before the start) """
+        xy = np.full((len(self.state), 2), np.nan)
+        for i, seg in enumerate(self.segments):
+            if seg.polyline is None:
+                continue
+            on = np.flatnonzero((self.segment == i) & (self.state != PARKED))
+            xy[on, 0] = np.interp(self.position[on], seg.stations, seg.polyline[:, 0])
+            xy[on, 1] = np.interp(self.position[on], seg.stations, seg.polyline[:, 1])
+        return xy
+
+
+def ChainMinimum(value, link, cost=0.0):
+    """
+    value[i] lowered to value[k] - (cost[i] + ... + cost[j]) for every k down
+    the chain i -> link[i] -> ... -> k (link -1 ends a chain), by pointer
+    doubling in log2(n) vectorised steps
+    """
+    value, link = value.copy(), link.copy()
+    cost = np.broadcast_to(np.asarray(cost, dtype=np.float64), value.shape).copy()
+    for _ in range(len(value).bit_length()):
+        on = np.flatnonzero(link >= 0)
+        if len(on) == 0:
+            break
+        ahead = link[on]
+        value[on] = np.minimum(value[on], value[ahead] - cost[on])
+        cost[on] += cost[ahead]
+        link[on] = link[ahead]
+    return value
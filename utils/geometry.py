@@ -0,0 +1,126 @@
+import hashlib
+import os
+import numpy as np
+from scipy.interpolate import splev, splprep
+from utils.points import PointTable
+
+SAMPLES_PER_SEGMENT = 32  # spline samples between consecutive road nodes
+GEOMETRY_CACHE_VERSION = 1
+
+
+class RoadGeometry:
+    """
+    Spline centrelines of every road, fitted once and sampled into an
+    arc-length table. Road r's samples are rows offsets[r]:offsets[r+1] of the
+    flat s / xy / tangent arrays; s restarts at 0 on every road. Positions and
+    headings at travelled distances are a binary search plus a linear blend,
+    so trucks can be placed without evaluating splines.
+    """
+
+    def __init__(self, offsets, s, xy, tangent):
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.s = np.asarray(s, dtype=np.float64)
+        self.xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        self.tangent = np.asarray(tangent, dtype=np.float64).reshape(-1, 2)
+        self.lengths = self.s[self.offsets[1:] - 1] if len(self.s) else np.zeros(len(self.offsets) - 1)
+        # s shifted by the lengths of the roads before, one sorted key for every road
+        self.base = np.concatenate([[0.0], np.cumsum(self.lengths)[:-1]]) if len(self.lengths) else np.zeros(0)
+        self.station = self.s + np.repeat(self.base, np.diff(self.offsets))
+
+    def __str__(self):
+        return f'Road geometry for {len(self.lengths)} roads, {self.lengths.sum():.0f}m in {len(self.s)} samples'
+
+    def __len__(self):
+        return len(self.lengths)
+
+    @classmethod
+    def FromRoads(cls, roads, points, samples_per_segment=SAMPLES_PER_SEGMENT):
+        """ Fits an interpolating B-spline (cubic where there are enough nodes) through every road """
+        points = PointTable.FromPoints(points)
+        offsets = [0]
+        s_parts, xy_parts, tangent_parts = [], [], []
+        for r in roads:
+            xy = points.GetCoordinates(r.nodes)
+            if len(xy) > 1:
+                xy = xy[np.concatenate([[True], np.any(np.diff(xy, axis=0) != 0, axis=1)])]
+            if len(xy) < 2:
+                xy = np.vstack([xy, xy])[:2] if len(xy) else np.zeros((2, 2))
+                sample_xy, sample_tangent = xy, np.tile([1.0, 0.0], (2, 1))
+            else:
+                tck, _ = splprep(xy.T, s=0, k=min(3, len(xy) - 1))
+                u = np.linspace(0, 1, samples_per_segment * (len(xy) - 1) + 1)
+                sample_xy = np.column_stack(splev(u, tck))
+                sample_tangent = np.column_stack(splev(u, tck, der=1))
+                sample_tangent /= np.maximum(np.hypot(sample_tangent[:, 0], sample_tangent[:, 1]), 1e-12)[:, None]
+            s = np.concatenate([[0.0], np.cumsum(np.hypot(*np.diff(sample_xy, axis=0).T))])
+            s_parts.append(s)
+            xy_parts.append(sample_xy)
+            tangent_parts.append(sample_tangent)
+            offsets.append(offsets[-1] + len(s))
+        if not roads:
+            return cls(offsets, np.zeros(0), np.zeros((0, 2)), np.zeros((0, 2)))
+        return cls(offsets, np.concatenate(s_parts), np.vstack(xy_parts), np.vstack(tangent_parts))
+
+    def Save(self, filename):
+        np.savez(filename, offsets=self.offsets, s=self.s, xy=self.xy, tangent=self.tangent)
+
+    @classmethod
+    def Load(cls, filename):
+        with np.load(filename) as data:
+            return cls(data['offsets'], data['s'], data['xy'], data['tangent'])
+
+    def Locate(self, road, s):
+        """ Sample rows and blend factors of distances s along road(s), s clipped to the road """
+        road = np.asarray(road, dtype=np.int64)
+        s = np.clip(np.asarray(s, dtype=np.float64), 0.0, self.lengths[road])
+        row = np.searchsorted(self.station, s + self.base[road], side='right') - 1
+        row = np.clip(row, self.offsets[road], self.offsets[road + 1] - 2)
+        span = self.s[row + 1] - self.s[row]
+        t = np.divide(s - self.s[row], span, out=np.zeros(np.broadcast(s, span).shape), where=span > 0)
+        return row, np.clip(t, 0.0, 1.0)
+
+    def PositionAt(self, road, s, offset=0.0):
+        """
+        (..., 2) positions at distances s along road (scalar or array, broadcast
+        against s). offset moves the point along the left normal, e.g. onto a lane.
+        """
+        row, t = self.Locate(road, s)
+        xy = self.xy[row] + t[..., None] * (self.xy[row + 1] - self.xy[row])
+        if np.any(offset):
+            tangent = self._Tangent(row, t)
+            xy = xy + np.asarray(offset)[..., None] * np.stack([-tangent[..., 1], tangent[..., 0]], axis=-1)
+        return xy
+
+    def HeadingAt(self, road, s):
+        """ Heading angles (radians, atan2 convention) at distances s along road """
+        tangent = self._Tangent(*self.Locate(road, s))
+        return np.arctan2(tangent[..., 1], tangent[..., 0])
+
+    def _Tangent(self, row, t):
+        tangent = self.tangent[row] + t[..., None] * (self.tangent[row + 1] - self.tangent[row])
+        return tangent / np.maximum(np.hypot(tangent[..., 0], tangent[..., 1]), 1e-12)[..., None]
+
+    def Samples(self, road):
+        """ (n, 2) sampled centreline of one road, for plotting """
+        return self.xy[self.offsets[road]:self.offsets[road + 1]]
+
+
+def ConstructRoadGeometry(data_dir='./data', cache_dir=None, samples_per_segment=SAMPLES_PER_SEGMENT):
+    """
+    Road geometry of a data directory, cached in data/cache keyed by the
+    network bundle's source hash and the sampling density.
+    """
+    from utils.bundle import LoadMineData, SourceHash
+    cache_dir = cache_dir or os.path.join(data_dir, 'cache')
+    key = hashlib.sha256(f'geometry-v{GEOMETRY_CACHE_VERSION}:{SourceHash(data_dir)}:{samples_per_segment}'.encode()).hexdigest()
+    filename = os.path.join(cache_dir, f'geometry_{key[:16]}.npz')
+    if os.path.isfile(filename):
+        return RoadGeometry.Load(filename)
+
+    mine_data = LoadMineData(data_dir)
+    geometry = RoadGeometry.FromRoads(mine_data['roads'], mine_data['road_points'], samples_per_segment)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_filename = f'{filename}.tmp{os.getpid()}.npz'
+    geometry.Save(tmp_filename)
+    os.replace(tmp_filename, filename)
+    return geometry
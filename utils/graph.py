@@ -0,0 +1,299 @@
+import heapq
+import numpy as np
+
+INF = float('inf')  # cost of a disabled segment
+
+
+class CompactGraph:
+    """
+    Directed road network stored in compressed sparse row (CSR) form.
+
+    The sparse RouteNodes.cfg ids are mapped to dense indices 0..n-1 so that
+    the outgoing segments of node i are targets[offsets[i]:offsets[i+1]] with
+    costs weights[offsets[i]:offsets[i+1]].
+    """
+
+    def __init__(self, node_ids, offsets, targets, weights, attributes=None):
+        self.node_ids = np.asarray(node_ids, dtype=np.int64)     # dense index -> node id
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.targets = np.asarray(targets, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float64)
+        # extra per-segment arrays aligned with targets, e.g. 'length' and 'duration'
+        self.attributes = {} if attributes is None else attributes
+        self.index_of = {int(node_id): i for i, node_id in enumerate(self.node_ids)}
+        self.xs = None  # node coordinates in metres, needed by the heuristic searches
+        self.ys = None
+
+        # search buffers, allocated once and reused by every query
+        n = len(self.node_ids)
+        self.dist = np.empty(n, dtype=np.float64)
+        self.pred = np.empty(n, dtype=np.int32)
+        self.reached = np.zeros(n, dtype=np.int64)   # generation stamp when dist/pred were written
+        self.settled = np.zeros(n, dtype=np.int64)   # generation stamp when node was settled
+        self.generation = 0
+        self.expanded = 0  # nodes settled by the last search
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    @classmethod
+    def FromEdges(cls, start_ids, end_ids, costs, node_ids=None, **attributes):
+        """
+        Builds the CSR arrays from parallel sequences of segment start ids,
+        end ids and costs. Segment order per start node is preserved.
+        node_ids - optional sorted ids to index by (default: every id in the segments)
+        attributes - optional per-segment arrays carried along in CSR order
+        """
+        start_ids = np.asarray(start_ids, dtype=np.int64)
+        end_ids = np.asarray(end_ids, dtype=np.int64)
+        costs = np.asarray(costs, dtype=np.float64)
+
+        if node_ids is None:
+            node_ids = np.unique(np.concatenate([start_ids, end_ids]))
+        starts = np.searchsorted(node_ids, start_ids)
+        ends = np.searchsorted(node_ids, end_ids)
+
+        order = np.argsort(starts, kind='stable')
+        offsets = np.zeros(len(node_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(starts, minlength=len(node_ids)), out=offsets[1:])
+        attributes = {name: np.asarray(values, dtype=np.float64)[order] for name, values in attributes.items()}
+        return cls(node_ids, offsets, ends[order], costs[order], attributes)
+
+    def SetCoordinates(self, xs, ys):
+        """ xs, ys - coordinates aligned with node_ids """
+        self.xs = np.asarray(xs, dtype=np.float64)
+        self.ys = np.asarray(ys, dtype=np.float64)
+
+    def Reversed(self):
+        """ Same nodes (and dense indices) with every segment flipped """
+        start_ids, end_ids, costs = self.Edges()
+        reverse = CompactGraph.FromEdges(end_ids, start_ids, costs, node_ids=self.node_ids, **self.attributes)
+        if self.xs is not None:
+            reverse.SetCoordinates(self.xs, self.ys)
+        return reverse
+
+    def Edges(self):
+        """ Returns (start_ids, end_ids, costs) arrays for every segment """
+        degree = np.diff(self.offsets)
+        starts = np.repeat(np.arange(len(self.node_ids)), degree)
+        return self.node_ids[starts], self.node_ids[self.targets], self.weights.copy()
+
+    def SegmentIndices(self, start, end):
+        """ Positions in targets/weights of every segment from dense start to dense end """
+        lo = self.offsets[start]
+        return lo + np.flatnonzero(self.targets[lo:self.offsets[start + 1]] == end)
+
+    def Neighbours(self, index):
+        lo, hi = self.offsets[index], self.offsets[index + 1]
+        return self.targets[lo:hi], self.weights[lo:hi]
+
+    def NewSearch(self):
+        """ Starts a new query; bumping the generation invalidates the buffers in O(1) """
+        self.generation += 1
+        return self.generation
+
+    def Dijkstra(self, source, target=-1):
+        """
+        Runs Dijkstra from dense index source over the CSR arrays, stopping once
+        target is settled (or exhausting the graph when target is -1).
+        Results are left in the dist/pred buffers, tagged with the returned generation.
+        """
+        gen = self.NewSearch()
+        offsets, targets, weights = self.offsets, self.targets, self.weights
+        dist, pred, reached, settled = self.dist, self.pred, self.reached, self.settled
+
+        dist[source] = 0.0
+        pred[source] = -1
+        reached[source] = gen
+        pq = [(0.0, source)]
+        expanded = 0
+
+        while pq:
+            cost, u = heapq.heappop(pq)
+            if settled[u] == gen:
+                continue  # Skip re-processing completed nodes
+            settled[u] = gen
+            expanded += 1
+            if u == target:
+                break
+
+            lo, hi = offsets[u], offsets[u + 1]
+            for v, w in zip(targets[lo:hi].tolist(), weights[lo:hi].tolist()):
+                total_cost = cost + w
+                if total_cost < (dist[v] if reached[v] == gen else INF):
+                    dist[v] = total_cost
+                    pred[v] = u
+                    reached[v] = gen
+                    heapq.heappush(pq, (total_cost, v))
+        self.expanded = expanded
+        return gen
+
+    def DijkstraToTargets(self, source, targets):
+        """
+        Dijkstra from dense index source that stops once every dense index in
+        targets is settled (one search for a whole row of routes). Nodes
+        settled by the returned generation have final dist and pred.
+        """
+        gen = self.NewSearch()
+        offsets, targets_csr, weights = self.offsets, self.targets, self.weights
+        dist, pred, reached, settled = self.dist, self.pred, self.reached, self.settled
+        remaining = set(int(t) for t in targets)
+
+        dist[source] = 0.0
+        pred[source] = -1
+        reached[source] = gen
+        pq = [(0.0, source)]
+        expanded = 0
+
+        while pq and remaining:
+            cost, u = heapq.heappop(pq)
+            if settled[u] == gen:
+                continue
+            settled[u] = gen
+            expanded += 1
+            remaining.discard(u)
+
+            lo, hi = offsets[u], offsets[u + 1]
+            for v, w in zip(targets_csr[lo:hi].tolist(), weights[lo:hi].tolist()):
+                total_cost = cost + w
+                if total_cost < (dist[v] if reached[v] == gen else INF):
+                    dist[v] = total_cost
+                    pred[v] = u
+                    reached[v] = gen
+                    heapq.heappush(pq, (total_cost, v))
+        self.expanded = expanded
+        return gen
+
+    def Heuristic(self, target, scale=1.0):
+        """
+        Straight-line distance from every node to target times scale. With
+        scale=1 it never overestimates Euclidean segment costs; for other cost
+        units scale converts metres to the cost (e.g. 1 / max speed for time).
+        """
+        if self.xs is None:
+            raise ValueError('node coordinates are required for heuristic search')
+        return np.hypot(self.xs - self.xs[target], self.ys - self.ys[target]) * scale
+
+    def AStar(self, source, target, scale=1.0):
+        """ A* from source to target, leaving results in the buffers like Dijkstra """
+        h = self.Heuristic(target, scale)
+        gen = self.NewSearch()
+        offsets, targets, weights = self.offsets, self.targets, self.weights
+        dist, pred, reached, settled = self.dist, self.pred, self.reached, self.settled
+
+        dist[source] = 0.0
+        pred[source] = -1
+        reached[source] = gen
+        pq = [(h[source], source)]
+        expanded = 0
+
+        while pq:
+            _, u = heapq.heappop(pq)
+            if settled[u] == gen:
+                continue
+            settled[u] = gen
+            expanded += 1
+            if u == target:
+                break
+
+            cost = dist[u]
+            lo, hi = offsets[u], offsets[u + 1]
+            for v, w in zip(targets[lo:hi].tolist(), weights[lo:hi].tolist()):
+                total_cost = cost + w
+                if total_cost < (dist[v] if reached[v] == gen else INF):
+                    dist[v] = total_cost
+                    pred[v] = u
+                    reached[v] = gen
+                    heapq.heappush(pq, (total_cost + h[v], v))
+        self.expanded = expanded
+        return gen
+
+    def BidirectionalSearch(self, reverse, source, target, scale=None):
+        """
+        Bidirectional Dijkstra, or bidirectional A* when scale is given, using
+        reverse (from Reversed()) for the backward search. A* uses the average
+        potential pf = (h_t - h_s) / 2 for the forward and -pf for the backward
+        search, so both sides see the same non-negative reduced costs and the
+        usual stop rule (top_f + top_r >= best) stays exact.
+        Returns (cost, path of dense indices) or (inf, None).
+        """
+        if scale is None:
+            potential = np.zeros(len(self.node_ids))
+        else:
+            potential = 0.5 * (self.Heuristic(target, scale) - self.Heuristic(source, scale))
+
+        sides = [(self, self.NewSearch(), 1.0), (reverse, reverse.NewSearch(), -1.0)]
+        queues = [[(potential[source], source)], [(-potential[target], target)]]
+        for (graph, gen, _), root in zip(sides, (source, target)):
+            graph.dist[root] = 0.0
+            graph.pred[root] = -1
+            graph.reached[root] = gen
+
+        best, meet = float('inf'), -1
+        expanded = 0
+        while queues[0] and queues[1]:
+            if queues[0][0][0] + queues[1][0][0] >= best:
+                break
+            side = 0 if len(queues[0]) <= len(queues[1]) else 1
+            graph, gen, sign = sides[side]
+            other, other_gen, _ = sides[1 - side]
+            pq = queues[side]
+
+            _, u = heapq.heappop(pq)
+            if graph.settled[u] == gen:
+                continue
+            graph.settled[u] = gen
+            expanded += 1
+
+            cost = graph.dist[u]
+            lo, hi = graph.offsets[u], graph.offsets[u + 1]
+            for v, w in zip(graph.targets[lo:hi].tolist(), graph.weights[lo:hi].tolist()):
+                total_cost = cost + w
+                if total_cost < (graph.dist[v] if graph.reached[v] == gen else INF):
+                    graph.dist[v] = total_cost
+                    graph.pred[v] = u
+                    graph.reached[v] = gen
+                    heapq.heappush(pq, (total_cost + sign * potential[v], v))
+                    if other.reached[v] == other_gen and total_cost + other.dist[v] < best:
+                        best, meet = total_cost + other.dist[v], v
+        self.expanded = expanded
+
+        if meet < 0:
+            return float('inf'), None
+        path = [meet]
+        node = meet
+        while node != source:
+            node = int(self.pred[node])
+            path.append(node)
+        path.reverse()
+        node = meet
+        while node != target:
+            node = int(reverse.pred[node])
+            path.append(node)
+        return float(best), path
+
+    def Cost(self, index, gen):
+        """ Cost to a dense index found by the search tagged gen (inf if unreached) """
+        return float(self.dist[index]) if self.reached[index] == gen else float('inf')
+
+    def UnwindPath(self, source, target, gen):
+        """ Follows the pred buffer back from target, returning dense indices or None """
+        if target == source or self.reached[target] != gen:
+            return None
+        path = [target]
+        node = target
+        while node != source:
+            node = int(self.pred[node])
+            path.append(node)
+        path.reverse()
+        return path
+
+    def FindRoute(self, start_id, target_id):
+        """ Shortest path between two node ids, returned as a list of node ids or None """
+        source = self.index_of.get(start_id)
+        target = self.index_of.get(target_id)
+        if source is None or target is None:
+            return None
+        gen = self.Dijkstra(source, target)
+        path = self.UnwindPath(source, target, gen)
+        return None if path is None else self.node_ids[path].tolist()
@@ -0,0 +1,484 @@
+import itertools
+import math
+import numpy as np
+import simpy
+from utils.map import DEFAULT_SPEED_LIMIT
+from utils.occupancy import LaneIndex
+
+INF = float('inf')
+DEFAULT_MIN_GAP = 30.0  # metres front to front between trucks in the same lane
+TIME_EPSILON = 1e-9
+GAP_EPSILON = 1e-6
+SPEED_EPSILON = 1e-6
+_created = itertools.count()  # creation order of the trucks, for ties
+
+
+class Segment:
+    """
+    One directed stretch of haul road, driven in single file.
+    stop_at_end - trucks stop at the end (give way, load, dump)
+    dwell - seconds stopped at the end (loading / dumping)
+    right_of_way - optional simpy.Resource shared by the segments entering a
+                   junction, held for clearance seconds by the crossing truck
+    polyline - optional (n, 2) road points from start to end, for Coordinates
+    lanes - number of lanes, each a LaneIndex of the trucks in it
+    """
+
+    def __init__(self, length, speed_limit=DEFAULT_SPEED_LIMIT, stop_at_end=False, dwell=0.0,
+                 right_of_way=None, clearance=0.0, polyline=None, name=None, lanes=1):
+        self.length = float(length)
+        self.speed_limit = speed_limit
+        self.stop_at_end = stop_at_end or dwell > 0 or right_of_way is not None
+        self.dwell = dwell
+        self.right_of_way = right_of_way
+        self.clearance = clearance
+        self.polyline = None if polyline is None else np.asarray(polyline, dtype=np.float64)
+        self.stations = None  # distance of every polyline point, scaled to length
+        if self.polyline is not None:
+            steps = np.hypot(*np.diff(self.polyline, axis=0).T)
+            total = steps.sum()
+            self.stations = np.concatenate([[0.0], np.cumsum(steps)]) * (self.length / total if total > 0 else 0.0)
+        self.name = name
+        self.lanes = [LaneIndex(TruckPosition) for _ in range(lanes)]
+        self.watchers = {}  # trucks that looked through the empty segment for a leader
+
+    def __str__(self):
+        return f'Segment {self.name} of {self.length:.1f}m with {sum(len(lane) for lane in self.lanes)} trucks'
+
+    def Coordinates(self, s):
+        """ (x, y) at distance s along the segment, None without a polyline """
+        if self.polyline is None:
+            return None
+        return (float(np.interp(s, self.stations, self.polyline[:, 0])),
+                float(np.interp(s, self.stations, self.polyline[:, 1])))
+
+    def TruckAhead(self, truck):
+        return self.lanes[truck.lane].Ahead(truck)
+
+    def TruckBehind(self, truck):
+        return self.lanes[truck.lane].Behind(truck)
+
+    def Tail(self, lane=0):
+        return self.lanes[lane].Tail()
+
+    def Enter(self, truck):
+        self.lanes[truck.lane].Insert(truck)
+
+    def Leave(self, truck):
+        self.lanes[truck.lane].Remove(truck)
+
+
+def TruckPosition(truck):
+    """ Lane order key: trucks level with each other (entering a segment at the same instant) are in creation order, first in front """
+    return truck.PositionAt(), -truck.rank
+
+
+class HaulTruck:
+    """
+    SimPy haul truck that sleeps until its next meaningful event instead of
+    polling every interval. Within a phase the acceleration is constant, so
+    the position is a quadratic in time and PositionAt / SpeedAt interpolate
+    it on demand. Each plan schedules one timeout for the first of: reaching
+    the speed limit, the braking point for the end of the segment (or a
+    stopped truck ahead), the end of the segment and catching the truck
+    ahead. A truck that changes its plan interrupts its followers so they
+    replan against the new trajectory.
+
+    Catching up follows the usual queueing treatment of haul roads: the
+    follower takes the leader's speed at the minimum gap and then copies its
+    acceleration (or less) until the leader pulls away or leaves. A truck that
+    merges in closer than the minimum gap makes the one behind give way: it
+    brakes at its deceleration (harder only to stop short of the merged truck,
+    or of its segment end when that truck is past it) and waits until the gap
+    has opened. Trucks entering a segment at the same instant queue in the
+    order they were created.
+
+    dwell - optional callable(truck, segment) giving the seconds stopped at a
+    segment end instead of segment.dwell (per truck load times, breakdowns)
+    """
+
+    def __init__(self, env, name, route, v_max, acceleration, deceleration,
+                 min_gap=DEFAULT_MIN_GAP, cycle=True, start_time=0.0, record=False, lane=0, dwell=None):
+        self.env = env
+        self.name = name
+        self.rank = next(_created)
+        self.route = route  # list of Segment, shared with the other trucks
+        self.v_max = v_max
+        self.acceleration = acceleration
+        self.deceleration = deceleration
+        self.min_gap = min_gap
+        self.cycle = cycle  # start the route again after the last segment (haul cycle)
+        self.dwell = dwell
+
+        self.index = 0  # current segment in route
+        self.lane = lane
+        self.s0 = 0.0  # distance along the segment at t0
+        self.v0 = 0.0  # speed at t0
+        self.a = 0.0  # acceleration until the next event
+        self.t0 = env.now
+        self.state = 'parked'
+        self.target = None  # (kind, end of phase values) of the scheduled event
+        self.leader = None
+        self.leader_offset = 0.0  # leader distance correction when it is on the next segment
+        self.yield_at = None  # stop point on the current segment while giving way to a merged truck
+        self.followers = {}  # trucks whose leader is this truck (dict as an ordered set)
+        self.watching = []  # empty segments scanned for a leader
+        self.holding = False  # stopped at a dwell / right of way, not interruptible
+        self.notified = False
+        self.finished = False
+        self.events = 0  # wake-ups, for comparing against polling
+        self.cycles = 0
+        self.phases = [] if record else None  # (t0, index, s0, v0, a) per plan
+        self.process = env.process(self.Run(start_time))
+
+    def __str__(self):
+        return f'Truck {self.name} on segment {self.index} at {self.PositionAt():.1f}m, {self.SpeedAt():.1f} m/s ({self.state})'
+
+    @property
+    def segment(self):
+        return self.route[self.index]
+
+    def PositionAt(self, t=None):
+        """ Distance along the current segment at time t (default now), within the current phase """
+        dt = max((self.env.now if t is None else t) - self.t0, 0.0)
+        if self.a < 0:
+            dt = min(dt, self.v0 / -self.a)
+        return self.s0 + self.v0 * dt + 0.5 * self.a * dt * dt
+
+    def SpeedAt(self, t=None):
+        dt = max((self.env.now if t is None else t) - self.t0, 0.0)
+        return max(self.v0 + self.a * dt, 0.0)
+
+    def Coordinates(self, t=None):
+        """ (x, y) on the road at time t, None without segment polylines """
+        return self.segment.Coordinates(self.PositionAt(t))
+
+    def Run(self, start_time):
+        if start_time > 0:
+            yield self.env.timeout(start_time)
+        self.t0 = self.env.now
+        self.segment.Enter(self)
+        self._NotifyTail(self.segment)
+        while True:
+            a, v = self.a, self.v0
+            duration = self._Plan()
+            if self.a != a or abs(self.v0 - v) > SPEED_EPSILON:
+                self._NotifyFollowers()  # only a changed trajectory concerns the trucks behind
+            try:
+                yield self.env.timeout(duration) if duration < INF else self.env.event()
+            except simpy.Interrupt:
+                self.events += 1
+                self.notified = False
+                self._Rebase()
+                continue
+            self.events += 1
+            self._Rebase(self.target)
+            if self.target[0] == 'end':
+                yield from self._EndOfSegment()
+                if self.finished:
+                    return
+
+    def _Notify(self):
+        if self.holding or self.notified or self.finished or self.process is self.env.active_process:
+            return
+        self.notified = True
+        self.process.interrupt()
+
+    def _NotifyFollowers(self):
+        for follower in list(self.followers):
+            follower._Notify()
+
+    def _NotifyTail(self, seg):
+        """
+        Trucks behind the previous tail of seg, or looking through seg, may now
+        have this truck as leader, as may one level with it that entered first
+        """
+        ahead = seg.TruckAhead(self)
+        watchers = list(ahead.followers) if ahead is not None else []
+        behind = seg.TruckBehind(self)
+        if behind is not None:
+            watchers.append(behind)
+        watchers += list(seg.watchers)
+        seg.watchers.clear()
+        for watcher in watchers:
+            if watcher is not self:
+                watcher._Notify()
+
+    def _Rebase(self, target=None):
+        """ Moves the phase origin to now, snapping to the planned end of phase values """
+        now = self.env.now
+        s, v = self.PositionAt(now), self.SpeedAt(now)
+        if target is not None:
+            kind, s_target, v_target = target
+            if kind == 'catch' and self.leader is not None:
+                s = self.leader.PositionAt(now) + self.leader_offset - self.min_gap
+            if s_target is not None:
+                s = s_target
+            if v_target is not None:
+                v = v_target
+        self.s0, self.v0, self.t0 = s, v, now
+
+    def _RouteIndex(self, index):
+        """ Route index after index, None past the end of a non-cycling route """
+        if index + 1 < len(self.route):
+            return index + 1
+        return 0 if self.cycle else None
+
+    def _NextSegment(self):
+        index = self._RouteIndex(self.index)
+        return None if index is None else self.route[index]
+
+    def _FindLeader(self):
+        """
+        Truck ahead in the segment, else the tail of the first occupied
+        segment ahead within the current segment plus the stopping distance
+        (so short segments do not hide a queue). Empty segments scanned are
+        watched, a truck entering one of them triggers a replan.
+        """
+        for seg in self.watching:
+            seg.watchers.pop(self, None)
+        self.watching = []
+        seg = self.segment
+        ahead = seg.TruckAhead(self)
+        if ahead is not None:
+            return ahead, 0.0
+        offset = seg.length
+        horizon = seg.length + self.v_max * self.v_max / (2 * self.deceleration) + self.min_gap
+        index = self.index
+        for _ in range(len(self.route)):
+            index = self._RouteIndex(index)
+            if index is None or offset >= horizon:
+                break
+            next_seg = self.route[index]
+            tail = next_seg.Tail(self.lane)
+            if tail is self:
+                break
+            if tail is not None:
+                return tail, offset
+            next_seg.watchers[self] = None
+            self.watching.append(next_seg)
+            offset += next_seg.length
+        return None, 0.0
+
+    def _SetLeader(self, leader, offset):
+        if leader is not self.leader:
+            if self.leader is not None:
+                self.leader.followers.pop(self, None)
+            if leader is not None:
+                leader.followers[self] = None
+            self.leader = leader
+        self.leader_offset = offset
+
+    def _ExitSpeed(self, v_lim):
+        if self.segment.stop_at_end:
+            return 0.0
+        next_seg = self._NextSegment()
+        if next_seg is None:
+            return 0.0
+        return min(v_lim, self.v_max, next_seg.speed_limit)
+
+    def _Plan(self):
+        """ Picks the acceleration until the next event and returns the time to it """
+        now = self.env.now
+        seg = self.segment
+        self._SetLeader(*self._FindLeader())
+        leader = self.leader
+
+        v_lim = min(self.v_max, seg.speed_limit)
+        stop_s, v_exit = seg.length, self._ExitSpeed(v_lim)
+        s, v = self.s0, self.v0
+        following = queued = False
+        if leader is not None:
+            s_l = leader.PositionAt(now) + self.leader_offset
+            v_l = leader.SpeedAt(now)
+            gap = s_l - self.min_gap - s
+            if v_l <= SPEED_EPSILON and leader.a <= 0:
+                # queue behind a stopped truck
+                queued = True
+                if s_l - self.min_gap < stop_s:
+                    stop_s, v_exit = max(s_l - self.min_gap, s), 0.0
+            elif gap < -GAP_EPSILON:
+                # a truck merged in closer than min_gap: brake and give way until the gap has opened,
+                # harder than deceleration only if that is needed to stop short of where the leader is
+                # when the give way starts (passing it would swap the order and both trucks would give
+                # way), or of the segment end if the leader is already past it. The stop point holds
+                # until the gap opens, so replans on the leader's events do not change the braking
+                if v > SPEED_EPSILON:
+                    if self.yield_at is None:
+                        room = min(s_l, seg.length) - s
+                        self.yield_at = s + min(v * v / (2 * self.deceleration), max(room, 0.0))
+                    a = -v * v / (2 * max(self.yield_at - s, GAP_EPSILON))
+                    events = [(v / -a, 'speed', None, 0.0),
+                              (SmallestPositiveRoot(0.5 * (leader.a - a), v_l - v, gap), 'clear', None, None)]
+                    duration, kind, s_target, v_target = min(events, key=lambda e: e[0])
+                    return self._Phase(a, duration, kind, s_target, v_target, 'yielding')
+                self.v0 = 0.0
+                return self._Phase(0.0, SmallestPositiveRoot(0.5 * leader.a, v_l, gap), 'clear', None, 0.0, 'yielding')
+            else:
+                if v_exit == 0.0 and self.leader_offset == 0.0:
+                    # the leader has to stop at the same end, plan to stop behind it
+                    stop_s = max(stop_s - self.min_gap, s)
+                if gap <= GAP_EPSILON and v >= v_l - SPEED_EPSILON:
+                    following = True
+                    v = self.v0 = min(v, v_l)
+        self.yield_at = None
+
+        dist = stop_s - s
+        if dist <= GAP_EPSILON and v <= v_exit + SPEED_EPSILON:
+            self.s0 = stop_s
+            if stop_s >= seg.length:
+                return self._Phase(0.0, 0.0, 'end', seg.length, v, 'driving')
+            self.v0 = 0.0
+            return self._Phase(0.0, INF, 'wait', None, None, 'queued')
+
+        need = (v * v - v_exit * v_exit) / (2 * self.deceleration) if v > v_exit else 0.0
+        if v > v_exit + SPEED_EPSILON and dist <= need + GAP_EPSILON:
+            # on the braking curve: brake (harder if a stop point moved closer) to v_exit at stop_s
+            a = -(v * v - v_exit * v_exit) / (2 * dist) if dist > GAP_EPSILON else -INF
+            if a == -INF:
+                self.v0 = v_exit
+                return self._Phase(0.0, 0.0, 'brake', stop_s, v_exit, 'braking')
+            if not (following and leader.a < a):
+                kind = 'end' if stop_s >= seg.length else 'brake'
+                duration = (v - v_exit) / -a
+                if leader is not None and not following and not queued:
+                    # a leader braking harder can still be caught on the way
+                    t_catch = SmallestPositiveRoot(0.5 * (leader.a - a), v_l - v, gap)
+                    if t_catch < duration:
+                        return self._Phase(a, t_catch, 'catch', None, None, 'braking')
+                return self._Phase(a, duration, kind, stop_s, v_exit, 'braking')
+            a = leader.a
+        elif v < v_lim - SPEED_EPSILON:
+            a = self.acceleration
+        elif v > v_lim + SPEED_EPSILON:
+            a = -self.deceleration
+        else:
+            a = 0.0
+            v = self.v0 = v_lim
+        if following:
+            a = min(a, leader.a)
+
+        # earliest of the boundaries reachable under a
+        events = [(INF, 'wait', None, None)]
+        if a > 0:
+            events.append(((v_lim - v) / a, 'speed', None, v_lim))
+        elif a < 0:
+            floor = v_lim if v > v_lim + SPEED_EPSILON else 0.0
+            events.append(((v - floor) / -a, 'speed', None, floor))
+        if (v_lim if a > 0 else v) > v_exit + SPEED_EPSILON and a > -self.deceleration:
+            k = a / self.deceleration
+            c = (v * v - v_exit * v_exit) / (2 * self.deceleration) - dist
+            events.append((SmallestPositiveRoot(0.5 * a * (1 + k), v * (1 + k), c), 'curve', None, None))
+        t_end = SmallestPositiveRoot(0.5 * a, v, -dist)
+        if t_end < INF:
+            kind = 'end' if stop_s >= seg.length else 'brake'
+            events.append((t_end, kind, stop_s, v + a * t_end))
+        if leader is not None and not following and not queued:
+            t_catch = SmallestPositiveRoot(0.5 * (leader.a - a), v_l - v, gap)
+            events.append((t_catch, 'catch', None, None))
+        duration, kind, s_target, v_target = min(events, key=lambda e: e[0])
+        state = 'following' if following else ('accelerating' if a > 0 else 'braking' if a < 0 else 'cruising')
+        return self._Phase(a, duration, kind, s_target, v_target, state)
+
+    def _Phase(self, a, duration, kind, s_target, v_target, state):
+        self.a = a
+        self.target = (kind, s_target, v_target)
+        self.state = state
+        if self.phases is not None:
+            self.phases.append((self.t0, self.index, self.s0, self.v0, a))
+        return max(duration, 0.0)
+
+    def _EndOfSegment(self):
+        seg = self.segment
+        if seg.stop_at_end:
+            self.v0, self.a = 0.0, 0.0
+            self.holding = True
+            self.state = 'holding'
+            self._NotifyFollowers()
+            dwell = seg.dwell if self.dwell is None else self.dwell(self, seg)
+            if dwell > 0:
+                yield self.env.timeout(dwell)
+            if seg.right_of_way is not None:
+                request = seg.right_of_way.request()
+                yield request
+                self.env.process(self._Clear(seg.right_of_way, request, seg.clearance))
+            self.holding = False
+            self.notified = False
+
+        seg.Leave(self)
+        if self.index + 1 < len(self.route):
+            self.index += 1
+        elif self.cycle:
+            self.index = 0
+            self.cycles += 1
+        else:
+            self.finished = True
+            self.state = 'finished'
+            self._SetLeader(None, 0.0)
+            for watched in self.watching:
+                watched.watchers.pop(self, None)
+            self._NotifyFollowers()
+            return
+        self.s0, self.t0 = 0.0, self.env.now
+        self.yield_at = None
+        self.segment.Enter(self)
+        self._NotifyFollowers()
+        self._NotifyTail(self.segment)
+
+    def _Clear(self, right_of_way, request, clearance):
+        if clearance > 0:
+            yield self.env.timeout(clearance)
+        right_of_way.release(request)
+
+
+def SmallestPositiveRoot(a, b, c):
+    """ Smallest t > 0 with a t^2 + b t + c = 0, inf if there is none """
+    if abs(a) < 1e-12:
+        if abs(b) < 1e-12:
+            return INF
+        t = -c / b
+        return t if t > TIME_EPSILON else INF
+    disc = b * b - 4 * a * c
+    if disc < 0:
+        return INF
+    root = math.sqrt(disc)
+    # numerically stable pair of roots
+    q = -0.5 * (b + math.copysign(root, b))
+    roots = [q / a, c / q if q != 0 else INF]
+    roots = [t for t in roots if t > TIME_EPSILON]
+    return min(roots) if roots else INF
+
+
+def RouteSegments(road_network, path, segments=None, speed_limit=DEFAULT_SPEED_LIMIT, stop_ids=()):
+    """
+    Segments along a node path (e.g. from FindMinimumValueRoute). Road points
+    between junctions are merged into one segment, as trucks only interact
+    where roads meet, so a truck wakes once per link instead of per point.
+    Pass the same segments dict for every route so trucks on a shared road
+    see each other. stop_ids - nodes where trucks stop before continuing
+    """
+    segments = {} if segments is None else segments
+    compact = road_network.Compile()
+    lengths = compact.attributes.get('length', compact.weights)
+    points = road_network.point_lut
+    start_ids, end_ids, _ = compact.Edges()
+    # a node on a plain road has exactly two neighbours, anything else is a junction or a dead end
+    pairs = np.unique(np.sort(np.column_stack([start_ids, end_ids]), axis=1), axis=0)
+    node_ids, degree = np.unique(pairs, return_counts=True)
+    breaks = set(node_ids[degree != 2].tolist()) | set(stop_ids)
+
+    route = []
+    link = [path[0]]
+    for node_id in path[1:]:
+        link.append(node_id)
+        if node_id not in breaks and node_id != path[-1]:
+            continue
+        key = tuple(link)
+        if key not in segments:
+            length = sum(float(lengths[road_network.SegmentIndices(a, b)].min()) for a, b in zip(link, link[1:]))
+            polyline = points.GetCoordinates(link) if points is not None else None
+            segments[key] = Segment(length, speed_limit, stop_at_end=node_id in stop_ids,
+                                    polyline=polyline, name=f'{link[0]}-{link[-1]}')
+        route.append(segments[key])
+        link = [node_id]
+    return route
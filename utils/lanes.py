@@ -0,0 +1,155 @@
+import hashlib
+import os
+import numpy as np
+from utils.points import PointTable
+
+LANE_OFFSET = 10  # metres from the centreline to each lane, as in misc/PointOffsetWithMerge.py
+MITER_LIMIT = 2.0  # miter length / offset above which a corner is bevelled
+LANE_CACHE_VERSION = 2
+
+
+class LaneGeometry:
+    """
+    Left and right lane polylines for every road, stored as flat (n, 2)
+    arrays with one CSR offsets array per side: road r's left lane is
+    left[left_offsets[r]:left_offsets[r+1]], its right lane likewise. The
+    sides differ in length where a bevelled corner adds a point on the outer side.
+    """
+
+    def __init__(self, left_offsets, left, right_offsets, right, merge_nodes):
+        self.left_offsets = np.asarray(left_offsets, dtype=np.int64)
+        self.right_offsets = np.asarray(right_offsets, dtype=np.int64)
+        self.left = np.asarray(left, dtype=np.float64).reshape(-1, 2)
+        self.right = np.asarray(right, dtype=np.float64).reshape(-1, 2)
+        self.merge_nodes = np.asarray(merge_nodes, dtype=np.int64)  # junction ids where lanes merge
+
+    def __str__(self):
+        return f'Lane geometry for {len(self)} roads with {len(self.left)} left and {len(self.right)} right lane points'
+
+    def __len__(self):
+        return len(self.left_offsets) - 1
+
+    def Lane(self, road_index, side='left'):
+        """ (n, 2) polyline of one lane of one road """
+        lanes, offsets = (self.left, self.left_offsets) if side == 'left' else (self.right, self.right_offsets)
+        return lanes[offsets[road_index]:offsets[road_index + 1]]
+
+    def Save(self, filename):
+        np.savez(filename, left_offsets=self.left_offsets, left=self.left, right_offsets=self.right_offsets,
+                 right=self.right, merge_nodes=self.merge_nodes)
+
+    @classmethod
+    def Load(cls, filename):
+        with np.load(filename) as data:
+            return cls(data['left_offsets'], data['left'], data['right_offsets'], data['right'], data['merge_nodes'])
+
+
+def GenerateLaneGeometry(roads, points, left_offset=LANE_OFFSET, right_offset=-LANE_OFFSET,
+                         join='miter', miter_limit=MITER_LIMIT, merge_at_junctions=True):
+    """
+    Offsets every road centreline to left and right lanes in one batched pass.
+
+    roads - list of Road (e.g. from ConstructRoads)
+    points - PointTable or {id: point} map holding the road nodes
+    left_offset, right_offset - signed distances along the left normal (-dy, dx)
+    join - 'miter' (bevel only where the miter would exceed miter_limit) or 'bevel';
+        a bevel adds a point on the outer side of the corner only, the inner
+        side always takes the offset lines' intersection (never capped)
+    merge_at_junctions - lanes of roads meeting at a junction node (a node used
+        by three or more road ends / pass-throughs) end at that node, so the
+        simulator can link lanes through the merge point
+    """
+    points = PointTable.FromPoints(points)
+    node_lists = [np.asarray(r.nodes, dtype=np.int64) for r in roads]
+    # drop consecutive repeats, their direction is undefined
+    node_lists = [n[np.concatenate([[True], n[1:] != n[:-1]])] if len(n) else n for n in node_lists]
+    counts = np.array([len(n) for n in node_lists], dtype=np.int64)
+    nodes = np.concatenate(node_lists) if node_lists else np.empty(0, dtype=np.int64)
+    xy = points.GetCoordinates(nodes) if len(nodes) else np.empty((0, 2))
+    road_of = np.repeat(np.arange(len(roads)), counts)
+    starts = np.cumsum(counts) - counts
+    is_first = np.zeros(len(nodes), dtype=bool)
+    is_last = np.zeros(len(nodes), dtype=bool)
+    is_first[starts[counts > 0]] = True
+    is_last[(starts + counts - 1)[counts > 0]] = True
+
+    # unit direction and left normal of the segment leaving each vertex (invalid on last vertices)
+    seg = np.zeros_like(xy)
+    seg[:-1] = xy[1:] - xy[:-1]
+    seg[is_last] = 0.0
+    seg_len = np.hypot(seg[:, 0], seg[:, 1])
+    seg_dir = np.divide(seg, seg_len[:, None], out=np.zeros_like(seg), where=seg_len[:, None] > 0)
+
+    d_out = seg_dir.copy()
+    d_in = np.zeros_like(seg_dir)
+    d_in[1:] = seg_dir[:-1]
+    d_in[is_first] = d_out[is_first]
+    d_out[is_last] = d_in[is_last]
+    n_in = np.column_stack([-d_in[:, 1], d_in[:, 0]])
+    n_out = np.column_stack([-d_out[:, 1], d_out[:, 0]])
+
+    bisector = n_in + n_out
+    bisector_len = np.hypot(bisector[:, 0], bisector[:, 1])
+    m_hat = np.divide(bisector, bisector_len[:, None], out=n_in.copy(), where=bisector_len[:, None] > 1e-9)
+    cos_half = np.einsum('ij,ij->i', m_hat, n_in)
+    miter_ratio = np.divide(1.0, cos_half, out=np.full(len(cos_half), np.inf), where=cos_half > 1e-9)
+    collinear = np.einsum('ij,ij->i', d_in, d_out) > 1 - 1e-9
+    interior = ~is_first & ~is_last
+    if join == 'bevel':
+        bevel = interior & ~collinear
+    elif join == 'miter':
+        bevel = interior & (miter_ratio > miter_limit)
+    else:
+        raise ValueError(f'Unknown join {join}, expected miter or bevel')
+    turn = d_in[:, 0] * d_out[:, 1] - d_in[:, 1] * d_out[:, 0]  # > 0 turning left
+    miter_scale = np.minimum(miter_ratio, miter_limit)
+
+    # junction nodes: where three or more road ends / pass-throughs meet
+    incidence = np.where(is_first | is_last, 1, 2)
+    junction_ids, inverse = np.unique(nodes, return_inverse=True)
+    junction = np.bincount(inverse, weights=incidence) >= 3 if len(nodes) else np.zeros(0, dtype=bool)
+    merge_nodes = junction_ids[junction] if merge_at_junctions else np.empty(0, dtype=np.int64)
+    merge_before = is_first & junction[inverse] if merge_at_junctions else np.zeros(len(nodes), dtype=bool)
+    merge_after = is_last & junction[inverse] if merge_at_junctions else np.zeros(len(nodes), dtype=bool)
+
+    # every vertex emits: [merge point] + offset point (+ second bevel point on the outer side) + [merge point]
+    inner_scale = np.where(np.isfinite(miter_ratio), miter_ratio, 1.0)
+    lanes = []
+    offsets = []
+    for offset in (left_offset, right_offset):
+        outer = bevel & (offset * turn < 0)
+        emitted = 1 + outer + merge_before + merge_after
+        out_start = np.cumsum(emitted) - emitted
+        base = out_start + merge_before
+        lane = np.empty((int(emitted.sum()), 2))
+        miter_point = xy + offset * np.where(bevel, inner_scale, miter_scale)[:, None] * m_hat
+        lane[base] = np.where(outer[:, None], xy + offset * n_in, miter_point)
+        lane[base[outer] + 1] = xy[outer] + offset * n_out[outer]
+        lane[out_start[merge_before]] = xy[merge_before]
+        lane[out_start[merge_after] + emitted[merge_after] - 1] = xy[merge_after]
+        lanes.append(lane)
+        road_offsets = np.zeros(len(roads) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(road_of, weights=emitted, minlength=len(roads)).astype(np.int64), out=road_offsets[1:])
+        offsets.append(road_offsets)
+    return LaneGeometry(offsets[0], lanes[0], offsets[1], lanes[1], merge_nodes)
+
+
+def ConstructLaneGeometry(data_dir='./data', cache_dir=None, **options):
+    """
+    Lane geometry for the roads of a data directory, cached in data/cache keyed
+    by the network bundle's source hash and the generation options.
+    """
+    from utils.bundle import LoadMineData, SourceHash
+    cache_dir = cache_dir or os.path.join(data_dir, 'cache')
+    key = hashlib.sha256(f'lanes-v{LANE_CACHE_VERSION}:{SourceHash(data_dir)}:{sorted(options.items())}'.encode()).hexdigest()
+    filename = os.path.join(cache_dir, f'lanes_{key[:16]}.npz')
+    if os.path.isfile(filename):
+        return LaneGeometry.Load(filename)
+
+    mine_data = LoadMineData(data_dir)
+    lanes = GenerateLaneGeometry(mine_data['roads'], mine_data['road_points'], **options)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_filename = f'{filename}.tmp{os.getpid()}.npz'
+    lanes.Save(tmp_filename)
+    os.replace(tmp_filename, filename)
+    return lanes
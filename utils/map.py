@@ -1,6 +1,18 @@
 import ast
-import heapq
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
+from utils.graph import INF, CompactGraph
+from utils.dynamic import ShortestPathTree
+from utils.points import PointTable, ConstructPointTable
+
+DEFAULT_SPEED_LIMIT = 40 / 3.6  # m/s, haul road speed used for segment durations
+DEFAULT_ROLLING_RESISTANCE = 0.02  # fraction of truck weight, a well kept haul road
+DEFAULT_ROUTE_CACHE_SIZE = 4096  # routes kept by RoadNetwork.FindMinimumValueRoute, 0 turns the cache off
+
+_worker_graph = None  # per process (CompactGraph, dense targets) of DistanceMatrix
 
 class Road:
     def __init__(self, start, end, nodes):
@@ -28,76 +40,549 @@ class RoadPoint:
 
 class RoadPoints:
     def __init__(self, points_table):
-        self.points_lut = points_table
+        self.points_lut = PointTable.FromPoints(points_table)
         
     def __str__(self):
-        return f'{len(self.points_lut.keys)} #points in road map'
+        return f'{len(self.points_lut)} #points in road map'
 
     def GetPoints(self, node_indices_list):
-        print(f'node_indices_list = {node_indices_list}')
-        return [self.points_lut[p] for p in node_indices_list]
+        """ (xs, ys) coordinate arrays of the listed node ids, in order """
+        return self.points_lut.GetPoints(node_indices_list)
+
+    def GetCoordinates(self, node_indices_list):
+        """ (n, 2) array of the listed node ids' x, y """
+        return self.points_lut.GetCoordinates(node_indices_list)
+
+    def GetPointViews(self, node_indices_list):
+        """ PointView per listed node id, for callers that want .x/.y objects """
+        return self.points_lut.GetPointViews(node_indices_list)
     
     def GetPoint(self, point_id):
         point = self.points_lut[point_id]
         return point
     
 
+class RouteCache:
+    """
+    Least recently used routes, keyed by (start id, target id, cost version).
+    Shared by threads: every access holds the lock.
+
+    hits, misses - lookups since the cache was built
+    evictions - routes dropped to stay within size
+    invalidations - routes dropped by Clear (costs changed)
+    """
+    MISSING = object()  # Get result for a key that is not cached (None is a cached 'no route')
+
+    def __init__(self, size=DEFAULT_ROUTE_CACHE_SIZE):
+        self.size = size
+        self.routes = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self.routes)
+
+    def __str__(self):
+        stats = self.Stats()
+        return (f'Route cache {stats["routes"]}/{self.size}: {stats["hits"]} hits, {stats["misses"]} misses '
+                f'({stats["hit_rate"]:.1%}), {stats["evictions"]} evictions, {stats["invalidations"]} invalidations')
+
+    def Get(self, key):
+        with self.lock:
+            route = self.routes.get(key, self.MISSING)
+            if route is self.MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.routes.move_to_end(key)
+            return route
+
+    def Put(self, key, route):
+        """ route - a tuple of node ids or None, never mutated afterwards """
+        if self.size <= 0:
+            return
+        with self.lock:
+            self.routes[key] = route
+            self.routes.move_to_end(key)
+            while len(self.routes) > self.size:
+                self.routes.popitem(last=False)
+                self.evictions += 1
+
+    def Clear(self):
+        """ Drops the routes, keeps the counters """
+        with self.lock:
+            self.invalidations += len(self.routes)
+            self.routes.clear()
+
+    def Resize(self, size):
+        with self.lock:
+            self.size = size
+            while len(self.routes) > max(size, 0):
+                self.routes.popitem(last=False)
+                self.evictions += 1
+
+    def Stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {'routes': len(self.routes), 'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'invalidations': self.invalidations, 'hit_rate': self.hits / lookups if lookups else 0.0}
+
+
+class Route:
+    """
+    A node path with its geometry: coordinates of every node, the length of
+    every segment (m) and the cumulative distance at every node, so positions
+    at distances travelled are one searchsorted for a whole fleet.
+    Indexes and iterates like the tuple of node ids it was built from.
+    Arrays are read-only, routes are shared through the route cache.
+    """
+
+    def __init__(self, node_ids, xs, ys, lengths=None, cost=None):
+        self.node_ids = tuple(node_ids)
+        self.xs = np.asarray(xs, dtype=np.float64)
+        self.ys = np.asarray(ys, dtype=np.float64)
+        if lengths is None:
+            lengths = np.hypot(np.diff(self.xs), np.diff(self.ys))
+        self.lengths = np.asarray(lengths, dtype=np.float64)
+        self.cumulative = np.concatenate([[0.0], np.cumsum(self.lengths)])
+        self.length = float(self.cumulative[-1])
+        self.cost = cost
+        for values in (self.xs, self.ys, self.lengths, self.cumulative):
+            values.flags.writeable = False
+
+    def __str__(self):
+        return f'Route from {self.node_ids[0]} to {self.node_ids[-1]}, {len(self.node_ids)} nodes over {self.length:.0f}m'
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def __iter__(self):
+        return iter(self.node_ids)
+
+    def __getitem__(self, index):
+        return self.node_ids[index]
+
+    def __eq__(self, other):
+        return tuple(self) == tuple(other) if isinstance(other, (Route, tuple, list)) else NotImplemented
+
+    def __hash__(self):
+        return hash(self.node_ids)
+
+    @classmethod
+    def FromPoints(cls, node_ids, points):
+        """ Route along node ids of a point lookup (e.g. a Road's nodes), straight-line segment lengths """
+        xs, ys = PointTable.FromPoints(points).GetPoints(node_ids)
+        return cls(node_ids, xs, ys)
+
+    def Locate(self, distances):
+        """ Segment indexes and blend factors of distances along the route, clipped to the route """
+        distances = np.clip(np.asarray(distances, dtype=np.float64), 0.0, self.length)
+        segment = np.clip(np.searchsorted(self.cumulative, distances, side='right') - 1, 0, max(len(self.lengths) - 1, 0))
+        if not len(self.lengths):
+            return segment, np.zeros(distances.shape)
+        span = self.lengths[segment]
+        t = np.divide(distances - self.cumulative[segment], span, out=np.zeros(distances.shape), where=span > 0)
+        return segment, np.clip(t, 0.0, 1.0)
+
+    def PositionAt(self, distances):
+        """ (..., 2) positions at distances along the route (scalar or array) """
+        segment, t = self.Locate(distances)
+        if len(self.node_ids) < 2:
+            return np.stack([np.full(t.shape, self.xs[0]), np.full(t.shape, self.ys[0])], axis=-1)
+        x = self.xs[segment] + t * (self.xs[segment + 1] - self.xs[segment])
+        y = self.ys[segment] + t * (self.ys[segment + 1] - self.ys[segment])
+        return np.stack([x, y], axis=-1)
+
+
 class RoadNetwork:
-    def __init__(self):
-        self.graph = {}
+    """
+    Thin wrapper around a CompactGraph. Segments added with AddSegment are
+    staged and merged into the CSR arrays the next time a route is queried.
+
+    Routes found by FindMinimumValueRoute are kept in a RouteCache under the
+    current cost_version, which every segment or cost change bumps, so
+    dispatch threads can share one network and repeat queries cheaply.
+    """
+    SEARCH_MODES = ('dijkstra', 'astar', 'bidirectional', 'bidirectional_astar')
+
+    def __init__(self, route_cache_size=DEFAULT_ROUTE_CACHE_SIZE):
+        self.compact = None
+        self.reverse = None  # reversed CSR graph for bidirectional search, built on demand
+        self.pending = ([], [], [])  # staged (start_ids, end_ids, costs)
+        self.point_lut = None
+        self.search_mode = 'dijkstra'
+        self.heuristic_scale = 1.0
+        self.nodes_expanded = 0  # nodes settled by the last route query, summed over DistanceMatrix's searches
+        self.trees = {}  # start_id -> ShortestPathTree kept up to date by SetSegmentCost
+        self.disabled = {}  # (start_label, end_label) -> cost before DisableSegment
+        self.route_cache = RouteCache(route_cache_size)
+        self.cost_version = 0  # bumped whenever segment costs change, part of the route cache key
+        self.lock = threading.RLock()  # the CompactGraph search buffers are shared, one search at a time
 
     def __str__(self):
         return "\n".join(f"{key}: {value}" for key, value in self.graph.items())        
 
+    @property
+    def graph(self):
+        """ Adjacency as {start_label: [(end_label, cost), ...]}, built on demand """
+        graph = {}
+        for start_label, end_label, cost in zip(*self.Compile().Edges()):
+            graph.setdefault(int(start_label), []).append((int(end_label), float(cost)))
+        return graph
+
     def AddSegment(self, start_label, end_label,  segment_cost):
         """ 
         start_label - label associated with a node (x,y) that starts the route segment 
         end_label - label associated with a node (x,y) that ends the route segment
         metric_value - value of a metric of the segment that is used to find optimal path
         """
-        if start_label not in self.graph:
-            self.graph[start_label] = []
-        self.graph[start_label].append((end_label, segment_cost))
+        self.pending[0].append(start_label)
+        self.pending[1].append(end_label)
+        self.pending[2].append(segment_cost)
+
+    def SetNodeCoordinates(self, road_point_lut):
+        """ Gives the network the RoadPoint x/y used by the A* heuristics """
+        self.point_lut = PointTable.FromPoints(road_point_lut)
+        if self.compact is not None:
+            self.AttachCoordinates(self.compact)
+
+    def SetRouteCacheSize(self, size):
+        """ Routes kept by FindMinimumValueRoute, least recently used dropped first; 0 turns the cache off """
+        self.route_cache.Resize(size)
+
+    def InvalidateRoutes(self):
+        """ Starts a new cost version; routes cached under the old one are never returned again """
+        with self.lock:
+            self.cost_version += 1
+            self.route_cache.Clear()
+
+    def SetSearchMode(self, mode, heuristic_scale=1.0):
+        """
+        mode - one of SEARCH_MODES
+        heuristic_scale - converts straight-line metres into segment cost units;
+                          1.0 for distance costs, 1 / max speed for durations
+        """
+        if mode not in self.SEARCH_MODES:
+            raise ValueError(f'Unknown search mode {mode}, expected one of {self.SEARCH_MODES}')
+        self.search_mode = mode
+        self.heuristic_scale = heuristic_scale
+        self.InvalidateRoutes()  # an over-scaled heuristic can change the routes found
+
+    def AttachCoordinates(self, compact):
+        if self.point_lut is None:
+            return
+        compact.SetCoordinates(*self.point_lut.GetPoints(compact.node_ids))
 
-    def FindMinimumValueRoute(self, start_id, target_id):
+    def AddSegments(self, start_labels, end_labels, segment_costs, **segment_attributes):
         """ 
-        Finds optimal path using Dijkstra's to minimise cumulative path_value.   
-        Cycles prevention when searching graph is used 
+        Bulk AddSegment from parallel arrays, merged into the CSR arrays in one pass.
+        segment_attributes - optional per-segment arrays (e.g. length=, duration=)
+        """
+        compact = self.Compile()
+        start_ids, end_ids, costs = compact.Edges()
+        attributes = MergeSegmentAttributes(compact.attributes, len(costs), segment_attributes, len(segment_costs))
+        self.ReplaceCompact(CompactGraph.FromEdges(
+            np.concatenate([start_ids, np.asarray(start_labels, dtype=np.int64)]),
+            np.concatenate([end_ids, np.asarray(end_labels, dtype=np.int64)]),
+            np.concatenate([costs, np.asarray(segment_costs, dtype=np.float64)]),
+            **attributes))
+
+    def Compile(self):
+        """ Merges staged segments into the CSR arrays and returns the CompactGraph """
+        if self.compact is None:
+            self.ReplaceCompact(CompactGraph.FromEdges(*self.pending))
+        elif self.pending[0]:
+            start_ids, end_ids, costs = self.pending
+            self.pending = ([], [], [])
+            self.AddSegments(start_ids, end_ids, costs)
+        return self.compact
+
+    def ReplaceCompact(self, compact):
+        self.InvalidateRoutes()
+        self.compact = compact
+        self.AttachCoordinates(self.compact)
+        self.reverse = None
+        self.pending = ([], [], [])
+        # dense indices moved, regrow the cached trees on the new arrays
+        for start_id in self.trees:
+            self.trees[start_id] = ShortestPathTree(self.compact, self.compact.index_of[start_id])
+
+    def CacheRoutesFrom(self, start_ids):
+        """
+        Keeps a full shortest-path tree for each start id (e.g. crushers and
+        load points), so their routes are read straight from the tree and are
+        repaired, not recomputed, when segments change.
         """
-        pq = [(0, start_id)]  # Priority queue with (cost, node)
-        segment_costs = {node: float('inf') for node in self.graph}
-        segment_costs[start_id] = 0
-        previous_nodes = {}
-        visited = set()  # Track processed nodes
+        compact = self.Compile()
+        for start_id in start_ids:
+            if start_id not in self.trees and start_id in compact.index_of:
+                self.trees[start_id] = ShortestPathTree(compact, compact.index_of[start_id])
 
-        while pq:
-            current_seg_cost, current_node = heapq.heappop(pq)
+    def SegmentIndices(self, start_label, end_label):
+        """ CSR positions of the start_label -> end_label segment(s), KeyError if there are none """
+        compact = self.Compile()
+        start = compact.index_of.get(start_label)
+        end = compact.index_of.get(end_label)
+        edges = compact.SegmentIndices(start, end) if start is not None and end is not None else []
+        if len(edges) == 0:
+            raise KeyError(f'No segment from {start_label} to {end_label}')
+        return edges
 
-            if current_node in visited:
-                continue  # Skip re-processing completed nodes
-            
-            visited.add(current_node)
+    def SetSegmentCost(self, start_label, end_label, segment_cost):
+        """ 
+        Changes the cost of the start_label -> end_label segment in place
+        (float('inf') closes it) and repairs the cached shortest-path trees.
+        Returns {start_id: [target ids]} of the cached routes that changed;
+        routes not listed are still optimal.
+        """
+        with self.lock:
+            edges = self.SegmentIndices(start_label, end_label)
+            compact = self.compact
+            start, end = compact.index_of[start_label], compact.index_of[end_label]
+            if self.reverse is None:
+                self.reverse = compact.Reversed()
+            old_cost = float(compact.weights[edges].min())
+            compact.weights[edges] = segment_cost
+            self.reverse.weights[self.reverse.SegmentIndices(end, start)] = segment_cost
+            self.InvalidateRoutes()
 
-            if current_node == target_id:
-                break
+            affected = {}
+            for start_id, tree in self.trees.items():
+                changed = tree.UpdateSegment(start, end, old_cost, float(segment_cost), self.reverse)
+                if len(changed):
+                    affected[start_id] = compact.node_ids[changed].tolist()
+            return affected
 
-            for neighbor, cost in self.graph.get(current_node, []):                 
-                total_cost = current_seg_cost + cost
-                if total_cost < segment_costs[neighbor]:
-                    segment_costs[neighbor] = total_cost
-                    heapq.heappush(pq, (total_cost, neighbor))
-                    previous_nodes[neighbor] = current_node
+    def SetSegmentAttributes(self, start_label, end_label, **values):
+        """
+        Sets per-segment attributes of the start_label -> end_label segment,
+        e.g. grade=0.08 (rise over run along the segment), speed_limit=8.3
+        (m/s) or rolling_resistance=0.03. duration follows speed_limit.
+        """
+        edges = self.SegmentIndices(start_label, end_label)
+        attributes = self.compact.attributes
+        for name, value in values.items():
+            attributes.setdefault(name, np.full(len(self.compact.weights), np.nan))[edges] = value
+        if 'speed_limit' in values and 'length' in attributes:
+            duration = attributes.setdefault('duration', np.full(len(self.compact.weights), np.nan))
+            duration[edges] = attributes['length'][edges] / attributes['speed_limit'][edges]
 
-        path = []
-        node = target_id
-        while node in previous_nodes:
-            path.insert(0, node)
-            node = previous_nodes[node]
-        if path:
-            path.insert(0, start_id)
+    def SetNodeElevations(self, elevations):
+        """ Grade of every segment from {node id: elevation in metres}; segments with an unknown end keep theirs """
+        compact = self.Compile()
+        start_ids, end_ids, _ = compact.Edges()
+        start_z = np.array([elevations.get(int(i), np.nan) for i in start_ids])
+        end_z = np.array([elevations.get(int(i), np.nan) for i in end_ids])
+        lengths = compact.attributes.get('length', compact.weights)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            grade = np.where(lengths > 0, (end_z - start_z) / lengths, 0.0)
+        known = np.isfinite(grade)
+        compact.attributes.setdefault('grade', np.zeros(len(lengths)))[known] = grade[known]
 
-        return path if path else None
+    def DisableSegment(self, start_label, end_label):
+        """ Closes a segment (grading, blasting, water cart); returns the changed routes """
+        with self.lock:
+            edges = self.SegmentIndices(start_label, end_label)  # compiles staged segments first
+            cost = float(self.compact.weights[edges].min())
+            if cost < INF:
+                self.disabled[(start_label, end_label)] = cost
+            return self.SetSegmentCost(start_label, end_label, INF)
 
+    def EnableSegment(self, start_label, end_label):
+        """ Reopens a segment closed by DisableSegment at its previous cost """
+        with self.lock:
+            if (start_label, end_label) not in self.disabled:
+                raise ValueError(f'Segment from {start_label} to {end_label} was not closed by DisableSegment')
+            return self.SetSegmentCost(start_label, end_label, self.disabled.pop((start_label, end_label)))
+
+    def FindMinimumValueRoute(self, start_id, target_id, as_route=False):
+        """ 
+        Finds optimal path to minimise cumulative path_value using the selected
+        search mode (Dijkstra by default, see SetSearchMode).
+        Cycles prevention when searching graph is used.
+        Returns a tuple of node ids (shared with the route cache, so immutable) or None;
+        as_route=True returns a Route with the path's coordinates and distances instead.
+        """
+        if self.compact is None or self.pending[0]:
+            with self.lock:
+                self.Compile()
+        key = (start_id, target_id, self.cost_version)
+        route = self.route_cache.Get(key)
+        if route is not RouteCache.MISSING:
+            self.nodes_expanded = 0
+            return self.MakeRoute(route) if as_route and route is not None else route
+
+        with self.lock:
+            route = self.SearchRoute(start_id, target_id)
+        # a search that raced a cost change is stored under the old version, which nobody asks for
+        self.route_cache.Put(key, route)
+        return self.MakeRoute(route) if as_route and route is not None else route
+
+    def MakeRoute(self, path):
+        """
+        Route along a node path of this network: segment lengths from the
+        'length' attribute (straight line where there is none), cost from the
+        segment costs. Needs node coordinates, see SetNodeCoordinates.
+        """
+        with self.lock:
+            compact = self.Compile()
+            if compact.xs is None:
+                raise ValueError('node coordinates are required for a Route')
+            nodes = np.array([compact.index_of[node_id] for node_id in path], dtype=np.int64)
+            edges = np.empty(len(nodes) - 1, dtype=np.int64)
+            for k, (a, b) in enumerate(zip(nodes[:-1].tolist(), nodes[1:].tolist())):
+                parallel = compact.SegmentIndices(a, b)  # the cheapest of parallel segments is the one routed
+                edges[k] = parallel[np.argmin(compact.weights[parallel])]
+            xs, ys = compact.xs[nodes], compact.ys[nodes]
+            lengths = np.hypot(np.diff(xs), np.diff(ys))
+            if 'length' in compact.attributes and len(edges):
+                attribute = compact.attributes['length'][edges]
+                lengths = np.where(np.isnan(attribute), lengths, attribute)
+            cost = float(compact.weights[edges].sum()) if len(edges) else 0.0
+        return Route(path, xs, ys, lengths, cost)
+
+    def SearchRoute(self, start_id, target_id):
+        """ FindMinimumValueRoute without the cache, call with the lock held """
+        compact = self.Compile()
+        source = compact.index_of.get(start_id)
+        target = compact.index_of.get(target_id)
+        if source is None or target is None or source == target:
+            self.nodes_expanded = 0
+            return None
+
+        if start_id in self.trees:
+            path = self.trees[start_id].Path(target)
+            self.nodes_expanded = 0
+        elif self.search_mode in ('bidirectional', 'bidirectional_astar'):
+            if self.reverse is None:
+                self.reverse = compact.Reversed()
+            scale = self.heuristic_scale if self.search_mode == 'bidirectional_astar' else None
+            _, path = compact.BidirectionalSearch(self.reverse, source, target, scale)
+            self.nodes_expanded = compact.expanded
+        else:
+            if self.search_mode == 'astar':
+                gen = compact.AStar(source, target, self.heuristic_scale)
+            else:
+                gen = compact.Dijkstra(source, target)
+            path = compact.UnwindPath(source, target, gen)
+            self.nodes_expanded = compact.expanded
+        return None if path is None else tuple(compact.node_ids[path].tolist())
+
+    def RoutesFrom(self, start_id, target_ids):
+        """
+        Routes from start_id to each of target_ids with one search that stops
+        once the last target settles, instead of one FindMinimumValueRoute per
+        pair. Returns {target_id: tuple of node ids or None}; the routes go
+        through (and fill) the route cache.
+        """
+        if self.compact is None or self.pending[0]:
+            with self.lock:
+                self.Compile()
+        version = self.cost_version
+        routes = {}
+        missing = []
+        for target_id in dict.fromkeys(target_ids):
+            route = self.route_cache.Get((start_id, target_id, version))
+            if route is RouteCache.MISSING:
+                missing.append(target_id)
+            else:
+                routes[target_id] = route
+        if not missing:
+            self.nodes_expanded = 0
+            return routes
+
+        with self.lock:
+            compact = self.Compile()
+            source = compact.index_of.get(start_id)
+            if source is None or start_id in self.trees:
+                found = {target_id: self.SearchRoute(start_id, target_id) for target_id in missing}
+            else:
+                targets = [compact.index_of.get(target_id) for target_id in missing]
+                gen = compact.DijkstraToTargets(source, [t for t in targets if t is not None])
+                self.nodes_expanded = compact.expanded
+                found = {}
+                for target_id, target in zip(missing, targets):
+                    path = None if target is None else compact.UnwindPath(source, target, gen)
+                    found[target_id] = None if path is None else tuple(compact.node_ids[path].tolist())
+        for target_id, route in found.items():
+            self.route_cache.Put((start_id, target_id, version), route)
+        routes.update(found)
+        return routes
+
+    def DistanceMatrix(self, start_ids, target_ids, workers=1):
+        """
+        Route costs from every start id to every target id, one search per
+        distinct start (stopping at its last target), run in a process pool
+        when workers > 1 (None for one per core). Returns NumPy arrays
+
+        distances[i, j]     - cost from start_ids[i] to target_ids[j], inf without a route;
+                              0.0 when start and target are the same node, where
+                              FindMinimumValueRoute and RoutesFrom return None (no route
+                              to drive, but nothing to pay, as in RouteTable.dist)
+        predecessors[i, k]  - dense index (see compact.node_ids) before node k on the
+                              route from start_ids[i], -1 off the settled tree;
+                              PredecessorRoute reads routes back from a row
+        """
+        with self.lock:
+            compact = self.Compile()
+            rows = [compact.index_of.get(start_id) for start_id in start_ids]
+            columns = [compact.index_of.get(target_id) for target_id in target_ids]
+            on_network = np.array([j for j, column in enumerate(columns) if column is not None], dtype=np.int64)
+            targets = np.array([column for column in columns if column is not None], dtype=np.int64)
+            sources = sorted({row for row in rows if row is not None})
+            workers = min(workers or os.cpu_count() or 1, max(len(sources), 1))
+            if workers == 1:
+                results = [_SearchRow(compact, source, targets) for source in sources]
+            else:
+                snapshot = (compact.node_ids, compact.offsets, compact.targets, compact.weights.copy(), targets)
+        if workers > 1:
+            with ProcessPoolExecutor(workers, initializer=_StartRouteWorker, initargs=snapshot) as pool:
+                results = list(pool.map(SearchRow, sources, chunksize=max(1, len(sources) // (4 * workers))))
+
+        distances = np.full((len(rows), len(columns)), np.inf)
+        predecessors = np.full((len(rows), len(compact)), -1, dtype=np.int32)
+        by_source = dict(zip(sources, results))
+        for i, row in enumerate(rows):
+            if row is not None:
+                distances[i, on_network], predecessors[i], _ = by_source[row]
+        self.nodes_expanded = sum(expanded for _, _, expanded in results)
+        return distances, predecessors
+
+    def PredecessorRoute(self, predecessors, target_id):
+        """ Route to target_id (tuple of node ids, or None) from one DistanceMatrix predecessors row """
+        compact = self.Compile()
+        node = compact.index_of.get(target_id)
+        if node is None or predecessors[node] < 0:
+            return None
+        path = [node]
+        while predecessors[node] >= 0:
+            node = int(predecessors[node])
+            path.append(node)
+        path.reverse()
+        return tuple(compact.node_ids[path].tolist())
+
+
+def _SearchRow(compact, source, targets):
+    """ (costs to the dense targets, predecessor of every settled node, nodes settled) of one DijkstraToTargets """
+    gen = compact.DijkstraToTargets(source, targets)
+    settled = compact.settled == gen
+    distances = np.where(settled[targets], compact.dist[targets], np.inf)
+    return distances, np.where(settled, compact.pred, -1).astype(np.int32), compact.expanded
+
+
+def _StartRouteWorker(node_ids, offsets, targets, weights, target_indices):
+    """ One CompactGraph (with its own search buffers) per process """
+    global _worker_graph
+    _worker_graph = (CompactGraph(node_ids, offsets, targets, weights), target_indices)
+
+
+def SearchRow(source):
+    """ _SearchRow on the worker's graph, for DistanceMatrix's process pool """
+    compact, targets = _worker_graph
+    return _SearchRow(compact, source, targets)
 
 def ConstructRoads(filename):
     roads = []
@@ -117,27 +602,8 @@ def ConstructRoads(filename):
 
 
 def ConstructPointsMap(filename):
-    scale_to_metres = 1 #3.75
-    road_points = {}
-    with open(filename, "r") as file:
-        for line in file:
-            if len(line) > 5:
-                fields = line.split(",")                
-                print(fields)
-                id_str = fields[0].strip(' ')
-                if id_str.startswith('#') or id_str == '\n':
-                    continue                
-                id = int(id_str)                
-                x = float(fields[1].strip(' ').strip('\n')) * scale_to_metres
-                y = float(fields[2].strip(' ').strip('\n')) * scale_to_metres
-                if len(fields) <= 3:
-                    point_type = 'U'
-                    description = 'Undefined'
-                else:
-                    point_type = fields[3].strip(' ')
-                    description = fields[4].strip(' ').strip('\n')
-                road_points[id] = RoadPoint(id,x,y,point_type,description)
-    return road_points  
+    """ {id: point} map of a RoadPoints.csv style file, stored as a PointTable """
+    return ConstructPointTable(filename)
 
 def ConstructLocationAssets(filename, road_points):
     assets = []
@@ -145,7 +611,6 @@ def ConstructLocationAssets(filename, road_points):
         for line in file:
             if len(line) > 1:
                 fields = line.split(",")
-                print(fields)
                 id_str = fields[0].strip(' ')
                 if id_str.startswith('#') or id_str == '\n':
                     continue
@@ -177,52 +642,68 @@ def ConstructRoads(filename):
     return roads
 
 def ConstructRoadPointLUT(filename):
-    scale_to_metres = 1 #3.75
-    road_points = {}
-    with open(filename, "r") as file:
-        for line in file:
-            if len(line) > 5:  # a heuristic to differentiate a blank line
-                fields = line.split(",")                
-                #print(fields)
-                id_str = fields[0].strip(' ')
-                if id_str.startswith('#') or id_str == '\n':
-                    continue                
-                id = int(id_str)                
-                x = float(fields[1].strip(' ').strip('\n')) * scale_to_metres
-                y = float(fields[2].strip(' ').strip('\n')) * scale_to_metres
-                if len(fields) <= 3:
-                    point_type = 'U'
-                    description = 'Undefined'
-                else:
-                    point_type = fields[3].strip(' ')
-                    description = fields[4].strip(' ').strip('\n')
-                road_points[id] = RoadPoint(id,x,y,point_type,description)
-    return road_points  
-
-
-
-def ConstructRoadNetwork(filename, road_point_lut):
+    """ {id: point} lookup of a RouteCoords.cfg style file, stored as a PointTable """
+    return ConstructPointTable(filename)
+
+
+
+def ConstructRoadNetwork(filename, road_point_lut, speed_limit=DEFAULT_SPEED_LIMIT):
+    """ 
+    Builds the network from RouteNodes.cfg style adjacency lines ("start : [next, ...]").
+    All lines are parsed first, then every segment length and duration
+    (length / speed_limit, speed_limit in m/s) is computed in one vectorized pass.
+    """
+    start_ids, next_ids = ParseAdjacency(filename)
+    return BuildRoadNetwork(start_ids, next_ids, road_point_lut, speed_limit)
+
+def BuildRoadNetwork(start_ids, next_ids, road_point_lut, speed_limit=DEFAULT_SPEED_LIMIT):
+    """ Network from parallel segment start/end id arrays, see ConstructRoadNetwork """
+    points = PointTable.FromPoints(road_point_lut)
+    xs, ys = points.xs, points.ys
+    start_rows = points.Rows(start_ids)
+    end_rows = points.Rows(next_ids)
+
+    lengths = np.hypot(xs[end_rows] - xs[start_rows], ys[end_rows] - ys[start_rows])
+    durations = lengths / speed_limit
+
     road_net = RoadNetwork()
+    road_net.SetNodeCoordinates(points)
+    # flat roads until SetNodeElevations / SetSegmentAttributes say otherwise
+    road_net.AddSegments(start_ids, next_ids, lengths, length=lengths, duration=durations, grade=np.zeros(len(lengths)),
+                         speed_limit=np.full(len(lengths), speed_limit),
+                         rolling_resistance=np.full(len(lengths), DEFAULT_ROLLING_RESISTANCE))
+    return road_net                
+
+def ParseAdjacency(filename):
+    """ Returns parallel (start_ids, next_ids) arrays for every segment in an adjacency file """
+    starts = []
+    counts = []
+    next_lists = []
     with open(filename, "r") as file:
         for line in file:                    
-            #print(line)
             fields = line.split(":")  
-            start_id_str = fields[0].strip(' ')            
-            if start_id_str.startswith('#') or start_id_str == '\n':
+            start_id_str = fields[0].strip()            
+            if start_id_str.startswith('#') or start_id_str == '':
                 continue
-            if start_id_str == '\n':
-                print('Here...')
-            start_id = int(start_id_str)
-            nodes_str = fields[1].strip(' ')
-            nodes_str = nodes_str.strip('\n')
-            nodes = ast.literal_eval(nodes_str)            
-            start_point = road_point_lut[start_id]
-            #print(f'start node {start_id} with ({start_point.x}, {start_point.y}) to nodes {nodes}')
-            for next_id in nodes:    
-                end_point = road_point_lut[next_id]
-                distance = euclidean_distance(np.array([start_point.x, start_point.y]), np.array([end_point.x, end_point.y]))                                
-                road_net.AddSegment(start_id, next_id, distance)
-    return road_net                
+            nodes_str = fields[1].strip().strip('[]').strip().rstrip(',')
+            if not nodes_str:
+                continue
+            starts.append(int(start_id_str))
+            counts.append(nodes_str.count(',') + 1)
+            next_lists.append(nodes_str)
+    if not starts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    next_ids = np.array(','.join(next_lists).split(','), dtype=np.int64)
+    return np.repeat(np.array(starts, dtype=np.int64), counts), next_ids
+
+def MergeSegmentAttributes(attributes, count, new_attributes, new_count):
+    """ Concatenates two sets of per-segment arrays, filling absent ones with NaN """
+    merged = {}
+    for name in set(attributes) | set(new_attributes):
+        merged[name] = np.concatenate([
+            attributes.get(name, np.full(count, np.nan)),
+            np.asarray(new_attributes.get(name, np.full(new_count, np.nan)), dtype=np.float64)])
+    return merged
 
 def euclidean_distance(point1, point2):
     """Calculates Euclidean distance between two points."""
@@ -0,0 +1,86 @@
+import numpy as np
+
+MERGE_DISTANCE_THRESHOLD = 10.0  # metres, road points closer than this become one
+
+
+def ClosePointPairs(points, threshold=MERGE_DISTANCE_THRESHOLD):
+    """
+    All pairs (i, j), i < j, closer than threshold. Points are hashed into a grid of
+    threshold sized cells so only the own and 4 forward neighbour cells are compared.
+    """
+    cells = np.floor(points / threshold).astype(np.int64)
+    cells -= cells.min(axis=0)
+    rows = cells[:, 1].max() + 3  # spare rows so neighbour keys never wrap into another column
+    keys = cells[:, 0] * rows + cells[:, 1] + 1
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+
+    pairs_i, pairs_j = [], []
+    for dx, dy in ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1)):
+        neighbour_keys = sorted_keys + dx * rows + dy
+        start = np.searchsorted(sorted_keys, neighbour_keys, side='left')
+        end = np.searchsorted(sorted_keys, neighbour_keys, side='right')
+        if (dx, dy) == (0, 0):
+            start = np.arange(len(sorted_keys)) + 1  # same cell: only later points, each pair once
+        counts = np.maximum(end - start, 0)
+        a = np.repeat(np.arange(len(sorted_keys)), counts)
+        b = np.repeat(start, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        i, j = order[a], order[b]
+        close = np.hypot(*(points[i] - points[j]).T) < threshold
+        pairs_i.append(i[close])
+        pairs_j.append(j[close])
+    return np.concatenate(pairs_i), np.concatenate(pairs_j)
+
+
+def UnionFindLabels(count, pairs_i, pairs_j):
+    """
+    Connected components of the pair graph with array union-find: every round hooks
+    each root onto the smallest root it is paired with, then path-compresses by
+    pointer jumping, until no pair spans two roots. Returns 0..k-1 cluster labels.
+    """
+    parent = np.arange(count)
+    while True:
+        root_i, root_j = parent[pairs_i], parent[pairs_j]
+        spanning = root_i != root_j
+        if not spanning.any():
+            break
+        low = np.minimum(root_i, root_j)[spanning]
+        high = np.maximum(root_i, root_j)[spanning]
+        np.minimum.at(parent, high, low)
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+    return np.unique(parent, return_inverse=True)[1]
+
+
+def MergeClosePoints(points, threshold=MERGE_DISTANCE_THRESHOLD):
+    """
+    Clusters every point linked by a chain of gaps below threshold (single linkage)
+    and replaces each cluster with its mean position, in linear time.
+    Returns (merged_points, labels) where labels[i] is the merged row of points[i].
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if len(points) == 0:
+        return points.copy(), np.empty(0, dtype=np.int64)
+    labels = UnionFindLabels(len(points), *ClosePointPairs(points, threshold))
+    counts = np.bincount(labels)
+    merged = np.column_stack([np.bincount(labels, weights=points[:, 0]) / counts,
+                              np.bincount(labels, weights=points[:, 1]) / counts])
+    return merged, labels
+
+
+def MergeRoadPoints(polylines, threshold=MERGE_DISTANCE_THRESHOLD):
+    """
+    Merges close points across all roads in one pass so roads that meet share the
+    merged point. Returns one polyline per road, dropping consecutive repeats.
+    """
+    lengths = [len(p) for p in polylines]
+    merged, labels = MergeClosePoints(np.concatenate([np.asarray(p, dtype=np.float64).reshape(-1, 2) for p in polylines]), threshold)
+    roads = []
+    for road_labels in np.split(labels, np.cumsum(lengths)[:-1]):
+        keep = np.ones(len(road_labels), dtype=bool)
+        keep[1:] = road_labels[1:] != road_labels[:-1]
+        roads.append(merged[road_labels[keep]])
+    return roads
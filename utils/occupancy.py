@@ -0,0 +1,103 @@
+from bisect import bisect_left, bisect_right
+from operator import attrgetter
+
+
+class LaneIndex:
+    """
+    Vehicles in one lane of one segment kept in position order, back to
+    front, so leader / follower lookups and gap checks are binary searches
+    instead of scans over every vehicle.
+
+    position - callable giving a vehicle's current position along the lane.
+    Vehicles that move report it with Move (or, when their order in the lane
+    cannot change between updates, not at all).
+    """
+
+    def __init__(self, position=attrgetter('position')):
+        self.position = position
+        self.vehicles = []
+
+    def __len__(self):
+        return len(self.vehicles)
+
+    def __iter__(self):
+        return iter(self.vehicles)
+
+    def __contains__(self, vehicle):
+        return self.Find(vehicle) is not None
+
+    def Insert(self, vehicle):
+        """ Inserts at the vehicle's current position, behind vehicles at the same position """
+        self.vehicles.insert(bisect_left(self.vehicles, self.position(vehicle), key=self.position), vehicle)
+
+    def Find(self, vehicle, position=None):
+        """
+        Index of vehicle, searched at position (default its current one), None if absent.
+        position - where the vehicle was when the lane was last in order
+        """
+        position = self.position(vehicle) if position is None else position
+        vehicles = self.vehicles
+        # step over the vehicles level with position
+        for row in range(bisect_left(vehicles, position, key=self.position), len(vehicles)):
+            if vehicles[row] is vehicle:
+                return row
+            if self.position(vehicles[row]) > position:
+                break
+        try:
+            return vehicles.index(vehicle)  # order was broken, e.g. by an unreported move
+        except ValueError:
+            return None
+
+    def Remove(self, vehicle, position=None):
+        row = self.Find(vehicle, position)
+        if row is None:
+            raise KeyError(vehicle)
+        del self.vehicles[row]
+
+    def Move(self, vehicle, old_position):
+        """ Re-sorts a vehicle that moved from old_position, a no-op while it passes nobody """
+        row = self.Find(vehicle, old_position)
+        if row is None:
+            raise KeyError(vehicle)
+        vehicles = self.vehicles
+        position = self.position(vehicle)
+        if (row + 1 >= len(vehicles) or self.position(vehicles[row + 1]) >= position) and \
+                (row == 0 or self.position(vehicles[row - 1]) <= position):
+            return
+        del vehicles[row]
+        self.Insert(vehicle)
+
+    def Ahead(self, vehicle):
+        """ Next vehicle in front (None at the front) """
+        row = self.Find(vehicle)
+        return self.vehicles[row + 1] if row is not None and row + 1 < len(self.vehicles) else None
+
+    def Behind(self, vehicle):
+        row = self.Find(vehicle)
+        return self.vehicles[row - 1] if row else None
+
+    def LeaderAt(self, position):
+        """ Nearest vehicle strictly ahead of position """
+        row = bisect_right(self.vehicles, position, key=self.position)
+        return self.vehicles[row] if row < len(self.vehicles) else None
+
+    def FollowerAt(self, position):
+        """ Nearest vehicle strictly behind position """
+        row = bisect_left(self.vehicles, position, key=self.position)
+        return self.vehicles[row - 1] if row > 0 else None
+
+    def Front(self):
+        return self.vehicles[-1] if self.vehicles else None
+
+    def Tail(self):
+        return self.vehicles[0] if self.vehicles else None
+
+    def IsClear(self, position, ahead, behind, ignore=None):
+        """ True if no vehicle (other than ignore) is within [position - behind, position + ahead] """
+        vehicles = self.vehicles
+        row = bisect_left(vehicles, position - behind, key=self.position)
+        while row < len(vehicles) and self.position(vehicles[row]) <= position + ahead:
+            if vehicles[row] is not ignore:
+                return False
+            row += 1
+        return True
@@ -0,0 +1,158 @@
+import numpy as np
+
+
+class PointView:
+    """ Read-only RoadPoint look-alike backed by one row of a PointTable """
+    __slots__ = ('table', 'row')
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    @property
+    def id(self):
+        return int(self.table.ids[self.row])
+
+    @property
+    def x(self):
+        return float(self.table.xs[self.row])
+
+    @property
+    def y(self):
+        return float(self.table.ys[self.row])
+
+    @property
+    def type(self):
+        return self.table.point_types[self.table.type_codes[self.row]]
+
+    @property
+    def annotation(self):
+        return self.table.annotations[self.table.annotation_codes[self.row]]
+
+    def __str__(self):
+        return f'Road point {self.id} of type {self.type} at ({self.x}, {self.y})'
+
+
+class PointTable:
+    """
+    Struct-of-arrays road point store: sorted ids with x, y and small integer
+    codes into the point_types and annotations lists. Ids are found with a
+    binary search instead of a per-point dict, and it behaves like the old
+    {id: RoadPoint} maps (lut[id].x, keys(), values(), items()).
+    """
+
+    def __init__(self, ids, xs, ys, type_codes, point_types, annotation_codes, annotations):
+        ids = np.asarray(ids, dtype=np.int64)
+        order = np.argsort(ids, kind='stable')
+        if np.any(order != np.arange(len(ids))):
+            ids = ids[order]
+            xs, ys = np.asarray(xs)[order], np.asarray(ys)[order]
+            type_codes, annotation_codes = np.asarray(type_codes)[order], np.asarray(annotation_codes)[order]
+        self.ids = ids
+        self.xs = np.asarray(xs, dtype=np.float64)
+        self.ys = np.asarray(ys, dtype=np.float64)
+        self.type_codes = np.asarray(type_codes, dtype=np.uint8)
+        self.point_types = list(point_types)
+        self.annotation_codes = np.asarray(annotation_codes, dtype=np.int32)
+        self.annotations = list(annotations)
+
+    @classmethod
+    def FromRecords(cls, ids, xs, ys, point_types, annotations):
+        """ Builds the table from per-point sequences, encoding the string columns """
+        type_names, type_codes = np.unique(np.asarray(point_types, dtype=object).astype(str), return_inverse=True)
+        annotation_names, annotation_codes = np.unique(np.asarray(annotations, dtype=object).astype(str), return_inverse=True)
+        return cls(ids, xs, ys, type_codes, type_names.tolist(), annotation_codes, annotation_names.tolist())
+
+    @classmethod
+    def FromPoints(cls, points):
+        """ From an {id: RoadPoint} map (returned unchanged if it already is a PointTable) """
+        if isinstance(points, PointTable):
+            return points
+        values = list(points.values())
+        return cls.FromRecords([p.id for p in values], [p.x for p in values], [p.y for p in values],
+                               [p.type for p in values], [p.annotation for p in values])
+
+    def __str__(self):
+        return f'{len(self.ids)} #points in road map'
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids.tolist())
+
+    def __contains__(self, point_id):
+        row = np.searchsorted(self.ids, point_id)
+        return row < len(self.ids) and self.ids[row] == point_id
+
+    def __getitem__(self, point_id):
+        row = int(np.searchsorted(self.ids, point_id))
+        if row >= len(self.ids) or self.ids[row] != point_id:
+            raise KeyError(point_id)
+        return PointView(self, row)
+
+    def get(self, point_id, default=None):
+        return self[point_id] if point_id in self else default
+
+    def keys(self):
+        return self.ids.tolist()
+
+    def values(self):
+        return [PointView(self, row) for row in range(len(self.ids))]
+
+    def items(self):
+        return [(int(point_id), PointView(self, row)) for row, point_id in enumerate(self.ids)]
+
+    def Rows(self, point_ids):
+        """ Table rows of an array of ids, KeyError naming the first unknown id """
+        point_ids = np.asarray(point_ids, dtype=np.int64)
+        if len(self.ids) == 0:
+            if point_ids.size:
+                raise KeyError(int(point_ids.flat[0]))
+            return np.zeros(point_ids.shape, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.ids, point_ids), len(self.ids) - 1)
+        missing = self.ids[rows] != point_ids
+        if missing.any():
+            raise KeyError(int(point_ids[missing][0]))
+        return rows
+
+    def GetPoints(self, node_indices_list):
+        """ (xs, ys) coordinate arrays of the listed node ids, in order """
+        rows = self.Rows(node_indices_list)
+        return self.xs[rows], self.ys[rows]
+
+    def GetCoordinates(self, node_indices_list):
+        """ (n, 2) array of the listed node ids' x, y """
+        rows = self.Rows(node_indices_list)
+        return np.column_stack([self.xs[rows], self.ys[rows]])
+
+    def GetPointViews(self, node_indices_list):
+        """ PointView per listed node id, for callers that want .x/.y objects """
+        return [self[p] for p in node_indices_list]
+
+
+def ConstructPointTable(filename, scale_to_metres=1):
+    """ Parses a RoadPoints.csv / RouteCoords.cfg style file straight into a PointTable """
+    ids, xs, ys, point_types, annotations = [], [], [], [], []
+    with open(filename, "r") as file:
+        for line in file:
+            if len(line) > 5:  # a heuristic to differentiate a blank line
+                fields = line.split(",")
+                id_str = fields[0].strip(' ')
+                if id_str.startswith('#') or id_str == '\n':
+                    continue
+                ids.append(int(id_str))
+                xs.append(float(fields[1].strip(' ').strip('\n')) * scale_to_metres)
+                ys.append(float(fields[2].strip(' ').strip('\n')) * scale_to_metres)
+                if len(fields) <= 3:
+                    point_types.append('U')
+                    annotations.append('Undefined')
+                else:
+                    point_types.append(fields[3].strip(' '))
+                    annotations.append(fields[4].strip(' ').strip('\n'))
+    # later duplicates of an id win, as they did in the dict based loaders
+    ids = np.asarray(ids, dtype=np.int64)
+    _, last = np.unique(ids[::-1], return_index=True)
+    keep = np.sort(len(ids) - 1 - last)
+    return PointTable.FromRecords(ids[keep], np.asarray(xs)[keep], np.asarray(ys)[keep],
+                                  np.asarray(point_types, dtype=object)[keep], np.asarray(annotations, dtype=object)[keep])
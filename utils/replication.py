@@ -0,0 +1,218 @@
+import math
+import os
+import random
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import numpy as np
+from scipy import stats
+
+CONFIDENCE = 0.95
+RELATIVE_PRECISION = 0.05  # stop once every KPI's half width is within 5% of its mean
+MIN_REPLICATIONS = 10
+MAX_REPLICATIONS = 200
+
+
+class KpiSummary:
+    """
+    Running mean and variance (Welford) of every KPI over replications, with
+    Student t confidence intervals. Every replication reports the same KPIs.
+    """
+
+    def __init__(self, confidence=CONFIDENCE):
+        self.confidence = confidence
+        self.count = 0
+        self.mean = {}
+        self.m2 = {}
+
+    def __str__(self):
+        lines = [f'{self.count} replications, {self.confidence:.0%} confidence intervals']
+        for name in self.mean:
+            lines.append(f'  {name:24s} {self.mean[name]:12.4g} +- {self.HalfWidth(name):.4g}')
+        return '\n'.join(lines)
+
+    def Add(self, kpis):
+        self.count += 1
+        for name, value in kpis.items():
+            mean = self.mean.get(name, 0.0)
+            delta = value - mean
+            mean += delta / self.count
+            self.m2[name] = self.m2.get(name, 0.0) + delta * (value - mean)
+            self.mean[name] = mean
+
+    def StandardDeviation(self, name):
+        return math.sqrt(self.m2[name] / (self.count - 1)) if self.count > 1 else math.inf
+
+    def HalfWidth(self, name):
+        """ Half width of the confidence interval of the mean of KPI name (inf below two replications) """
+        if self.count < 2:
+            return math.inf
+        return stats.t.ppf(0.5 + 0.5 * self.confidence, self.count - 1) * self.StandardDeviation(name) / math.sqrt(self.count)
+
+    def Interval(self, name):
+        half_width = self.HalfWidth(name)
+        return self.mean[name] - half_width, self.mean[name] + half_width
+
+    def IsPrecise(self, relative_precision=RELATIVE_PRECISION, absolute_precision=None):
+        """
+        True when every KPI's half width is within relative_precision of its
+        mean, or within absolute_precision[name] for KPIs whose mean can be ~0
+        """
+        absolute_precision = absolute_precision or {}
+        return self.count > 1 and all(
+            self.HalfWidth(name) <= max(relative_precision * abs(mean), absolute_precision.get(name, 0.0))
+            for name, mean in self.mean.items())
+
+    def IsResolved(self, names=None, absolute_precision=None):
+        """
+        True when the interval of every KPI in names (default all) excludes
+        zero, or is narrower than absolute_precision[name] either side of it
+        """
+        absolute_precision = absolute_precision or {}
+        if self.count < 2:
+            return False
+        for name in self.mean if names is None else names:
+            low, high = self.Interval(name)
+            if low <= 0.0 <= high and self.HalfWidth(name) > absolute_precision.get(name, 0.0):
+                return False
+        return True
+
+
+def ReplicationSeed(seed, index):
+    """ Seed of replication index: independent of the others and of the order they run in """
+    return np.random.SeedSequence(seed, spawn_key=(index,))
+
+
+def Replicate(scenario, policy, seed):
+    """
+    Runs one replication, scenario(policy, seed) -> {kpi: value}. The global
+    random modules are seeded from seed as well, for scenarios that still draw
+    from them rather than from utils.streams.RandomStreams(seed).
+    """
+    state = seed.generate_state(2)
+    random.seed(int(state[0]))
+    np.random.seed(int(state[1]))
+    return scenario(policy, seed)
+
+
+def StreamReplications(scenario, policy, seed=0, workers=None, confidence=CONFIDENCE,
+                       relative_precision=RELATIVE_PRECISION, absolute_precision=None,
+                       min_replications=MIN_REPLICATIONS, max_replications=MAX_REPLICATIONS, stop=None):
+    """
+    Runs seeded replications of scenario(policy, seed) on a process pool with
+    one worker per core (default), yielding (index, kpis, summary) as each one
+    finishes. scenario and policy must be picklable (module level).
+
+    summary covers replications 0..k-1 in index order, so that an early stop
+    does not favour the replications that happen to finish first. Stops once
+    it holds min_replications and every interval is tight enough (or
+    stop(summary) is true), or after max_replications; replications still
+    running are abandoned.
+    """
+    workers = workers or os.cpu_count() or 1
+    if stop is None:
+        def stop(summary):
+            return summary.IsPrecise(relative_precision, absolute_precision)
+    summary = KpiSummary(confidence)
+    finished = {}
+    if workers == 1:
+        # in process, for debugging and profiling
+        for index in range(max_replications):
+            kpis = Replicate(scenario, policy, ReplicationSeed(seed, index))
+            summary.Add(kpis)
+            yield index, kpis, summary
+            if summary.count >= min_replications and stop(summary):
+                return
+        return
+
+    pool = ProcessPoolExecutor(workers)
+    try:
+        pending = {}
+        submitted = 0
+        while True:
+            while submitted < max_replications and len(pending) < workers:
+                pending[pool.submit(Replicate, scenario, policy, ReplicationSeed(seed, submitted))] = submitted
+                submitted += 1
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                kpis = future.result()
+                finished[index] = kpis
+                while summary.count in finished:
+                    summary.Add(finished.pop(summary.count))
+                yield index, kpis, summary
+            if summary.count >= min_replications and stop(summary):
+                return
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def RunReplications(scenario, policy, report=None, **options):
+    """
+    StreamReplications to the end; report(index, kpis, summary) is called as
+    replications finish. Returns the summary and {index: kpis}.
+    """
+    results = {}
+    summary = None
+    for index, kpis, summary in StreamReplications(scenario, policy, **options):
+        results[index] = kpis
+        if report is not None:
+            report(index, kpis, summary)
+    return summary, results
+
+
+class PairedScenario:
+    """
+    Runs scenario under two policies on the same seed, so with streams drawn
+    per entity and purpose (utils.streams) both see the same exogenous
+    randomness. KPIs come back as 'name [A]', 'name [B]' and 'name [B - A]'.
+    """
+
+    def __init__(self, scenario):
+        self.scenario = scenario
+
+    def __call__(self, policies, seed):
+        policy_a, policy_b = policies
+        kpis_a = Replicate(self.scenario, policy_a, seed)
+        kpis_b = Replicate(self.scenario, policy_b, seed)
+        kpis = {}
+        for name in kpis_a:
+            kpis[f'{name} [A]'] = kpis_a[name]
+            kpis[f'{name} [B]'] = kpis_b[name]
+            kpis[f'{name} [B - A]'] = kpis_b[name] - kpis_a[name]
+        return kpis
+
+
+def ComparePolicies(scenario, policy_a, policy_b, report=None, absolute_precision=None, **options):
+    """
+    Paired replications of policy_b against policy_a, stopping once every
+    difference is resolved: its interval excludes zero, or is within
+    absolute_precision[kpi] of it. Returns the summary and {index: kpis}.
+    """
+    absolute_precision = {f'{name} [B - A]': value for name, value in (absolute_precision or {}).items()}
+
+    def Resolved(summary):
+        return summary.IsResolved([name for name in summary.mean if name.endswith(' [B - A]')], absolute_precision)
+
+    return RunReplications(PairedScenario(scenario), (policy_a, policy_b), report=report, stop=Resolved, **options)
+
+
+def PairedReport(summary, policy_a='A', policy_b='B'):
+    """
+    Table of a ComparePolicies summary: both means, the paired difference
+    and the half width the same number of independent runs would have had.
+    The variance ratio is roughly how many times more replications
+    independent streams would need for the same interval.
+    """
+    t = stats.t.ppf(0.5 + 0.5 * summary.confidence, summary.count - 1) if summary.count > 1 else math.inf
+    lines = [f'{summary.count} paired replications, {policy_b} - {policy_a}, {summary.confidence:.0%} confidence intervals',
+             f'  {"kpi":24s} {policy_a[:12]:>12s} {policy_b[:12]:>12s} {"difference":>22s} {"independent":>12s} {"variance ratio":>15s}']
+    for name in (name[:-len(' [A]')] for name in summary.mean if name.endswith(' [A]')):
+        a, b, difference = f'{name} [A]', f'{name} [B]', f'{name} [B - A]'
+        paired_var = summary.StandardDeviation(difference) ** 2
+        independent_var = summary.StandardDeviation(a) ** 2 + summary.StandardDeviation(b) ** 2
+        independent = t * math.sqrt(independent_var / summary.count) if summary.count > 1 else math.inf
+        ratio = independent_var / paired_var if paired_var > 0 else math.inf
+        lines.append(f'  {name:24s} {summary.mean[a]:12.4g} {summary.mean[b]:12.4g} '
+                     f'{summary.mean[difference]:10.4g} +- {summary.HalfWidth(difference):8.3g} +- {independent:9.3g} {ratio:15.1f}')
+    return '\n'.join(lines)
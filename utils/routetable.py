@@ -0,0 +1,100 @@
+import hashlib
+import os
+import shutil
+import numpy as np
+from utils.graph import CompactGraph
+from utils.map import ConstructRoadNetwork, ConstructRoadPointLUT
+
+ROUTE_TABLE_VERSION = 2
+
+
+class RouteTable:
+    """
+    All-pairs route costs over a road network: dist[i, j] is the minimum cost
+    from dense node i to dense node j (inf when unreachable).
+
+    This is the travel distance source of dispatch (dispatch.TravelTimes),
+    where trucks can be at any node. Routes themselves come from
+    RoadNetwork.FindMinimumValueRoute / RoutesFrom, and profile dependent
+    times between the loaders and dumps from traveltime.TravelTimeMatrices.
+    """
+
+    def __init__(self, node_ids, dist):
+        self.node_ids = node_ids
+        self.dist = dist
+        self.index_of = {int(node_id): i for i, node_id in enumerate(node_ids)}
+
+    def __str__(self):
+        return f'Route table over {len(self.node_ids)} nodes'
+
+    @classmethod
+    def Build(cls, compact):
+        """
+        Fills the table column by column: Dijkstra from each target over the
+        reversed graph gives the cost from every node to that target.
+        """
+        start_ids, end_ids, costs = compact.Edges()
+        reverse = CompactGraph.FromEdges(end_ids, start_ids, costs)
+        n = len(compact)
+        dist = np.full((n, n), np.inf)
+        for target in range(n):
+            gen = reverse.Dijkstra(target)
+            reached = reverse.reached == gen
+            dist[reached, target] = reverse.dist[reached]
+        return cls(compact.node_ids.copy(), dist)
+
+    def Save(self, directory):
+        """ Writes one .npy per array so Load can memory-map them """
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, 'node_ids.npy'), np.asarray(self.node_ids))
+        np.save(os.path.join(directory, 'dist.npy'), np.asarray(self.dist))
+
+    @classmethod
+    def Load(cls, directory, mmap_mode='r'):
+        node_ids = np.load(os.path.join(directory, 'node_ids.npy'))
+        dist = np.load(os.path.join(directory, 'dist.npy'), mmap_mode=mmap_mode)
+        return cls(node_ids, dist)
+
+    def Cost(self, start_id, target_id):
+        """ O(1) route cost, inf if there is no route """
+        source = self.index_of.get(start_id)
+        target = self.index_of.get(target_id)
+        if source is None or target is None:
+            return float('inf')
+        return float(self.dist[source, target])
+
+
+def RouteFilesHash(coords_filename, nodes_filename):
+    """ Content hash of the coordinate and adjacency files used as the cache key """
+    digest = hashlib.sha256(f'route-table-v{ROUTE_TABLE_VERSION}'.encode())
+    for filename in (coords_filename, nodes_filename):
+        with open(filename, "rb") as file:
+            digest.update(file.read())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def ConstructRouteTable(coords_filename, nodes_filename, cache_dir=None):
+    """
+    Returns the all-pairs RouteTable for RouteCoords.cfg/RouteNodes.cfg style files.
+    A cached table whose content hash matches is memory-mapped; otherwise the
+    table is computed and written to cache_dir (default: a cache folder next
+    to nodes_filename).
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(nodes_filename)), 'cache')
+    key = RouteFilesHash(coords_filename, nodes_filename)
+    table_dir = os.path.join(cache_dir, f'route_table_{key[:16]}')
+
+    if not os.path.isfile(os.path.join(table_dir, 'dist.npy')):
+        road_point_lut = ConstructRoadPointLUT(coords_filename)
+        road_net = ConstructRoadNetwork(nodes_filename, road_point_lut)
+        table = RouteTable.Build(road_net.Compile())
+        # write next to the final location and rename, so a crashed build never looks complete
+        tmp_dir = f'{table_dir}.tmp{os.getpid()}'
+        table.Save(tmp_dir)
+        try:
+            os.replace(tmp_dir, table_dir)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)  # another process finished the same table first
+    return RouteTable.Load(table_dir)
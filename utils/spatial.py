@@ -0,0 +1,244 @@
+import numpy as np
+from utils.points import PointTable
+
+
+class UniformGrid:
+    """
+    Uniform grid over axis-aligned item boxes. Each item is listed in every
+    cell its box overlaps; cells are stored CSR style (cell_offsets, cell_items)
+    with cell = ix * ny + iy.
+    """
+
+    def __init__(self, min_x, min_y, max_x, max_y, cell_size):
+        self.cell_size = float(cell_size)
+        min_x, min_y = np.asarray(min_x, dtype=np.float64), np.asarray(min_y, dtype=np.float64)
+        max_x, max_y = np.asarray(max_x, dtype=np.float64), np.asarray(max_y, dtype=np.float64)
+        self.x0 = float(min_x.min()) if len(min_x) else 0.0
+        self.y0 = float(min_y.min()) if len(min_y) else 0.0
+        self.nx = int((max_x.max() - self.x0) // self.cell_size) + 1 if len(max_x) else 1
+        self.ny = int((max_y.max() - self.y0) // self.cell_size) + 1 if len(max_y) else 1
+
+        ix0, iy0 = self.CellCoords(min_x, min_y)
+        ix1, iy1 = self.CellCoords(max_x, max_y)
+        widths, heights = ix1 - ix0 + 1, iy1 - iy0 + 1
+        counts = widths * heights
+        items = np.repeat(np.arange(len(min_x)), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cells = (ix0[items] + local % widths[items]) * self.ny + iy0[items] + local // widths[items]
+
+        order = np.argsort(cells, kind='stable')
+        self.cell_items = items[order]
+        self.cell_offsets = np.zeros(self.nx * self.ny + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cells, minlength=self.nx * self.ny), out=self.cell_offsets[1:])
+
+    def CellCoords(self, xs, ys):
+        """ Cell column and row of each position, clamped to the grid """
+        ix = np.clip(np.floor((np.asarray(xs) - self.x0) / self.cell_size), 0, self.nx - 1).astype(np.int64)
+        iy = np.clip(np.floor((np.asarray(ys) - self.y0) / self.cell_size), 0, self.ny - 1).astype(np.int64)
+        return ix, iy
+
+    def ItemsInCells(self, ix0, iy0, ix1, iy1):
+        """ Items listed in the block of cells [ix0, ix1] x [iy0, iy1] (clipped, may repeat) """
+        ix0, ix1 = max(ix0, 0), min(ix1, self.nx - 1)
+        iy0, iy1 = max(iy0, 0), min(iy1, self.ny - 1)
+        if ix0 > ix1 or iy0 > iy1:
+            return np.empty(0, dtype=np.int64)
+        chunks = [self.cell_items[self.cell_offsets[ix * self.ny + iy0]:self.cell_offsets[ix * self.ny + iy1 + 1]]
+                  for ix in range(ix0, ix1 + 1)]
+        return np.concatenate(chunks)
+
+    def RingItems(self, ix, iy, ring):
+        """ Items in the cells at Chebyshev distance exactly ring from (ix, iy) """
+        if ring == 0:
+            return self.ItemsInCells(ix, iy, ix, iy)
+        return np.concatenate([
+            self.ItemsInCells(ix - ring, iy - ring, ix + ring, iy - ring),
+            self.ItemsInCells(ix - ring, iy + ring, ix + ring, iy + ring),
+            self.ItemsInCells(ix - ring, iy - ring + 1, ix - ring, iy + ring - 1),
+            self.ItemsInCells(ix + ring, iy - ring + 1, ix + ring, iy + ring - 1)])
+
+    def Neighbourhood(self, ix, iy):
+        """
+        CSR of the items in the 3x3 cells around each (ix, iy): returns
+        (query index per candidate, candidate items). Used by the batched queries.
+        """
+        dx, dy = np.meshgrid([-1, 0, 1], [-1, 0, 1])
+        cx = ix[:, None] + dx.ravel()[None, :]
+        cy = iy[:, None] + dy.ravel()[None, :]
+        valid = (cx >= 0) & (cx < self.nx) & (cy >= 0) & (cy < self.ny)
+        cells = np.where(valid, cx * self.ny + cy, 0)
+        starts = np.where(valid, self.cell_offsets[cells], 0).ravel()
+        counts = np.where(valid, self.cell_offsets[cells + 1] - self.cell_offsets[cells], 0).ravel()
+        queries = np.repeat(np.repeat(np.arange(len(ix)), 9), counts)
+        local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return queries, self.cell_items[np.repeat(starts, counts) + local]
+
+    @property
+    def max_ring(self):
+        return max(self.nx, self.ny)
+
+
+def ProjectOntoSegments(xs, ys, ax, ay, bx, by):
+    """ Distance, segment parameter t in [0, 1] and projected x, y of points onto segments a-b """
+    dx, dy = bx - ax, by - ay
+    length_sq = dx * dx + dy * dy
+    t = np.where(length_sq > 0, ((xs - ax) * dx + (ys - ay) * dy) / np.where(length_sq > 0, length_sq, 1), 0.0)
+    t = np.clip(t, 0.0, 1.0)
+    px, py = ax + t * dx, ay + t * dy
+    return np.hypot(xs - px, ys - py), t, px, py
+
+
+def GroupMinimum(groups, values, count):
+    """ Index (into values) of the smallest value per group, -1 for empty groups """
+    best = np.full(count, -1, dtype=np.int64)
+    if len(values):
+        order = np.lexsort((values, groups))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = groups[order][1:] != groups[order][:-1]
+        best[groups[order][first]] = order[first]
+    return best
+
+
+def JoinParts(parts, dtype):
+    return np.concatenate(parts).astype(dtype) if parts else np.empty(0, dtype=dtype)
+
+
+class SpatialIndex:
+    """
+    Grid based nearest/radius queries over road points and road polyline
+    segments, e.g. mouse clicks, label placement and snapping truck
+    positions onto the network.
+
+    points - PointTable (or {id: point} map)
+    roads - optional list of Road whose consecutive nodes form the segments
+    """
+
+    def __init__(self, points, roads=None, cell_size=None):
+        self.points = PointTable.FromPoints(points)
+        xs, ys = self.points.xs, self.points.ys
+        if cell_size is None and len(xs) > 1:
+            area = max((xs.max() - xs.min()) * (ys.max() - ys.min()), 1.0)
+            cell_size = max(np.sqrt(area / len(xs)) * 2, 1.0)
+        self.point_grid = UniformGrid(xs, ys, xs, ys, cell_size or 1.0)
+
+        # segment table: road index, segment index within the road, end points and distance from road start
+        road_index, segment_index, ax, ay, bx, by, along = [], [], [], [], [], [], []
+        for r, road in enumerate(roads or []):
+            rx, ry = self.points.GetPoints(road.nodes)
+            lengths = np.hypot(np.diff(rx), np.diff(ry))
+            road_index.append(np.full(len(lengths), r))
+            segment_index.append(np.arange(len(lengths)))
+            ax.append(rx[:-1])
+            ay.append(ry[:-1])
+            bx.append(rx[1:])
+            by.append(ry[1:])
+            along.append(np.concatenate([[0.0], np.cumsum(lengths)[:-1]]))
+        self.segment_road = JoinParts(road_index, np.int64)
+        self.segment_index = JoinParts(segment_index, np.int64)
+        self.ax, self.ay = JoinParts(ax, np.float64), JoinParts(ay, np.float64)
+        self.bx, self.by = JoinParts(bx, np.float64), JoinParts(by, np.float64)
+        self.segment_along = JoinParts(along, np.float64)
+        self.segment_grid = None
+        if len(self.ax):
+            segment_cell = max(float(np.median(np.hypot(self.bx - self.ax, self.by - self.ay))), self.point_grid.cell_size)
+            self.segment_grid = UniformGrid(np.minimum(self.ax, self.bx), np.minimum(self.ay, self.by),
+                                            np.maximum(self.ax, self.bx), np.maximum(self.ay, self.by), segment_cell)
+
+    def __str__(self):
+        return f'Spatial index over {len(self.points)} points and {len(self.ax)} segments'
+
+    def _RingSearch(self, grid, x, y, distances):
+        """ Expanding ring search for the item closest to (x, y); returns (item, distance) """
+        ix, iy = grid.CellCoords(x, y)
+        best, best_dist = -1, np.inf
+        for ring in range(grid.max_ring + 1):
+            items = grid.RingItems(int(ix), int(iy), ring)
+            if len(items):
+                d = distances(items)
+                k = int(np.argmin(d))
+                if d[k] < best_dist:
+                    best, best_dist = int(items[k]), float(d[k])
+            # every cell further out is at least ring * cell_size away
+            if best_dist <= ring * grid.cell_size:
+                break
+        return best, best_dist
+
+    def NearestPoint(self, x, y):
+        """ (point id, distance) of the road point closest to (x, y) """
+        xs, ys = self.points.xs, self.points.ys
+        row, distance = self._RingSearch(self.point_grid, x, y, lambda rows: np.hypot(xs[rows] - x, ys[rows] - y))
+        return (int(self.points.ids[row]) if row >= 0 else None), distance
+
+    def NearestPoints(self, xs, ys):
+        """ Batched NearestPoint: (point ids, distances) arrays """
+        xs, ys = np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64)
+        grid = self.point_grid
+        queries, rows = grid.Neighbourhood(*grid.CellCoords(xs, ys))
+        d = np.hypot(self.points.xs[rows] - xs[queries], self.points.ys[rows] - ys[queries])
+        best = GroupMinimum(queries, d, len(xs))
+        found = best >= 0
+        nearest_rows = np.where(found, rows[np.maximum(best, 0)], -1)
+        distances = np.where(found, d[np.maximum(best, 0)], np.inf)
+        # the 3x3 block is only conclusive within one cell width
+        for q in np.flatnonzero(distances > grid.cell_size):
+            nearest_rows[q], distances[q] = self._RingSearch(grid, xs[q], ys[q],
+                lambda r, q=q: np.hypot(self.points.xs[r] - xs[q], self.points.ys[r] - ys[q]))
+        return self.points.ids[nearest_rows], distances
+
+    def PointsWithinRadius(self, x, y, radius):
+        """ Ids of the road points within radius of (x, y), nearest first """
+        grid = self.point_grid
+        (ix0, ix1), (iy0, iy1) = grid.CellCoords([x - radius, x + radius], [y - radius, y + radius])
+        rows = grid.ItemsInCells(ix0, iy0, ix1, iy1)
+        d = np.hypot(self.points.xs[rows] - x, self.points.ys[rows] - y)
+        keep = np.argsort(d[d <= radius], kind='stable')
+        return self.points.ids[rows[d <= radius][keep]]
+
+    def _SegmentMatch(self, segments, xs, ys):
+        """ Query result records for matched segment indices """
+        distance, t, px, py = ProjectOntoSegments(xs, ys, self.ax[segments], self.ay[segments], self.bx[segments], self.by[segments])
+        seg_length = np.hypot(self.bx[segments] - self.ax[segments], self.by[segments] - self.ay[segments])
+        return {'road': self.segment_road[segments], 'segment': self.segment_index[segments], 't': t,
+                'x': px, 'y': py, 'distance': distance, 'along': self.segment_along[segments] + t * seg_length}
+
+    def NearestSegment(self, x, y):
+        """
+        Closest road segment to (x, y) as a dict: road (index into roads),
+        segment (index within the road), t (0..1 along the segment), x, y
+        (projected position), distance and along (metres from road start).
+        None if the index has no segments.
+        """
+        if self.segment_grid is None:
+            return None
+        segment, _ = self._RingSearch(self.segment_grid, x, y, lambda s: ProjectOntoSegments(
+            x, y, self.ax[s], self.ay[s], self.bx[s], self.by[s])[0])
+        match = self._SegmentMatch(np.array([segment]), np.array([x], dtype=np.float64), np.array([y], dtype=np.float64))
+        return {key: value[0].item() for key, value in match.items()}
+
+    def NearestSegments(self, xs, ys):
+        """ Batched NearestSegment: dict of arrays, one entry per query """
+        if self.segment_grid is None:
+            return None
+        xs, ys = np.asarray(xs, dtype=np.float64), np.asarray(ys, dtype=np.float64)
+        grid = self.segment_grid
+        queries, segments = grid.Neighbourhood(*grid.CellCoords(xs, ys))
+        d = ProjectOntoSegments(xs[queries], ys[queries], self.ax[segments], self.ay[segments], self.bx[segments], self.by[segments])[0]
+        best = GroupMinimum(queries, d, len(xs))
+        nearest = np.where(best >= 0, segments[np.maximum(best, 0)], -1)
+        distances = np.where(best >= 0, d[np.maximum(best, 0)], np.inf)
+        for q in np.flatnonzero(distances > grid.cell_size):
+            nearest[q], distances[q] = self._RingSearch(grid, xs[q], ys[q], lambda s, q=q: ProjectOntoSegments(
+                xs[q], ys[q], self.ax[s], self.ay[s], self.bx[s], self.by[s])[0])
+        return self._SegmentMatch(nearest, xs, ys)
+
+    def SegmentsWithinRadius(self, x, y, radius):
+        """ NearestSegment style dict of arrays for every segment within radius, nearest first """
+        if self.segment_grid is None:
+            return None
+        grid = self.segment_grid
+        (ix0, ix1), (iy0, iy1) = grid.CellCoords([x - radius, x + radius], [y - radius, y + radius])
+        segments = np.unique(grid.ItemsInCells(ix0, iy0, ix1, iy1))
+        match = self._SegmentMatch(segments, np.full(len(segments), float(x)), np.full(len(segments), float(y)))
+        keep = np.flatnonzero(match['distance'] <= radius)
+        keep = keep[np.argsort(match['distance'][keep], kind='stable')]
+        return {key: value[keep] for key, value in match.items()}
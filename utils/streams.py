@@ -0,0 +1,55 @@
+import random
+import zlib
+import numpy as np
+
+# purposes of the exogenous random inputs
+SPEED = 'speed'
+LOAD_TIME = 'load time'
+CROSS_TRAFFIC = 'cross traffic'
+BREAKDOWN = 'breakdown'
+
+
+def StreamKey(value):
+    """ Stable non-negative integer for a purpose or entity name (hash() is salted per process) """
+    if isinstance(value, (int, np.integer)) and value >= 0:
+        return int(value)
+    return zlib.crc32(str(value).encode())
+
+
+class RandomStreams:
+    """
+    Independent random streams per (purpose, entity), all derived from one
+    seed, for common random numbers: truck 7's third load time is the same
+    draw whichever policy is being simulated, because it does not share a
+    stream with anything the policy changes (other trucks, the dispatch
+    order, how many draws were made before).
+
+    seed - int or SeedSequence (e.g. utils.replication.ReplicationSeed)
+    """
+
+    def __init__(self, seed=0):
+        self.seed = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.generators = {}
+        self.randoms = {}
+
+    def __str__(self):
+        return f'Random streams of seed {self.seed.entropy} {self.seed.spawn_key}: {len(self.generators) + len(self.randoms)} in use'
+
+    def Seed(self, purpose, entity=None):
+        key = (StreamKey(purpose),) if entity is None else (StreamKey(purpose), StreamKey(entity))
+        return np.random.SeedSequence(self.seed.entropy, spawn_key=self.seed.spawn_key + key)
+
+    def Generator(self, purpose, entity=None):
+        """ NumPy Generator of (purpose, entity), the same object on every call so draws continue """
+        key = (purpose, entity)
+        if key not in self.generators:
+            self.generators[key] = np.random.default_rng(self.Seed(purpose, entity))
+        return self.generators[key]
+
+    def Random(self, purpose, entity=None):
+        """ random.Random of (purpose, entity), for code written against the random module """
+        key = (purpose, entity)
+        if key not in self.randoms:
+            # a child of the stream seed, so it does not repeat the Generator's draws
+            self.randoms[key] = random.Random(int(self.Seed(purpose, entity).spawn(1)[0].generate_state(1)[0]))
+        return self.randoms[key]
@@ -0,0 +1,128 @@
+import sys
+import numpy as np
+from utils.graph import CompactGraph
+from utils.map import DEFAULT_ROLLING_RESISTANCE, DEFAULT_SPEED_LIMIT
+
+GRAVITY = 9.81  # m/s^2
+
+
+class TruckClass:
+    """
+    Speed on a segment from its total resistance (grade + rolling resistance,
+    as a fraction of weight): power limited uphill, retarder limited downhill,
+    capped by the truck's top speed and the segment's speed limit. A steady
+    state stand-in for the OEM rimpull and retarder curves.
+
+    masses in t, powers in kW at the wheels, max_speed in m/s
+    """
+
+    def __init__(self, name, empty_mass, payload, power, retarder_power, max_speed):
+        self.name = name
+        self.empty_mass = empty_mass
+        self.payload = payload
+        self.power = power
+        self.retarder_power = retarder_power
+        self.max_speed = max_speed
+
+    def __str__(self):
+        return f'{self.name}: {self.payload:.0f} t payload, {self.power:.0f} kW'
+
+    def Speeds(self, grade, rolling_resistance, speed_limit, loaded):
+        """ Steady speed (m/s) on segments of the given attributes, empty or loaded """
+        weight = (self.empty_mass + (self.payload if loaded else 0.0)) * 1000 * GRAVITY  # N
+        resistance = np.asarray(grade) + np.asarray(rolling_resistance)
+        with np.errstate(divide='ignore'):
+            limit = np.where(resistance > 0, self.power * 1000 / (weight * resistance),
+                             np.where(resistance < 0, self.retarder_power * 1000 / (weight * -resistance), np.inf))
+        return np.minimum(np.minimum(limit, self.max_speed), speed_limit)
+
+
+# rough spec sheet figures, replace with the fleet's own
+TRUCK_CLASSES = {
+    'Cat 793C': TruckClass('Cat 793C', empty_mass=165, payload=218, power=1450, retarder_power=3500, max_speed=54 / 3.6),
+    'Cat 785C': TruckClass('Cat 785C', empty_mass=102, payload=136, power=900, retarder_power=2200, max_speed=54 / 3.6),
+}
+
+
+def SegmentTravelTimes(road_network, truck_class, loaded):
+    """ Seconds to drive every segment of the network (CSR order), inf on disabled segments """
+    compact = road_network.Compile()
+    count = len(compact.weights)
+    attributes = compact.attributes
+    lengths = attributes.get('length', compact.weights)
+    speeds = truck_class.Speeds(np.nan_to_num(attributes.get('grade', np.zeros(count))),
+                                np.nan_to_num(attributes.get('rolling_resistance', np.full(count, DEFAULT_ROLLING_RESISTANCE)),
+                                              nan=DEFAULT_ROLLING_RESISTANCE),
+                                np.nan_to_num(attributes.get('speed_limit', np.full(count, DEFAULT_SPEED_LIMIT)),
+                                              nan=DEFAULT_SPEED_LIMIT),
+                                loaded)
+    times = lengths / speeds
+    times[np.isinf(compact.weights)] = np.inf  # closed by DisableSegment
+    return times
+
+
+class TravelTimeMatrices:
+    """
+    Many-to-many travel times (s) between the loaders, dumps and crushers, one
+    matrix per (truck class, loaded) profile, so that dispatch reads times
+    instead of searching routes.
+
+    times[profile, i, j] - fastest route from location_ids[i] to location_ids[j]
+    (inf when there is none or a location is not on the network)
+    """
+
+    def __init__(self, location_ids, profiles, times):
+        self.location_ids = list(location_ids)
+        self.profiles = list(profiles)  # (truck class name, loaded)
+        self.times = times
+        self.index_of = {location_id: i for i, location_id in enumerate(self.location_ids)}
+        self.profile_index = {profile: p for p, profile in enumerate(self.profiles)}
+
+    def __str__(self):
+        return f'Travel times between {len(self.location_ids)} locations for {len(self.profiles)} truck profiles'
+
+    @classmethod
+    def Build(cls, road_network, location_ids, truck_classes=TRUCK_CLASSES):
+        """ One full Dijkstra per profile and location over the per-profile segment times """
+        compact = road_network.Compile()
+        profiles = [(name, loaded) for name in truck_classes for loaded in (False, True)]
+        sources = [compact.index_of.get(int(location_id)) for location_id in location_ids]
+        targets = np.array([-1 if s is None else s for s in sources])
+        times = np.full((len(profiles), len(sources), len(sources)), np.inf)
+        for p, (name, loaded) in enumerate(profiles):
+            graph = CompactGraph(compact.node_ids, compact.offsets, compact.targets,
+                                 SegmentTravelTimes(road_network, truck_classes[name], loaded))
+            for i, source in enumerate(sources):
+                if source is None:
+                    continue
+                gen = graph.Dijkstra(source)
+                found = (targets >= 0) & (graph.reached[targets] == gen)
+                times[p, i, found] = graph.dist[targets[found]]
+        return cls(location_ids, profiles, times)
+
+    def Matrix(self, truck_class, loaded):
+        """ (locations, locations) times of one profile, truck_class by name """
+        return self.times[self.profile_index[(truck_class, bool(loaded))]]
+
+    def Lookup(self, truck_class, loaded, origins, destinations):
+        """ (origins, destinations) times between location ids, e.g. the travel_time of an AssignmentProblem """
+        rows = [self.index_of[origin] for origin in origins]
+        columns = [self.index_of[destination] for destination in destinations]
+        return self.Matrix(truck_class, loaded)[np.ix_(rows, columns)]
+
+    def Time(self, truck_class, loaded, origin, destination):
+        return float(self.Matrix(truck_class, loaded)[self.index_of[origin], self.index_of[destination]])
+
+
+if __name__ == '__main__':
+    # python -m utils.traveltime [data_dir] - loaded / empty times between the mine's assets
+    from utils.bundle import LoadMineData
+    mine_data = LoadMineData(sys.argv[1] if len(sys.argv) > 1 else './data')
+    assets = {asset['point_id']: asset['name'] for asset in mine_data['assets']}
+    matrices = TravelTimeMatrices.Build(mine_data['road_network'], list(assets))
+    print(matrices)
+    for (name, loaded), times in zip(matrices.profiles, matrices.times):
+        print(f'{name} {"loaded" if loaded else "empty"}, minutes')
+        print(f'  {"":12s}' + ''.join(f'{assets[j][:10]:>11s}' for j in assets))
+        for i, row in zip(assets, times):
+            print(f'  {assets[i][:12]:12s}' + ''.join(f'{t / 60:11.1f}' for t in row))